@@ -5,7 +5,7 @@ Professional admin panel for master data management.
 FIXED: Handle sqlite3.Row objects with .get() method
 """
 import streamlit as st
-from utils import load_css, refresh_master_data
+from utils import load_css, refresh_master_data, clear_card_cache
 
 st.set_page_config(layout="wide", page_icon="⚙️", page_title="จัดการข้อมูลหลัก")
 load_css()
@@ -61,6 +61,7 @@ class MasterDataManager:
     def _handle_add(self, values):
         """Handle add submission."""
         from database import execute_query
+        from audit import record as audit_record
 
         try:
             name = values.get('name', '').strip()
@@ -80,7 +81,8 @@ class MasterDataManager:
                     params.append(val)
 
             query = f"INSERT INTO {self.table_name} ({', '.join(fields)}) VALUES ({', '.join(placeholders)})"
-            execute_query(query, params)
+            record_id = execute_query(query, params)
+            audit_record('master.create', self.table_name, record_id, {'name': name})
 
             st.success(f"✅ เพิ่ม '{values['name']}' เรียบร้อย!")
             refresh_master_data()
@@ -130,6 +132,7 @@ class MasterDataManager:
     def _handle_delete(self, record):
         """Handle delete with referential integrity check."""
         from database import execute_query
+        from audit import record as audit_record
 
         try:
             record_id = record.get('id')
@@ -155,6 +158,7 @@ class MasterDataManager:
                     return
 
             execute_query(f"DELETE FROM {self.table_name} WHERE id = ?", (record_id,))
+            audit_record('master.delete', self.table_name, record_id, {'name': record_name})
             st.success(f"✅ ลบ '{record_name}' เรียบร้อย!")
             refresh_master_data()
             st.rerun()
@@ -265,6 +269,7 @@ def main():
         with col2:
             if st.button("🔄 รีเฟรชแคช", use_container_width=True):
                 refresh_master_data()
+                clear_card_cache()
                 st.success("✅ รีเฟรชแคชเรียบร้อย!")
                 st.rerun()
 
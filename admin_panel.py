@@ -7,11 +7,14 @@ Separate from original admin.py - 100% backward compatible
 import streamlit as st
 from security.auth import auth_manager, require_role
 from security.sanitizer import output_sanitizer
+from provision_users import render_provisioning_tab
 from utils import load_css
 
 st.set_page_config(layout="wide", page_icon="👥", page_title="จัดการผู้ใช้")
 load_css()
 
+USERS_PER_PAGE = 25
+
 # ----------------------------------------------------------------------
 # Admin Authentication Check
 # ----------------------------------------------------------------------
@@ -31,7 +34,7 @@ def admin_user_management():
         st.error("🚫 เฉพาะ Admin เท่านั้นที่เข้าถึงหน้านี้ได้")
         return
 
-    tab1, tab2 = st.tabs(["👤 สร้างผู้ใช้ใหม่", "📋 รายการผู้ใช้"])
+    tab1, tab2, tab3 = st.tabs(["👤 สร้างผู้ใช้ใหม่", "📋 รายการผู้ใช้", "📥 นำเข้าผู้ใช้"])
 
     with tab1:
         st.markdown("### ➕ สร้างผู้ใช้ใหม่")
@@ -86,23 +89,28 @@ def admin_user_management():
     with tab2:
         st.markdown("### 📋 รายการผู้ใช้ทั้งหมด")
 
-        users = auth_manager.list_users()
+        role_counts = auth_manager.users.count_by_role()
+        total_users = sum(role_counts.values())
 
-        if not users:
+        if not total_users:
             st.info("ยังไม่มีผู้ใช้ในระบบ")
         else:
             col1, col2, col3 = st.columns(3)
             with col1:
-                st.metric("👥 ผู้ใช้ทั้งหมด", len(users))
+                st.metric("👥 ผู้ใช้ทั้งหมด", total_users)
             with col2:
-                admin_count = len([u for u in users if u['role'] == 'admin'])
-                st.metric("👑 Admin", admin_count)
+                st.metric("👑 Admin", role_counts.get('admin', 0))
             with col3:
-                viewer_count = len([u for u in users if u['role'] == 'viewer'])
-                st.metric("👤 Viewer", viewer_count)
+                st.metric("👤 Viewer", role_counts.get('viewer', 0))
 
             st.markdown("---")
 
+            total_pages = (total_users + USERS_PER_PAGE - 1) // USERS_PER_PAGE
+            page = 1
+            if total_pages > 1:
+                page = st.number_input("หน้า", min_value=1, max_value=total_pages, value=1)
+            users = auth_manager.list_users(limit=USERS_PER_PAGE, offset=(page - 1) * USERS_PER_PAGE)
+
             for user_data in users:
                 with st.expander(f"{user_data['username']} - {user_data['name']}"):
                     col1, col2 = st.columns([3, 1])
@@ -147,6 +155,9 @@ def admin_user_management():
                                     st.session_state.reset_user = None
                                     st.rerun()
 
+    with tab3:
+        render_provisioning_tab(created_by=user['username'])
+
 def main():
     admin_user_management()
 
@@ -10,6 +10,15 @@ import streamlit as st
 
 from database import init_database, get_all_items_with_details, execute_query
 from utils import load_css, create_placeholder_image
+from maintenance import start_background_jobs
+import audit  # registers the item audit hook
+
+st.set_page_config(
+    page_title="Item Wiki - ARPG Database",
+    page_icon="🎮",
+    layout="wide",
+    initial_sidebar_state="expanded"
+)
 
 try:
     from security.middleware import security_headers
@@ -19,13 +28,6 @@ except ImportError:
     SECURITY_ENABLED = False
     print("⚠️ Security module not loaded - running in development mode")
 
-st.set_page_config(
-    page_title="Item Wiki - ARPG Database",
-    page_icon="🎮",
-    layout="wide",
-    initial_sidebar_state="expanded"
-)
-
 load_css()
 create_placeholder_image()
 
@@ -37,12 +39,15 @@ if 'db_initialized' not in st.session_state:
     init_database()
     st.session_state.db_initialized = True
 
+start_background_jobs()
+
 PAGES = {
     "🏠 หน้าหลัก": "home",
     "🔍 ค้นหาไอเท็ม": "view",
     "📝 จัดการไอเท็ม": "manage",
     "⚙️ จัดการข้อมูลหลัก": "admin",
-    "👥 จัดการผู้ใช้": "users"
+    "👥 จัดการผู้ใช้": "users",
+    "📜 บันทึกการแก้ไข": "audit"
 }
 
 def main():
@@ -62,6 +67,13 @@ def main():
         auth_manager.logout_button("sidebar")
         st.sidebar.markdown("---")
 
+        # ===== First login: generated passwords must be replaced (every role) =====
+        if auth_manager.is_authenticated():
+            from security.admin_user_manager import check_force_password_change, force_password_change_ui
+            if check_force_password_change():
+                force_password_change_ui()
+                return
+
     selection = st.sidebar.radio(
         "เมนู",
         list(PAGES.keys()),
@@ -77,7 +89,7 @@ def main():
     st.sidebar.metric("ไอเท็มในระบบ", f"{len(items)} ชิ้น")
 
     legendary_count = execute_query(
-        "SELECT COUNT(*) as c FROM items i JOIN rarities r ON i.rarity_id = r.id WHERE r.name = 'Legendary'",
+        "SELECT COUNT(*) as c FROM items i JOIN rarities r ON i.rarity_id = r.id WHERE r.name = 'Legendary' AND i.deleted_at IS NULL",
         fetch_one=True
     )['c']
 
@@ -88,11 +100,11 @@ def main():
 
     # ===== FIXED: Page Access Control =====
     if SECURITY_ENABLED:
-        if page in ['manage', 'admin', 'users']:
+        if page in ['manage', 'admin', 'users', 'audit']:
             if not auth_manager.is_authenticated():
                 st.warning("🔒 กรุณาเข้าสู่ระบบก่อนใช้งานส่วนนี้")
                 page = "home"
-            elif page in ['manage', 'admin', 'users'] and not auth_manager.has_role('admin'):
+            elif page in ['manage', 'admin', 'users', 'audit'] and not auth_manager.has_role('admin'):
                 st.error("🚫 เฉพาะ Admin เท่านั้นที่เข้าถึงหน้านี้ได้")
                 page = "home"
 
@@ -110,6 +122,9 @@ def main():
     elif page == "users" and SECURITY_ENABLED:
         from admin_panel import main as admin_panel_main
         admin_panel_main()
+    elif page == "audit":
+        from audit_viewer import main as audit_viewer_main
+        audit_viewer_main()
 
 def show_home_page():
     col1, col2 = st.columns([1, 4])
@@ -144,7 +159,7 @@ def show_home_page():
     col1, col2, col3, col4 = st.columns(4)
 
     with col1:
-        total_items = execute_query("SELECT COUNT(*) as c FROM items", fetch_one=True)['c']
+        total_items = execute_query("SELECT COUNT(*) as c FROM items WHERE deleted_at IS NULL", fetch_one=True)['c']
         st.metric("📦 ไอเท็มทั้งหมด", f"{total_items:,} ชิ้น")
 
     with col2:
@@ -172,6 +187,7 @@ def show_home_page():
         JOIN item_types t ON i.type_id = t.id
         JOIN rarities r ON i.rarity_id = r.id
         JOIN drop_locations l ON i.location_id = l.id
+        WHERE i.deleted_at IS NULL
         ORDER BY i.created_at DESC
         LIMIT 6
     """)
@@ -0,0 +1,251 @@
+"""
+audit.py
+========
+Audit trail of who changed what (items, master data, user accounts).
+
+record() only puts an entry on an in-process queue, so a mutation never
+waits on an extra connection. A daemon writer thread drains the queue and
+inserts entries with one executemany per transaction, every
+FLUSH_INTERVAL seconds or as soon as FLUSH_BATCH entries are waiting.
+Entries still queued at interpreter exit are flushed by an atexit hook.
+"""
+import atexit
+import json
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, date, timedelta
+from typing import Optional
+
+from database import get_db_connection, execute_query, add_item_listener
+
+FLUSH_INTERVAL = 0.5       # seconds between flushes of a partial batch
+FLUSH_BATCH = 200          # entries that trigger an immediate flush
+QUEUE_MAX = 10000          # entries held before record() starts to wait
+PUT_TIMEOUT = 1.0          # seconds record() waits on a full queue before dropping
+
+ITEM_ACTIONS = {'create': 'item.create', 'update': 'item.update', 'delete': 'item.delete'}
+
+def current_actor() -> str:
+    """Username of the Streamlit session making the change ('system' outside a session)."""
+    # No Streamlit loaded means no session; importing it here would cost
+    # a CLI process about a second on its first write
+    if 'streamlit' not in sys.modules:
+        return 'system'
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        import streamlit as st
+
+        if get_script_run_ctx() is None:
+            return 'system'
+        return st.session_state.get('auth_username') or 'anonymous'
+    except Exception:
+        return 'system'
+
+def _json_default(value):
+    if isinstance(value, (set, frozenset, tuple)):
+        return sorted(value)
+    return str(value)
+
+# ----------------------------------------------------------------------
+# Batched Writer
+# ----------------------------------------------------------------------
+class AuditLogger:
+    """Queue in front of the audit_log table with a batching writer thread."""
+
+    def __init__(self, flush_interval=FLUSH_INTERVAL, flush_batch=FLUSH_BATCH, queue_max=QUEUE_MAX):
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        self._queue = queue.Queue(maxsize=queue_max)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._stopping = False
+        self.written = 0
+        self.dropped = 0
+        self.flushes = 0
+
+    def record(self, action: str, target_type: str, target_id=None,
+               details: Optional[dict] = None, actor: Optional[str] = None):
+        """Queue one entry; the actor defaults to the logged-in user of the calling session."""
+        entry = (
+            datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            actor or current_actor(),
+            action,
+            target_type,
+            None if target_id is None else str(target_id),
+            json.dumps(details, ensure_ascii=False, default=_json_default) if details else None,
+        )
+        self._ensure_started()
+        try:
+            self._queue.put(entry, timeout=PUT_TIMEOUT)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            print(f"Audit queue full, dropped: {action} {target_type} {target_id}")
+            return
+        if self._queue.qsize() >= self.flush_batch:
+            self._wake.set()
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._stopping or (self._thread is not None and self._thread.is_alive()):
+                return
+            self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stopping:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Audit flush error: {e}")
+                time.sleep(self.flush_interval)
+
+    def flush(self) -> int:
+        """Write everything queued so far, FLUSH_BATCH rows per executemany. Returns rows written."""
+        written = 0
+        with self._flush_lock:
+            while True:
+                batch = []
+                while len(batch) < self.flush_batch:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if not batch:
+                    break
+                try:
+                    with get_db_connection() as conn:
+                        conn.executemany(
+                            "INSERT INTO audit_log (created_at, actor, action, target_type, target_id, details) "
+                            "VALUES (?, ?, ?, ?, ?, ?)",
+                            batch
+                        )
+                except Exception:
+                    # Put the batch back so a transient lock error loses nothing
+                    for entry in batch:
+                        try:
+                            self._queue.put_nowait(entry)
+                        except queue.Full:
+                            with self._lock:
+                                self.dropped += 1
+                    raise
+                written += len(batch)
+                with self._lock:
+                    self.written += len(batch)
+                    self.flushes += 1
+        return written
+
+    def close(self):
+        """Stop the writer and flush what is left (registered with atexit)."""
+        with self._lock:
+            self._stopping = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"Audit flush error at exit: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'queued': self._queue.qsize(), 'written': self.written,
+                    'dropped': self.dropped, 'flushes': self.flushes}
+
+audit_log = AuditLogger()
+atexit.register(audit_log.close)
+
+def record(action: str, target_type: str, target_id=None, details: Optional[dict] = None,
+           actor: Optional[str] = None):
+    audit_log.record(action, target_type, target_id, details, actor)
+
+# ----------------------------------------------------------------------
+# Item Hook
+# ----------------------------------------------------------------------
+def _summarize_filters(filters):
+    """Explicit id sets can hold 100k ids; keep their size, not their contents."""
+    summary = {}
+    for key, value in (filters or {}).items():
+        if key in ('ids', 'exclude_ids') and value is not None:
+            summary[f"{key}_count"] = len(value)
+        else:
+            summary[key] = value
+    return summary
+
+def _on_item_change(event, item_id, details):
+    details = dict(details)
+    if 'filters' in details:
+        details['filters'] = _summarize_filters(details['filters'])
+
+    if event == 'bulk':
+        action = f"item.bulk_{details.pop('operation', 'change')}"
+    elif details.pop('restored', False):
+        action = 'item.restore'
+    elif event == 'update' and 'image_path' in details:
+        action = 'item.image'
+    else:
+        action = ITEM_ACTIONS.get(event, f"item.{event}")
+    record(action, 'item', item_id, details)
+
+add_item_listener(_on_item_change, with_details=True)
+
+# ----------------------------------------------------------------------
+# Queries (viewer)
+# ----------------------------------------------------------------------
+def _build_audit_filters(actor=None, action=None, target_type=None, target_id=None,
+                         date_from=None, date_to=None):
+    clauses, params = [], []
+    if actor:
+        clauses.append("actor = ?")
+        params.append(actor)
+    if action:
+        # 'item.' matches every item action; a range keeps idx_audit_action usable
+        if action.endswith('.'):
+            clauses.append("action >= ? AND action < ?")
+            params.extend([action, action[:-1] + '/'])
+        else:
+            clauses.append("action = ?")
+            params.append(action)
+    if target_type:
+        clauses.append("target_type = ?")
+        params.append(target_type)
+    if target_id not in (None, ''):
+        clauses.append("target_id = ?")
+        params.append(str(target_id))
+    if date_from:
+        clauses.append("created_at >= ?")
+        params.append(f"{date_from} 00:00:00")
+    if date_to:
+        # Inclusive end date: everything before the start of the next day
+        next_day = date.fromisoformat(str(date_to)) + timedelta(days=1)
+        clauses.append("created_at < ?")
+        params.append(f"{next_day} 00:00:00")
+    where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+    return where, params
+
+def search_audit(limit=50, offset=0, **filters):
+    """One page of audit entries, newest first."""
+    where, params = _build_audit_filters(**filters)
+    return execute_query(
+        f"SELECT id, created_at, actor, action, target_type, target_id, details FROM audit_log{where} "
+        "ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?",
+        params + [int(limit), int(offset)]
+    )
+
+def count_audit(**filters):
+    where, params = _build_audit_filters(**filters)
+    return execute_query(f"SELECT COUNT(*) as c FROM audit_log{where}", params, fetch_one=True)['c']
+
+def list_audit_actors():
+    return [row['actor'] for row in execute_query("SELECT DISTINCT actor FROM audit_log ORDER BY actor")]
+
+def list_audit_actions():
+    return [row['action'] for row in execute_query("SELECT DISTINCT action FROM audit_log ORDER BY action")]
@@ -0,0 +1,92 @@
+"""
+audit_viewer.py
+===============
+Admin page for browsing the audit trail (paginated, filterable).
+"""
+import json
+
+import streamlit as st
+import pandas as pd
+
+from audit import audit_log, search_audit, count_audit, list_audit_actors, list_audit_actions
+
+PAGE_SIZE = 50
+
+ACTION_GROUPS = {
+    "ทั้งหมด": None,
+    "ไอเท็มทั้งหมด": "item.",
+    "ข้อมูลหลักทั้งหมด": "master.",
+    "ผู้ใช้ทั้งหมด": "user.",
+}
+
+def _format_details(details):
+    if not details:
+        return ""
+    try:
+        data = json.loads(details)
+    except ValueError:
+        return details
+    return ", ".join(f"{key}={value}" for key, value in data.items())
+
+def render_audit_page():
+    st.markdown("## 📜 บันทึกการแก้ไข")
+    st.markdown("---")
+
+    # Show entries queued in this process too
+    audit_log.flush()
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        actors = ["ทั้งหมด"] + list_audit_actors()
+        actor = st.selectbox("ผู้แก้ไข", actors)
+    with col2:
+        actions = list(ACTION_GROUPS) + list_audit_actions()
+        action_label = st.selectbox("การกระทำ", actions)
+    with col3:
+        target_id = st.text_input("ID เป้าหมาย", placeholder="เช่น 42 หรือ username")
+
+    col4, col5 = st.columns(2)
+    with col4:
+        date_from = st.date_input("ตั้งแต่วันที่", value=None)
+    with col5:
+        date_to = st.date_input("ถึงวันที่", value=None)
+
+    filters = {
+        'actor': None if actor == "ทั้งหมด" else actor,
+        'action': ACTION_GROUPS.get(action_label, action_label),
+        'target_id': target_id.strip() or None,
+        'date_from': date_from,
+        'date_to': date_to,
+    }
+
+    total = count_audit(**filters)
+    if not total:
+        st.info("ไม่พบรายการที่ตรงกับเงื่อนไข")
+        return
+
+    total_pages = (total + PAGE_SIZE - 1) // PAGE_SIZE
+    page = 1
+    if total_pages > 1:
+        page = st.number_input("หน้า", min_value=1, max_value=total_pages, value=1)
+    st.caption(f"ทั้งหมด {total:,} รายการ • หน้า {page}/{total_pages}")
+
+    rows = search_audit(limit=PAGE_SIZE, offset=(page - 1) * PAGE_SIZE, **filters)
+    df = pd.DataFrame([{
+        "เวลา": row['created_at'],
+        "ผู้แก้ไข": row['actor'],
+        "การกระทำ": row['action'],
+        "ประเภท": row['target_type'],
+        "ID": row['target_id'] or "",
+        "รายละเอียด": _format_details(row['details']),
+    } for row in rows])
+    st.dataframe(df, use_container_width=True, hide_index=True)
+
+    stats = audit_log.stats()
+    if stats['dropped']:
+        st.warning(f"⚠️ มีรายการที่ไม่ได้บันทึกเนื่องจากคิวเต็ม {stats['dropped']} รายการ")
+
+def main():
+    render_audit_page()
+
+if __name__ == "__main__":
+    main()
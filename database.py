@@ -6,20 +6,31 @@ FIXED: Return ID in rarities list for KeyError fix
 FIXED: Added check_duplicate_name function
 """
 import sqlite3
+import difflib
+import json
 import os
+import time
+import uuid
+import zlib
 from contextlib import contextmanager
+from functools import lru_cache
 from threading import Lock
 
 __all__ = [
     'init_database', 'execute_query', 'get_db_connection',
     'get_all_item_types', 'get_all_rarities', 'get_all_locations', 'get_all_tiers',
-    'clear_master_cache', 'create_item', 'update_item', 'delete_item',
+    'get_data_version', 'clear_master_cache', 'create_item', 'update_item', 'delete_item',
     'get_item_by_id', 'get_all_items_with_details', 'search_items',
-    'check_duplicate_name'
+    'count_items', 'search_item_ids', 'get_item_choices', 'delete_items',
+    'bulk_update_items', 'swap_item_image', 'restore_item', 'get_trashed_items', 'count_trashed_items',
+    'purge_deleted_items', 'is_image_referenced', 'remove_unreferenced_images',
+    'create_items_bulk', 'find_existing_names',
+    'render_description', 'backfill_descriptions', 'check_duplicate_name', 'add_item_listener',
+    'list_item_revisions', 'get_item_revision', 'diff_item_revisions'
 ]
 
 DB_PATH = "item_wiki.db"
-_SCHEMA_VERSION = 2
+_SCHEMA_VERSION = 11
 _LOCK = Lock()
 
 # ----------------------------------------------------------------------
@@ -64,6 +75,24 @@ def init_database():
             _migrate_v1(cursor)
         if current_version < 2:
             _migrate_v2(cursor)
+        if current_version < 3:
+            _migrate_v3(cursor)
+        if current_version < 4:
+            _migrate_v4(cursor)
+        if current_version < 5:
+            _migrate_v5(cursor)
+        if current_version < 6:
+            _migrate_v6(cursor)
+        if current_version < 7:
+            _migrate_v7(cursor)
+        if current_version < 8:
+            _migrate_v8(cursor)
+        if current_version < 9:
+            _migrate_v9(cursor)
+        if current_version < 10:
+            _migrate_v10(cursor)
+        if current_version < 11:
+            _migrate_v11(cursor)
 
         if current_version < _SCHEMA_VERSION:
             cursor.execute("INSERT INTO schema_version (version) VALUES (?)", (_SCHEMA_VERSION,))
@@ -179,6 +208,169 @@ def _migrate_v2(cursor):
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_items_type ON items(type_id)")
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_items_rarity ON items(rarity_id)")
 
+def _migrate_v3(cursor):
+    """Catalog data version, bumped by triggers on every item/master-data write."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS data_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    cursor.execute("INSERT OR IGNORE INTO data_version (id, version) VALUES (1, 0)")
+
+    for table in ('items', 'item_types', 'rarities', 'drop_locations', 'tiers'):
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.lower()}_version
+                AFTER {event} ON {table}
+                BEGIN
+                    UPDATE data_version SET version = version + 1 WHERE id = 1;
+                END
+            """)
+
+def _migrate_v4(cursor):
+    """Index for 'recently updated' pickers."""
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_items_updated ON items(updated_at)")
+
+def _migrate_v5(cursor):
+    """Soft delete: trashed items keep their row with deleted_at set."""
+    cursor.execute("PRAGMA table_info(items)")
+    if 'deleted_at' not in [col[1] for col in cursor.fetchall()]:
+        cursor.execute("ALTER TABLE items ADD COLUMN deleted_at TIMESTAMP")
+
+    # Partial indexes: live reads (deleted_at IS NULL) and the trash/purge scan
+    # each get an index that only contains their own rows
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_items_active_name ON items(name) WHERE deleted_at IS NULL")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_items_active_updated ON items(updated_at) WHERE deleted_at IS NULL")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_items_deleted ON items(deleted_at) WHERE deleted_at IS NOT NULL")
+    cursor.execute("DROP INDEX IF EXISTS idx_items_updated")
+
+def _migrate_v6(cursor):
+    """Image reference counts, kept exact by triggers on every items write."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS images (
+            path TEXT PRIMARY KEY,
+            refcount INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("DELETE FROM images")
+    cursor.execute("""
+        INSERT INTO images (path, refcount)
+        SELECT image_path, COUNT(*) FROM items
+        WHERE image_path IS NOT NULL AND image_path != 'assets/images/placeholder.png'
+        GROUP BY image_path
+    """)
+
+    acquire = """
+        INSERT INTO images (path, refcount) VALUES (NEW.image_path, 1)
+        ON CONFLICT(path) DO UPDATE SET refcount = refcount + 1;
+    """
+    release = """
+        UPDATE images SET refcount = refcount - 1 WHERE path = OLD.image_path;
+        DELETE FROM images WHERE path = OLD.image_path AND refcount <= 0;
+    """
+    counted_new = "NEW.image_path IS NOT NULL AND NEW.image_path != 'assets/images/placeholder.png'"
+    counted_old = "OLD.image_path IS NOT NULL AND OLD.image_path != 'assets/images/placeholder.png'"
+    changed = "OLD.image_path IS NOT NEW.image_path"
+
+    for name, event, condition, body in (
+        ('trg_items_image_insert', 'INSERT', counted_new, acquire),
+        ('trg_items_image_delete', 'DELETE', counted_old, release),
+        ('trg_items_image_update_new', 'UPDATE OF image_path', f"{changed} AND {counted_new}", acquire),
+        ('trg_items_image_update_old', 'UPDATE OF image_path', f"{changed} AND {counted_old}", release),
+    ):
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {name}
+            AFTER {event} ON items
+            WHEN {condition}
+            BEGIN
+                {body}
+            END
+        """)
+
+def _migrate_v7(cursor):
+    """Sanitized description HTML and excerpt, stored at write time (NULL = not rendered yet)."""
+    cursor.execute("PRAGMA table_info(items)")
+    columns = [col[1] for col in cursor.fetchall()]
+    if 'description_html' not in columns:
+        cursor.execute("ALTER TABLE items ADD COLUMN description_html TEXT")
+    if 'description_excerpt' not in columns:
+        cursor.execute("ALTER TABLE items ADD COLUMN description_excerpt TEXT")
+
+    # Existing rows are rendered by backfill_descriptions(); this index
+    # shrinks to nothing once it has run
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_items_description_pending ON items(id) WHERE description_html IS NULL")
+
+def _migrate_v8(cursor):
+    """User accounts (security.user_store); replaces the credentials block of auth_config.yaml."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT NOT NULL UNIQUE,
+            email TEXT NOT NULL DEFAULT '',
+            name TEXT NOT NULL DEFAULT '',
+            password TEXT NOT NULL,
+            role TEXT NOT NULL DEFAULT 'viewer' CHECK (role IN ('admin', 'viewer')),
+            force_password_change INTEGER NOT NULL DEFAULT 0,
+            failed_login_attempts INTEGER NOT NULL DEFAULT 0,
+            created_at TEXT,
+            created_by TEXT,
+            updated_at TEXT
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_email ON users(email COLLATE NOCASE)")
+
+def _migrate_v9(cursor):
+    """Audit trail of item, master data and user changes (written in batches by audit.py)."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS audit_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            created_at TEXT NOT NULL,
+            actor TEXT NOT NULL,
+            action TEXT NOT NULL,
+            target_type TEXT NOT NULL,
+            target_id TEXT,
+            details TEXT
+        )
+    """)
+    # Viewer filters: newest first, optionally by actor, action or target
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_audit_created ON audit_log(created_at)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_audit_actor ON audit_log(actor, created_at)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_audit_action ON audit_log(action, created_at)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_audit_target ON audit_log(target_type, target_id, created_at)")
+
+def _migrate_v10(cursor):
+    """
+    Item revision history. Each row holds the values an edit replaced
+    (changed fields only), so the items row stays the current revision.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS item_revisions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            item_id INTEGER NOT NULL REFERENCES items(id) ON DELETE CASCADE,
+            revision INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            actor TEXT,
+            fields TEXT NOT NULL,
+            delta BLOB NOT NULL,
+            compressed INTEGER NOT NULL DEFAULT 0,
+            UNIQUE (item_id, revision)
+        )
+    """)
+
+def _migrate_v11(cursor):
+    """items.current_revision, so recording a revision needs no MAX() lookup."""
+    cursor.execute("PRAGMA table_info(items)")
+    columns = [col[1] for col in cursor.fetchall()]
+    if 'current_revision' not in columns:
+        cursor.execute("ALTER TABLE items ADD COLUMN current_revision INTEGER NOT NULL DEFAULT 1")
+    cursor.execute("""
+        UPDATE items SET current_revision = (
+            SELECT MAX(r.revision) FROM item_revisions r WHERE r.item_id = items.id
+        )
+        WHERE id IN (SELECT item_id FROM item_revisions)
+    """)
+
 # ----------------------------------------------------------------------
 # Core Query Execution
 # ----------------------------------------------------------------------
@@ -256,11 +448,282 @@ def get_all_tiers():
 
     return _get_tiers()
 
+def get_data_version():
+    """Current catalog data version; changes whenever items or master data change."""
+    row = execute_query("SELECT version FROM data_version WHERE id = 1", fetch_one=True)
+    return row['version'] if row else 0
+
 def clear_master_cache():
     """Clear all cached master data."""
     import streamlit as st
     st.cache_data.clear()
 
+# ----------------------------------------------------------------------
+# Item Change Listeners - in-process hooks fired after item writes
+# ----------------------------------------------------------------------
+_item_listeners = []
+
+def add_item_listener(callback, with_details=False):
+    """
+    Register callback(event, item_id); event is 'create', 'update' or 'delete'.
+    Set-based writes fire a single 'bulk' event with item_id None.
+    with_details=True calls callback(event, item_id, details) with a dict
+    describing the write (name, operation, count, ...).
+    """
+    if all(registered is not callback for registered, _ in _item_listeners):
+        _item_listeners.append((callback, with_details))
+
+def _notify_item_listeners(event, item_id, **details):
+    """Fire listeners; a failing listener never fails the write that triggered it."""
+    for callback, with_details in list(_item_listeners):
+        try:
+            if with_details:
+                callback(event, item_id, details)
+            else:
+                callback(event, item_id)
+        except Exception as e:
+            print(f"Item listener error ({event} {item_id}): {e}")
+
+# ----------------------------------------------------------------------
+# Description Rendering
+# ----------------------------------------------------------------------
+@lru_cache(maxsize=256)
+def render_description(description):
+    """
+    (sanitized HTML, plain-text excerpt) for a description, computed when
+    an item is written so pages never sanitize on read. Call it before
+    opening a connection: the first call imports the sanitizer.
+    """
+    from security.sanitizer import html_sanitizer
+
+    return html_sanitizer.render_description(description or "")
+
+def _render_appended_description(fragment):
+    """
+    (html, plain text, excerpt length) of a line appended by bulk edit.
+    Stored HTML is already sanitized, so the fragment is rendered once and
+    joined on in SQL instead of re-rendering every row.
+    """
+    from security.sanitizer import html_sanitizer
+
+    return render_description(fragment)[0], html_sanitizer.plain_text(fragment), html_sanitizer.EXCERPT_LENGTH
+
+def backfill_descriptions(batch_size=500):
+    """Render one batch of rows that predate stored descriptions; returns the rows filled."""
+    rows = execute_query(
+        "SELECT id, description FROM items WHERE description_html IS NULL ORDER BY id LIMIT ?",
+        (int(batch_size),)
+    )
+    if not rows:
+        return 0
+
+    updates = [(*render_description(row['description']), row['id']) for row in rows]
+    try:
+        with get_db_connection() as conn:
+            # A row edited meanwhile already has its own rendering
+            conn.executemany(
+                "UPDATE items SET description_html = ?, description_excerpt = ? "
+                "WHERE id = ? AND description_html IS NULL",
+                updates
+            )
+    except sqlite3.Error as e:
+        raise RuntimeError(f"Database error: {e}") from e
+    return len(updates)
+
+# ----------------------------------------------------------------------
+# Item Revisions - reverse deltas: each revision stores what an edit replaced
+# ----------------------------------------------------------------------
+REVISION_FIELDS = ('name', 'type_id', 'rarity_id', 'location_id', 'tier_id', 'description', 'image_path')
+TEXT_DELTA_FIELDS = ('description',)
+TEXT_DELTA_MIN_LENGTH = 80     # shorter text is stored as-is
+TEXT_DIFF_MAX_WORK = 1_000_000 # len(old) * len(new) above which the changed span is stored whole
+COMPRESS_MIN_BYTES = 256       # deltas larger than this are zlib-compressed
+
+def _text_delta(new, old):
+    """
+    Ops that rebuild `old` from `new`: ["=", n] copies n chars of new,
+    ["-", n] skips n chars, ["+", text] inserts text. Anything left of
+    new after the last op is dropped.
+    """
+    prefix = 0
+    limit = min(len(new), len(old))
+    while prefix < limit and new[prefix] == old[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and new[-1 - suffix] == old[-1 - suffix]:
+        suffix += 1
+
+    new_mid = new[prefix:len(new) - suffix]
+    old_mid = old[prefix:len(old) - suffix]
+    ops = [["=", prefix]] if prefix else []
+
+    if len(new_mid) * len(old_mid) <= TEXT_DIFF_MAX_WORK:
+        matcher = difflib.SequenceMatcher(None, new_mid, old_mid, autojunk=False)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == 'equal':
+                ops.append(["=", i2 - i1])
+                continue
+            if i2 > i1:
+                ops.append(["-", i2 - i1])
+            if j2 > j1:
+                ops.append(["+", old_mid[j1:j2]])
+    else:
+        if new_mid:
+            ops.append(["-", len(new_mid)])
+        if old_mid:
+            ops.append(["+", old_mid])
+
+    if suffix:
+        ops.append(["=", suffix])
+    return ops
+
+def _apply_text_delta(new, ops):
+    parts = []
+    pos = 0
+    for op, arg in ops:
+        if op == "=":
+            parts.append(new[pos:pos + arg])
+            pos += arg
+        elif op == "-":
+            pos += arg
+        else:
+            parts.append(arg)
+    return "".join(parts)
+
+def _build_revision_delta(old, new):
+    """Changed fields of `old` relative to `new`; long text becomes a text delta (key '~field')."""
+    delta = {}
+    for field in REVISION_FIELDS:
+        old_value, new_value = old[field], new[field]
+        if old_value == new_value:
+            continue
+        if (field in TEXT_DELTA_FIELDS and old_value and new_value
+                and max(len(old_value), len(new_value)) >= TEXT_DELTA_MIN_LENGTH):
+            delta[f"~{field}"] = _text_delta(new_value, old_value)
+        else:
+            delta[field] = old_value
+    return delta
+
+def _encode_delta(delta):
+    data = json.dumps(delta, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    if len(data) > COMPRESS_MIN_BYTES:
+        packed = zlib.compress(data, 6)
+        if len(packed) < len(data):
+            return packed, 1
+    return data.decode('utf-8'), 0
+
+def _decode_delta(row):
+    data = row['delta']
+    if row['compressed']:
+        data = zlib.decompress(data)
+    if isinstance(data, bytes):
+        data = data.decode('utf-8')
+    return json.loads(data)
+
+def _apply_revision_delta(state, delta):
+    for key, value in delta.items():
+        if key.startswith('~'):
+            field = key[1:]
+            state[field] = _apply_text_delta(state[field] or "", value)
+        else:
+            state[key] = value
+
+def _revision_actor():
+    try:
+        from audit import current_actor
+        return current_actor()
+    except ImportError:
+        return None
+
+def _record_revision(conn, item_id, old, new, actor):
+    """Insert the reverse delta for one edit (inside the caller's transaction)."""
+    delta = _build_revision_delta(old, new)
+    if not delta:
+        return None
+    blob, compressed = _encode_delta(delta)
+    fields = ",".join(sorted(key.lstrip('~') for key in delta))
+    conn.execute(
+        """
+        INSERT INTO item_revisions (item_id, revision, actor, fields, delta, compressed)
+        SELECT id, current_revision + 1, ?, ?, ?, ? FROM items WHERE id = ?
+        """,
+        (actor, fields, blob, compressed, item_id)
+    )
+    conn.execute("UPDATE items SET current_revision = current_revision + 1 WHERE id = ?", (item_id,))
+
+def _current_revision_state(item_id):
+    row = execute_query(
+        f"SELECT {', '.join(REVISION_FIELDS)} FROM items WHERE id = ?",
+        (item_id,),
+        fetch_one=True
+    )
+    return dict(row) if row else None
+
+def list_item_revisions(item_id):
+    """
+    Revision headers, newest first: revision, created_at, actor and the
+    fields that edit changed. Revision 1 is the item as created.
+    """
+    rows = execute_query(
+        "SELECT revision, created_at, actor, fields FROM item_revisions "
+        "WHERE item_id = ? ORDER BY revision DESC",
+        (item_id,)
+    )
+    return [{**dict(row), 'fields': row['fields'].split(',')} for row in rows]
+
+def _revision_deltas_after(item_id, revision):
+    """Deltas newer than `revision`, newest first, plus the item's latest revision number."""
+    rows = execute_query(
+        "SELECT revision, delta, compressed FROM item_revisions "
+        "WHERE item_id = ? AND revision > ? ORDER BY revision DESC",
+        (item_id, int(revision))
+    )
+    if rows:
+        return rows, rows[0]['revision']
+    latest = execute_query(
+        "SELECT current_revision FROM items WHERE id = ?",
+        (item_id,),
+        fetch_one=True
+    )
+    return rows, latest['current_revision'] if latest else 1
+
+def get_item_revision(item_id, revision):
+    """Tracked fields of an item as they were at `revision` (None if unknown)."""
+    state = _current_revision_state(item_id)
+    if state is None or revision < 1:
+        return None
+    rows, latest = _revision_deltas_after(item_id, revision)
+    if revision > latest:
+        return None
+    for row in rows:
+        _apply_revision_delta(state, _decode_delta(row))
+    return state
+
+def diff_item_revisions(item_id, revision_a, revision_b):
+    """
+    {field: (value at revision_a, value at revision_b)} for fields that
+    differ. One backward pass from the current row over the deltas newer
+    than the older of the two revisions.
+    """
+    low, high = sorted((int(revision_a), int(revision_b)))
+    state = _current_revision_state(item_id)
+    if state is None or low < 1:
+        return None
+    rows, latest = _revision_deltas_after(item_id, low)
+    if high > latest:
+        return None
+
+    # Applying revision r's delta turns the state into revision r - 1
+    high_state = dict(state) if high == latest else None
+    for row in rows:
+        _apply_revision_delta(state, _decode_delta(row))
+        if row['revision'] - 1 == high:
+            high_state = dict(state)
+
+    states = {low: state, high: high_state}
+    a, b = states[int(revision_a)], states[int(revision_b)]
+    return {field: (a[field], b[field]) for field in REVISION_FIELDS if a[field] != b[field]}
+
 # ----------------------------------------------------------------------
 # Item Repository
 # ----------------------------------------------------------------------
@@ -271,57 +734,312 @@ def create_item(name, type_id, rarity_id, location_id, tier_id, description="",
 
     # Check duplicate
     dup = execute_query(
-        "SELECT id FROM items WHERE LOWER(name) = LOWER(?)",
+        "SELECT id FROM items WHERE LOWER(name) = LOWER(?) AND deleted_at IS NULL",
         (name.strip(),),
         fetch_one=True
     )
     if dup:
         raise ValueError(f"ไอเท็ม '{name}' มีอยู่แล้ว")
 
+    description_html, description_excerpt = render_description(description)
     query = """
-        INSERT INTO items (name, type_id, rarity_id, location_id, tier_id, description, image_path)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
+        INSERT INTO items (name, type_id, rarity_id, location_id, tier_id, description,
+                           description_html, description_excerpt, image_path)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """
+    item_id = execute_query(query, (name.strip(), type_id, rarity_id, location_id, tier_id, description,
+                                    description_html, description_excerpt, image_path))
+    _notify_item_listeners('create', item_id, name=name.strip())
+    return item_id
+
+def create_items_bulk(rows):
+    """
+    Insert many items in one transaction; rows are dicts with the
+    create_item fields. Returns the new ids in row order.
     """
-    return execute_query(query, (name.strip(), type_id, rarity_id, location_id, tier_id, description, image_path))
+    if not rows:
+        return []
+
+    names = [row['name'].strip() for row in rows]
+    if len({name.lower() for name in names}) != len(names):
+        raise ValueError("มีชื่อไอเท็มซ้ำกันในชุดข้อมูล")
+
+    taken = find_existing_names(names)
+    if taken:
+        raise ValueError(f"ไอเท็มมีอยู่แล้ว: {', '.join(sorted(taken)[:5])}")
+
+    # Rendered before the connection is opened, never under _LOCK
+    values = [(name, row['type_id'], row['rarity_id'], row['location_id'], row['tier_id'],
+               row.get('description', ''), *render_description(row.get('description', '')),
+               row.get('image_path') or "assets/images/placeholder.png")
+              for row, name in zip(rows, names)]
+
+    ids = []
+    try:
+        with get_db_connection() as conn:
+            for value in values:
+                cursor = conn.execute(
+                    """
+                    INSERT INTO items (name, type_id, rarity_id, location_id, tier_id, description,
+                                       description_html, description_excerpt, image_path)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    value
+                )
+                ids.append(cursor.lastrowid)
+    except sqlite3.IntegrityError as e:
+        raise ValueError(f"ข้อมูลไม่ถูกต้อง: {e}") from e
+    except sqlite3.Error as e:
+        raise RuntimeError(f"Database error: {e}") from e
+
+    _notify_item_listeners('bulk', None, operation='create', count=len(ids))
+    return ids
 
 def update_item(item_id, name, type_id, rarity_id, location_id, tier_id, description, image_path):
     """Update existing item."""
     # Check duplicate excluding self
     dup = execute_query(
-        "SELECT id FROM items WHERE LOWER(name) = LOWER(?) AND id != ?",
+        "SELECT id FROM items WHERE LOWER(name) = LOWER(?) AND id != ? AND deleted_at IS NULL",
         (name.strip(), item_id),
         fetch_one=True
     )
     if dup:
         raise ValueError(f"ไอเท็ม '{name}' มีอยู่แล้ว")
 
+    description_html, description_excerpt = render_description(description)
     query = """
         UPDATE items 
         SET name = ?, type_id = ?, rarity_id = ?, location_id = ?, 
-            tier_id = ?, description = ?, image_path = ?, updated_at = CURRENT_TIMESTAMP
+            tier_id = ?, description = ?, description_html = ?, description_excerpt = ?,
+            image_path = ?, updated_at = CURRENT_TIMESTAMP
         WHERE id = ?
     """
-    execute_query(query, (name.strip(), type_id, rarity_id, location_id, tier_id, description, image_path, item_id))
+    new = {'name': name.strip(), 'type_id': type_id, 'rarity_id': rarity_id, 'location_id': location_id,
+           'tier_id': tier_id, 'description': description, 'image_path': image_path}
+    actor = _revision_actor()
+    try:
+        with get_db_connection() as conn:
+            old = conn.execute(
+                f"SELECT {', '.join(REVISION_FIELDS)} FROM items WHERE id = ?", (item_id,)
+            ).fetchone()
+            conn.execute(query, (name.strip(), type_id, rarity_id, location_id, tier_id, description,
+                                 description_html, description_excerpt, image_path, item_id))
+            if old:
+                _record_revision(conn, item_id, old, new, actor)
+    except sqlite3.IntegrityError as e:
+        if "UNIQUE constraint failed" in str(e):
+            raise ValueError("ข้อมูลนี้มีอยู่แล้วในระบบ") from e
+        raise ValueError(f"ข้อมูลไม่ถูกต้อง: {e}") from e
+    except sqlite3.Error as e:
+        raise RuntimeError(f"Database error: {e}") from e
+    _notify_item_listeners('update', item_id, name=name.strip())
 
 def delete_item(item_id):
-    """Delete item and its image."""
-    # Get image path before delete
-    item = execute_query("SELECT image_path FROM items WHERE id = ?", (item_id,), fetch_one=True)
-    if item and item['image_path'] and item['image_path'] != "assets/images/placeholder.png":
-        try:
-            if os.path.exists(item['image_path']):
-                os.remove(item['image_path'])
-        except OSError:
-            pass
+    """Move item to the trash; the purge job removes the row and image later."""
+    execute_query(
+        "UPDATE items SET deleted_at = CURRENT_TIMESTAMP WHERE id = ? AND deleted_at IS NULL",
+        (item_id,)
+    )
+    _notify_item_listeners('delete', item_id)
+
+def delete_items(filters):
+    """
+    Move every item matching a search_items-style filter to the trash in one
+    UPDATE. An empty filter dict means every item. Returns the number of rows.
+    """
+    if filters is None:
+        raise ValueError("ต้องระบุเงื่อนไขการลบ")
+
+    where, params = _build_item_filters(filters)
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.execute(
+                "UPDATE items SET deleted_at = CURRENT_TIMESTAMP "
+                f"WHERE id IN (SELECT i.id FROM items i WHERE 1=1{where})",
+                params
+            )
+            deleted = cursor.rowcount
+    except sqlite3.Error as e:
+        raise RuntimeError(f"Database error: {e}") from e
+
+    if deleted:
+        _notify_item_listeners('bulk', None, operation='delete', count=deleted, filters=filters)
+    return deleted
+
+def swap_item_image(item_id, expected_path, new_path):
+    """
+    Point an item at a processed image, but only if it still shows
+    expected_path (a newer edit wins). Returns True when swapped.
+    """
+    actor = _revision_actor()
+    with get_db_connection() as conn:
+        swapped = conn.execute(
+            "UPDATE items SET image_path = ?, updated_at = CURRENT_TIMESTAMP "
+            "WHERE id = ? AND image_path IS ?",
+            (new_path, item_id, expected_path)
+        ).rowcount
+        # A replaced image is an edit; the first upload of a new item is not
+        if swapped and expected_path != "assets/images/placeholder.png":
+            row = conn.execute(
+                f"SELECT {', '.join(REVISION_FIELDS)} FROM items WHERE id = ?", (item_id,)
+            ).fetchone()
+            old = {**dict(row), 'image_path': expected_path}
+            _record_revision(conn, item_id, old, dict(row), actor)
+    if swapped:
+        _notify_item_listeners('update', item_id, image_path=new_path)
+    return bool(swapped)
+
+def restore_item(item_id):
+    """Bring a trashed item back, unless an active item has taken its name."""
+    item = execute_query(
+        "SELECT name FROM items WHERE id = ? AND deleted_at IS NOT NULL",
+        (item_id,),
+        fetch_one=True
+    )
+    if not item:
+        raise ValueError("ไม่พบไอเท็มในถังขยะ")
+    if check_duplicate_name(item['name']):
+        raise ValueError(f"ไอเท็ม '{item['name']}' มีอยู่แล้ว")
+
+    execute_query("UPDATE items SET deleted_at = NULL WHERE id = ?", (item_id,))
+    _notify_item_listeners('create', item_id, name=item['name'], restored=True)
+
+def get_trashed_items(limit=50, offset=0):
+    """Trashed items, most recently deleted first (uses idx_items_deleted)."""
+    query = """
+        SELECT i.id, i.name, i.deleted_at, r.name as rarity_name, r.color
+        FROM items i
+        JOIN rarities r ON i.rarity_id = r.id
+        WHERE i.deleted_at IS NOT NULL
+        ORDER BY i.deleted_at DESC, i.id DESC
+        LIMIT ? OFFSET ?
+    """
+    return execute_query(query, (int(limit), int(offset)))
+
+def count_trashed_items():
+    row = execute_query("SELECT COUNT(*) as c FROM items WHERE deleted_at IS NOT NULL", fetch_one=True)
+    return row['c'] if row else 0
+
+def purge_deleted_items(older_than_days=30, batch_size=500, item_ids=None):
+    """
+    Permanently remove one batch of trashed items deleted more than
+    older_than_days ago (or exactly item_ids), then unlink their images.
+    Images are unlinked only once no other row references them.
+    Returns the number of rows removed; call repeatedly until it returns 0.
+    """
+    query = """
+        SELECT id, image_path FROM items
+        WHERE deleted_at IS NOT NULL AND deleted_at <= datetime('now', ?)
+    """
+    params = [f"-{int(older_than_days)} days"]
+    if item_ids is not None:
+        query += " AND id IN (SELECT value FROM json_each(?))"
+        params.append(json.dumps(list(item_ids)))
+    query += " ORDER BY deleted_at LIMIT ?"
+    params.append(int(batch_size))
+
+    try:
+        with get_db_connection() as conn:
+            rows = conn.execute(query, params).fetchall()
+            if not rows:
+                return 0
+            conn.execute(
+                "DELETE FROM items WHERE id IN (SELECT value FROM json_each(?))",
+                (json.dumps([row['id'] for row in rows]),)
+            )
+    except sqlite3.Error as e:
+        raise RuntimeError(f"Database error: {e}") from e
 
-    execute_query("DELETE FROM items WHERE id = ?", (item_id,))
+    # Files go only after the rows are committed; shared (content-addressed)
+    # images stay while anything still refers to them
+    remove_unreferenced_images({row['image_path'] for row in rows if row['image_path']})
+    return len(rows)
+
+BULK_EDIT_FIELDS = ('type_id', 'rarity_id', 'location_id', 'tier_id')
+
+def bulk_update_items(filters, changes=None, description_append=""):
+    """
+    Apply field changes to every item matching a search_items-style filter
+    in a single UPDATE. changes may set any of BULK_EDIT_FIELDS;
+    description_append is added as a new line. Returns the number of updated rows.
+    """
+    if filters is None:
+        raise ValueError("ต้องระบุเงื่อนไขการแก้ไข")
+
+    changes = {field: value for field, value in (changes or {}).items() if value is not None}
+    unknown = set(changes) - set(BULK_EDIT_FIELDS)
+    if unknown:
+        raise ValueError(f"แก้ไขหลายรายการไม่รองรับฟิลด์: {', '.join(sorted(unknown))}")
+
+    assignments = [f"{field} = ?" for field in changes]
+    params = list(changes.values())
+
+    if description_append:
+        fragment_html, fragment_plain, excerpt_limit = _render_appended_description(description_append)
+        # Rows not rendered yet (description_html NULL) stay NULL for backfill_descriptions
+        combined_plain = (
+            "CASE WHEN COALESCE(description_excerpt, '') = '' THEN ? "
+            "WHEN ? = '' THEN description_excerpt ELSE description_excerpt || ' ' || ? END"
+        )
+        assignments.extend([
+            "description = CASE WHEN COALESCE(description, '') = '' THEN ? ELSE description || char(10) || ? END",
+            "description_html = CASE WHEN COALESCE(description, '') = '' THEN ? "
+            "ELSE description_html || '<br>' || char(10) || ? END",
+            # A truncated excerpt is its first excerpt_limit characters plus '...'
+            f"description_excerpt = CASE WHEN description_html IS NULL THEN NULL "
+            f"WHEN length({combined_plain}) > {excerpt_limit} "
+            f"THEN substr({combined_plain}, 1, {excerpt_limit}) || '...' ELSE {combined_plain} END",
+        ])
+        params.extend([description_append] * 2 + [fragment_html] * 2 + [fragment_plain] * 9)
+
+    if not assignments:
+        return 0
+
+    assignments.extend(["current_revision = current_revision + 1", "updated_at = CURRENT_TIMESTAMP"])
+    where, where_params = _build_item_filters(filters)
+
+    # Reverse deltas for every matched row, built in SQL before the UPDATE.
+    # An appended description is undone by keeping its original length.
+    delta_parts = []
+    for field in changes:
+        delta_parts.extend([f"'{field}'", f"i.{field}"])
+    if description_append:
+        delta_parts.extend(["'~description'", "json_array(json_array('=', length(COALESCE(i.description, ''))))"])
+    revision_fields = sorted(list(changes) + (['description'] if description_append else []))
+    actor = _revision_actor()
+
+    try:
+        with get_db_connection() as conn:
+            conn.execute(
+                f"""
+                INSERT INTO item_revisions (item_id, revision, actor, fields, delta, compressed)
+                SELECT i.id, i.current_revision + 1, ?, ?, json_object({', '.join(delta_parts)}), 0
+                FROM items i WHERE 1=1{where}
+                """,
+                [actor, ",".join(revision_fields)] + where_params
+            )
+            cursor = conn.execute(
+                f"UPDATE items SET {', '.join(assignments)} "
+                f"WHERE id IN (SELECT i.id FROM items i WHERE 1=1{where})",
+                params + where_params
+            )
+            updated = cursor.rowcount
+    except sqlite3.IntegrityError as e:
+        raise ValueError(f"ข้อมูลไม่ถูกต้อง: {e}") from e
+    except sqlite3.Error as e:
+        raise RuntimeError(f"Database error: {e}") from e
+
+    if updated:
+        _notify_item_listeners('bulk', None, operation='update', count=updated, filters=filters,
+                               changes=changes, description_append=description_append)
+    return updated
 
 def get_item_by_id(item_id):
     """Get single item with joined master data."""
     query = """
         SELECT 
-            i.id, i.name, i.description, i.image_path,
-            i.created_at, i.updated_at,
+            i.id, i.name, i.description, i.description_html, i.description_excerpt,
+            i.image_path, i.created_at, i.updated_at,
             t.id as type_id, t.name as type_name,
             r.id as rarity_id, r.name as rarity_name, r.color, r.icon,
             l.id as location_id, l.name as location_name,
@@ -331,7 +1049,7 @@ def get_item_by_id(item_id):
         JOIN rarities r ON i.rarity_id = r.id
         JOIN drop_locations l ON i.location_id = l.id
         JOIN tiers tr ON i.tier_id = tr.id
-        WHERE i.id = ?
+        WHERE i.id = ? AND i.deleted_at IS NULL
     """
     return execute_query(query, (item_id,), fetch_one=True)
 
@@ -339,7 +1057,7 @@ def get_all_items_with_details():
     """Get all items with complete details."""
     query = """
         SELECT 
-            i.id, i.name, i.description, i.image_path,
+            i.id, i.name, i.description, i.description_excerpt, i.image_path, i.updated_at,
             t.name as type_name,
             r.name as rarity_name, r.color, r.icon,
             l.name as location_name,
@@ -349,15 +1067,68 @@ def get_all_items_with_details():
         JOIN rarities r ON i.rarity_id = r.id
         JOIN drop_locations l ON i.location_id = l.id
         JOIN tiers tr ON i.tier_id = tr.id
+        WHERE i.deleted_at IS NULL
         ORDER BY i.name
     """
     return execute_query(query)
 
-def search_items(filters=None):
-    """Advanced search with filters."""
+def get_item_choices(limit=50, ids=None):
+    """
+    Lightweight (id, name, rarity_name) rows for item pickers.
+    Without ids: the most recently updated items (uses idx_items_active_updated).
+    """
+    query = """
+        SELECT i.id, i.name, r.name as rarity_name
+        FROM items i
+        JOIN rarities r ON i.rarity_id = r.id
+        WHERE i.deleted_at IS NULL
+    """
+    params = []
+
+    if ids is not None:
+        if not ids:
+            return []
+        query += f" AND i.id IN ({','.join(['?'] * len(ids))})"
+        params.extend(ids)
+
+    query += " ORDER BY i.updated_at DESC, i.id DESC LIMIT ?"
+    params.append(int(limit))
+    return execute_query(query, params)
+
+def _build_item_filters(filters):
+    """Translate a search filter dict into a WHERE fragment and its params."""
+    clauses = ["i.deleted_at IS NULL"]
+    params = []
+
+    if filters:
+        if filters.get('search'):
+            clauses.append("i.name LIKE ?")
+            params.append(f"%{filters['search']}%")
+
+        # Explicit id sets go in as one JSON parameter, so 100k ids never hit
+        # SQLite's bound-variable limit. An empty 'ids' list matches nothing.
+        if filters.get('ids') is not None:
+            clauses.append("i.id IN (SELECT value FROM json_each(?))")
+            params.append(json.dumps(sorted(filters['ids'])))
+        if filters.get('exclude_ids'):
+            clauses.append("i.id NOT IN (SELECT value FROM json_each(?))")
+            params.append(json.dumps(sorted(filters['exclude_ids'])))
+
+        for key, column in (('type_ids', 'type_id'), ('rarity_ids', 'rarity_id'),
+                            ('location_ids', 'location_id'), ('tier_ids', 'tier_id')):
+            if filters.get(key):
+                placeholders = ','.join(['?'] * len(filters[key]))
+                clauses.append(f"i.{column} IN ({placeholders})")
+                params.extend(filters[key])
+
+    where = "".join(f" AND {clause}" for clause in clauses)
+    return where, params
+
+def search_items(filters=None, limit=None, offset=0):
+    """Advanced search with filters. Pass limit/offset to fetch a single page."""
     query = """
         SELECT 
-            i.id, i.name, i.description, i.image_path,
+            i.id, i.name, i.description, i.description_excerpt, i.image_path, i.updated_at,
             t.name as type_name,
             r.name as rarity_name, r.color, r.icon,
             l.name as location_name,
@@ -369,39 +1140,87 @@ def search_items(filters=None):
         JOIN tiers tr ON i.tier_id = tr.id
         WHERE 1=1
     """
-    params = []
+    where, params = _build_item_filters(filters)
+    query += where + " ORDER BY i.name"
 
-    if filters:
-        if filters.get('search'):
-            query += " AND i.name LIKE ?"
-            params.append(f"%{filters['search']}%")
+    if limit is not None:
+        query += " LIMIT ? OFFSET ?"
+        params.extend([int(limit), int(offset)])
 
-        if filters.get('type_ids'):
-            placeholders = ','.join(['?'] * len(filters['type_ids']))
-            query += f" AND i.type_id IN ({placeholders})"
-            params.extend(filters['type_ids'])
+    return execute_query(query, params)
 
-        if filters.get('rarity_ids'):
-            placeholders = ','.join(['?'] * len(filters['rarity_ids']))
-            query += f" AND i.rarity_id IN ({placeholders})"
-            params.extend(filters['rarity_ids'])
+def search_item_ids(filters=None):
+    """Ids of the items matching search_items-style filters (no joins, no rows)."""
+    where, params = _build_item_filters(filters)
+    return [row['id'] for row in execute_query(f"SELECT i.id FROM items i WHERE 1=1{where}", params)]
 
-        if filters.get('location_ids'):
-            placeholders = ','.join(['?'] * len(filters['location_ids']))
-            query += f" AND i.location_id IN ({placeholders})"
-            params.extend(filters['location_ids'])
+def count_items(filters=None):
+    """Count items matching the same filters accepted by search_items."""
+    where, params = _build_item_filters(filters)
+    row = execute_query(f"SELECT COUNT(*) as c FROM items i WHERE 1=1{where}", params, fetch_one=True)
+    return row['c'] if row else 0
 
-        if filters.get('tier_ids'):
-            placeholders = ','.join(['?'] * len(filters['tier_ids']))
-            query += f" AND i.tier_id IN ({placeholders})"
-            params.extend(filters['tier_ids'])
+def is_image_referenced(image_path):
+    """True while any item (trashed ones included) still points at image_path."""
+    row = execute_query("SELECT refcount FROM images WHERE path = ?", (image_path,), fetch_one=True)
+    return bool(row and row['refcount'] > 0)
 
-    query += " ORDER BY i.name"
-    return execute_query(query, params)
+IMAGE_REUSE_GRACE_SECONDS = 3600   # a file refreshed this recently may be an upload in flight
+
+def remove_unreferenced_images(paths, grace_seconds=IMAGE_REUSE_GRACE_SECONDS):
+    """
+    Unlink image files no item references. The reference check and the
+    unlink happen while the connection (and _LOCK) is held, so no row can
+    start pointing at a file in between. An upload of the same bytes
+    reuses the file and only bumps its mtime (image_jobs.write_image_bytes)
+    before its row commits; files refreshed within grace_seconds are left
+    for orphan GC. Returns the number of files removed.
+    """
+    paths = sorted({path for path in paths if path and path != "assets/images/placeholder.png"})
+    if not paths:
+        return 0
+
+    removed = 0
+    with get_db_connection() as conn:
+        referenced = {
+            row['path'] for row in conn.execute(
+                "SELECT path FROM images WHERE refcount > 0 AND path IN (SELECT value FROM json_each(?))",
+                (json.dumps(paths),)
+            )
+        }
+        for path in paths:
+            if path in referenced:
+                continue
+            try:
+                if time.time() - os.stat(path).st_mtime < grace_seconds:
+                    continue
+                # Rename first: a reuse that bumped the file before the rename
+                # shows on the renamed file; one after it finds nothing and rewrites
+                doomed = f"{path}.{uuid.uuid4().hex}.del"
+                os.replace(path, doomed)
+                if time.time() - os.stat(doomed).st_mtime < grace_seconds:
+                    os.replace(doomed, path)
+                    continue
+                os.remove(doomed)
+                removed += 1
+            except OSError:
+                continue
+    return removed
 
 # ----------------------------------------------------------------------
 # Duplicate Check - FIXED: Added missing function
 # ----------------------------------------------------------------------
+def find_existing_names(names):
+    """Lower-cased names from `names` already used by active items (one query)."""
+    if not names:
+        return set()
+    rows = execute_query(
+        "SELECT LOWER(name) as name FROM items WHERE deleted_at IS NULL "
+        "AND LOWER(name) IN (SELECT LOWER(value) FROM json_each(?))",
+        (json.dumps([str(name).strip() for name in names]),)
+    )
+    return {row['name'] for row in rows}
+
 def check_duplicate_name(name, exclude_id=None):
     """
     Check if item name already exists in database
@@ -416,10 +1235,10 @@ def check_duplicate_name(name, exclude_id=None):
     """
     try:
         if exclude_id:
-            query = "SELECT COUNT(*) as count FROM items WHERE LOWER(name) = LOWER(?) AND id != ?"
+            query = "SELECT COUNT(*) as count FROM items WHERE LOWER(name) = LOWER(?) AND id != ? AND deleted_at IS NULL"
             result = execute_query(query, (name.strip(), exclude_id), fetch_one=True)
         else:
-            query = "SELECT COUNT(*) as count FROM items WHERE LOWER(name) = LOWER(?)"
+            query = "SELECT COUNT(*) as count FROM items WHERE LOWER(name) = LOWER(?) AND deleted_at IS NULL"
             result = execute_query(query, (name.strip(),), fetch_one=True)
 
         return result['count'] > 0 if result else False
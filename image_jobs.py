@@ -0,0 +1,274 @@
+"""
+image_jobs.py
+=============
+Content-addressed image storage and the background image processing pool.
+
+Uploads are decoded, downscaled, hashed, written and thumbnailed in worker
+processes so the Streamlit script thread only saves the item row. The row
+first points at a pending image (the placeholder for new items, the current
+image for edits) and is swapped to the processed file when the job finishes.
+"""
+import hashlib
+import io
+import multiprocessing
+import os
+import re
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+from PIL import Image
+
+PLACEHOLDER_IMAGE = "assets/images/placeholder.png"
+IMAGE_MAX_EDGE = 1024          # stored images are downscaled to this longest edge
+THUMBNAIL_SIZE = 64
+THUMBNAIL_SUFFIX = ".thumb.jpg"
+IMAGE_WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))
+FINISHED_JOBS_KEPT = 1000
+
+FORMAT_EXTENSIONS = {'PNG': '.png', 'JPEG': '.jpg', 'GIF': '.gif'}
+
+# ----------------------------------------------------------------------
+# Content-Addressed Storage
+# ----------------------------------------------------------------------
+_CONTENT_ADDRESSED = re.compile(r'^assets/images/[0-9a-f]{2}/[0-9a-f]{64}\.[a-z]+$')
+
+def content_addressed_path(data, ext):
+    """Store path for image bytes: assets/images/<first 2 hex>/<sha256><ext>."""
+    digest = hashlib.sha256(data).hexdigest()
+    return f"assets/images/{digest[:2]}/{digest}{ext}"
+
+def is_content_addressed(image_path):
+    """Content-addressed files never change, so anything derived from them can be cached forever."""
+    return bool(image_path and _CONTENT_ADDRESSED.match(str(image_path)))
+
+def thumbnail_path(image_path):
+    """Stored thumbnail for a content-addressed image (None for legacy paths)."""
+    return f"{image_path}{THUMBNAIL_SUFFIX}" if is_content_addressed(image_path) else None
+
+def _write_atomic(path, data):
+    """
+    Write through a temp file unique to this call (sessions are threads of
+    one process, so a pid-based name could be shared) and move it into place.
+    """
+    target = Path(path)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = target.with_name(f".{target.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, target)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+def _refresh_existing(path):
+    """
+    Dedup hit: bump the file's mtime so orphan GC treats it as in flight
+    again until the row referencing it commits. False if it does not exist.
+    """
+    try:
+        os.utime(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+def write_image_bytes(data, ext):
+    """Store bytes under their content hash; identical bytes are written once."""
+    path = content_addressed_path(data, ext)
+    if not _refresh_existing(path):
+        _write_atomic(path, data)
+    return path
+
+# ----------------------------------------------------------------------
+# Worker (runs in a child process)
+# ----------------------------------------------------------------------
+def process_image(data, max_edge=IMAGE_MAX_EDGE, max_pixels=None):
+    """
+    Decode once, downscale oversized stills, store content-addressed and
+    write the thumbnail. Returns the stored path plus basic metadata.
+    """
+    try:
+        img = Image.open(io.BytesIO(data))
+    except Image.UnidentifiedImageError:
+        raise ValueError("ไฟล์ไม่ใช่รูปภาพที่รองรับ (PNG, JPG, JPEG, GIF)")
+
+    with img:
+        fmt = img.format
+        if fmt not in FORMAT_EXTENSIONS:
+            raise ValueError("ไฟล์ไม่ใช่รูปภาพที่รองรับ (PNG, JPG, JPEG, GIF)")
+        if max_pixels and img.size[0] * img.size[1] > max_pixels:
+            raise ValueError("รูปภาพมีจำนวนพิกเซลมากเกินไป")
+
+        try:
+            img.load()  # the single full decode; corrupt or truncated data fails here
+        except OSError as e:
+            raise ValueError(f"ไฟล์รูปภาพเสียหาย: {e}") from e
+        stored = data
+        size = img.size
+
+        # GIFs keep their original bytes so animation survives
+        if fmt != 'GIF' and max(img.size) > max_edge:
+            resized = img.copy()
+            resized.thumbnail((max_edge, max_edge), Image.LANCZOS)
+            buffer = io.BytesIO()
+            if fmt == 'JPEG':
+                resized.convert('RGB').save(buffer, format='JPEG', quality=90)
+            else:
+                resized.save(buffer, format='PNG', optimize=True)
+            stored = buffer.getvalue()
+            size = resized.size
+
+        path = write_image_bytes(stored, FORMAT_EXTENSIONS[fmt])
+
+        thumb_file = thumbnail_path(path)
+        if not _refresh_existing(thumb_file):
+            thumb = img.convert('RGB')
+            thumb.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+            buffer = io.BytesIO()
+            thumb.save(buffer, format='JPEG', quality=70)
+            _write_atomic(thumb_file, buffer.getvalue())
+
+    return {'path': path, 'width': size[0], 'height': size[1], 'bytes': len(stored)}
+
+# ----------------------------------------------------------------------
+# Job Queue (main process)
+# ----------------------------------------------------------------------
+@dataclass
+class ImageJob:
+    id: str
+    item_id: int
+    expected_path: str
+    status: str = 'pending'  # pending | done | failed
+    image_path: Optional[str] = None
+    error: Optional[str] = None
+    done: threading.Event = field(default_factory=threading.Event)
+
+class ImageJobQueue:
+    """
+    Process-pool job queue for image work.
+
+    submit() returns at once; when a job finishes, its callback swaps the
+    item's image_path from the pending value to the processed file, but
+    only if the row still holds the pending value (a later edit wins).
+    """
+
+    def __init__(self, max_workers=IMAGE_WORKERS):
+        self.max_workers = max_workers
+        self._executor = None
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn: never fork a process that is running Streamlit's threads
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    def submit(self, data, item_id, expected_path=PLACEHOLDER_IMAGE):
+        """Queue image bytes for item_id; returns the job id to poll."""
+        job = ImageJob(id=uuid.uuid4().hex, item_id=item_id, expected_path=expected_path)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune_locked()
+
+        future = self._get_executor().submit(process_image, bytes(data))
+        future.add_done_callback(lambda f: self._finish(job, f))
+        return job.id
+
+    def process_many(self, sources, max_pixels=None, read_ahead=None):
+        """
+        Run process_image over (key, loader) pairs and yield (key, result, error)
+        as jobs complete. loader() is only called when a slot is free, so at
+        most read_ahead images are held in memory at once.
+        """
+        executor = self._get_executor()
+        limit = read_ahead or self.max_workers * 2
+        sources = iter(sources)
+        pending = {}
+        exhausted = False
+
+        while pending or not exhausted:
+            while not exhausted and len(pending) < limit:
+                try:
+                    key, loader = next(sources)
+                except StopIteration:
+                    exhausted = True
+                    break
+                try:
+                    data = loader()
+                except Exception as e:
+                    yield key, None, str(e)
+                    continue
+                pending[executor.submit(process_image, data, max_pixels=max_pixels)] = key
+
+            if not pending:
+                break
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                key = pending.pop(future)
+                try:
+                    yield key, future.result(), None
+                except Exception as e:
+                    yield key, None, str(e)
+
+    def _finish(self, job, future):
+        try:
+            result = future.result()
+            job.image_path = result['path']
+            self._swap_item_image(job)
+            job.status = 'done'
+        except Exception as e:
+            job.error = str(e)
+            job.status = 'failed'
+            print(f"Image job {job.id} for item {job.item_id} failed: {e}")
+        finally:
+            job.done.set()
+
+    @staticmethod
+    def _swap_item_image(job):
+        from database import swap_item_image
+        from utils import delete_image_file
+
+        if job.image_path == job.expected_path:
+            return
+        if swap_item_image(job.item_id, job.expected_path, job.image_path):
+            # The pending image may now be unreferenced (old image on edit)
+            delete_image_file(job.expected_path)
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def forget(self, job_id):
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def wait(self, job_id, timeout=None):
+        """Block until a job finishes (CLI/import use); returns the job."""
+        job = self.get(job_id)
+        if job:
+            job.done.wait(timeout)
+        return job
+
+    def _prune_locked(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.status != 'pending']
+        for job_id in finished[:max(0, len(finished) - FINISHED_JOBS_KEPT)]:
+            del self._jobs[job_id]
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+image_jobs = ImageJobQueue()
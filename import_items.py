@@ -7,13 +7,19 @@ Admin only - 100% separate from original code
 import streamlit as st
 import pandas as pd
 import io
+import zipfile
 from datetime import datetime
+from functools import partial
+from pathlib import PurePosixPath
 from database import (
     create_item, get_all_item_types, get_all_rarities,
-    get_all_locations, get_all_tiers, check_duplicate_name  # ✅ OK แล้ว
+    get_all_locations, get_all_tiers, check_duplicate_name,  # ✅ OK แล้ว
+    create_items_bulk, find_existing_names
 )
 from utils import load_css, refresh_master_data
+from image_jobs import image_jobs
 from security.auth import require_role
+from security.sanitizer import file_validator
 
 
 # ----------------------------------------------------------------------
@@ -23,7 +29,7 @@ class ItemImporter:
     """Handle item import from CSV/Excel"""
 
     REQUIRED_COLUMNS = ['name', 'type', 'rarity', 'drop_location', 'tier']
-    OPTIONAL_COLUMNS = ['description']
+    OPTIONAL_COLUMNS = ['description', 'image']
 
     def __init__(self):
         # Load master data for validation
@@ -52,8 +58,8 @@ class ItemImporter:
 
         return True, "✅ โครงสร้างไฟล์ถูกต้อง"
 
-    def validate_row(self, row: dict, row_num: int) -> tuple[bool, list[str]]:
-        """Validate single row of data"""
+    def validate_row(self, row: dict, row_num: int, existing_names: set = None) -> tuple[bool, list[str]]:
+        """Validate single row of data (existing_names: pre-fetched lower-cased names)"""
         errors = []
 
         # Check required fields
@@ -88,7 +94,11 @@ class ItemImporter:
             errors.append(f"แถว {row_num}: ไม่พบ Tier '{tier_name}' ในระบบ")
 
         # Check duplicate
-        if name and check_duplicate_name(name):
+        if existing_names is not None:
+            is_duplicate = name.lower() in existing_names
+        else:
+            is_duplicate = bool(name) and check_duplicate_name(name)
+        if name and is_duplicate:
             errors.append(f"แถว {row_num}: ไอเท็ม '{name}' มีอยู่แล้วในระบบ")
 
         return len(errors) == 0, errors
@@ -146,6 +156,97 @@ class ItemImporter:
 
         return results
 
+    # ------------------------------------------------------------------
+    # ZIP Import (CSV + images)
+    # ------------------------------------------------------------------
+    def import_from_zip(self, archive, progress=None) -> dict:
+        """
+        Import items from a ZIP holding one CSV plus the images named in its
+        `image` column. Images are read one member at a time (never extracted),
+        processed in the image worker pool, and all items are inserted with
+        their final image paths in a single transaction.
+        """
+        results = {
+            'success': 0,
+            'failed': 0,
+            'errors': [],
+            'success_items': [],
+            'images': 0,
+            'image_errors': []
+        }
+
+        with zipfile.ZipFile(archive) as zf:
+            df = read_zip_csv(zf)
+            rows, image_names = self._prepare_rows(df, results)
+
+            # Rows sharing one file reuse a single processed image
+            members = zip_image_members(zf)
+            wanted = {}
+            for index, image_name in enumerate(image_names):
+                if not image_name:
+                    continue
+                info = members.get(PurePosixPath(image_name.replace('\\', '/')).name.lower())
+                if info is None:
+                    results['image_errors'].append(f"{rows[index]['name']}: ไม่พบไฟล์ '{image_name}' ใน ZIP")
+                else:
+                    wanted.setdefault(info.filename, []).append(index)
+
+            sources = ((name, partial(read_zip_image, zf, zf.getinfo(name))) for name in wanted)
+            processed = 0
+            for name, result, error in image_jobs.process_many(sources, max_pixels=file_validator.MAX_PIXELS):
+                processed += 1
+                if error:
+                    results['image_errors'].append(f"{name}: {error}")
+                else:
+                    results['images'] += 1
+                    for index in wanted[name]:
+                        rows[index]['image_path'] = result['path']
+                if progress:
+                    progress(processed, len(wanted))
+
+        if rows:
+            try:
+                create_items_bulk(rows)
+                results['success'] = len(rows)
+                results['success_items'] = [row['name'] for row in rows]
+            except (ValueError, RuntimeError) as e:
+                results['failed'] += len(rows)
+                results['errors'].append(str(e))
+
+        return results
+
+    def _prepare_rows(self, df: pd.DataFrame, results: dict) -> tuple[list, list]:
+        """Validate every row against one name lookup; returns item rows and image names."""
+        df.columns = [col.strip().lower() for col in df.columns]
+        existing = find_existing_names([str(name) for name in df['name'].dropna()])
+
+        rows, image_names, seen = [], [], set()
+        for idx, row in df.iterrows():
+            row_num = idx + 2
+            is_valid, errors = self.validate_row(row, row_num, existing_names=existing)
+            name = str(row['name']).strip()
+            if is_valid and name.lower() in seen:
+                is_valid, errors = False, [f"แถว {row_num}: ชื่อ '{name}' ซ้ำกับแถวก่อนหน้าในไฟล์"]
+
+            if not is_valid:
+                results['failed'] += 1
+                results['errors'].extend(errors)
+                continue
+
+            seen.add(name.lower())
+            rows.append({
+                'name': name,
+                'type_id': self.type_map_lower[str(row['type']).strip().lower()],
+                'rarity_id': self.rarity_map_lower[str(row['rarity']).strip().lower()],
+                'location_id': self.location_map_lower[str(row['drop_location']).strip().lower()],
+                'tier_id': self.tier_map_lower[str(row['tier']).strip().lower()],
+                'description': _cell(row, 'description'),
+                'image_path': None
+            })
+            image_names.append(_cell(row, 'image'))
+
+        return rows, image_names
+
     def get_master_data_summary(self) -> dict:
         """Get summary of available master data"""
         return {
@@ -160,6 +261,54 @@ class ItemImporter:
         }
 
 
+# ----------------------------------------------------------------------
+# ZIP Helpers
+# ----------------------------------------------------------------------
+def _cell(row, column) -> str:
+    value = row.get(column)
+    return str(value).strip() if value is not None and pd.notna(value) else ''
+
+def read_zip_csv(zf: zipfile.ZipFile) -> pd.DataFrame:
+    """Read the (single) CSV inside an import archive."""
+    csv_members = [
+        info for info in zf.infolist()
+        if not info.is_dir() and info.filename.lower().endswith('.csv')
+        and not info.filename.startswith('__MACOSX/')
+    ]
+    if len(csv_members) != 1:
+        raise ValueError("ไฟล์ ZIP ต้องมีไฟล์ CSV หนึ่งไฟล์พอดี")
+    with zf.open(csv_members[0]) as f:
+        return pd.read_csv(f, encoding='utf-8-sig')
+
+def zip_image_members(zf: zipfile.ZipFile) -> dict:
+    """Image members keyed by lower-cased base name (folders inside the ZIP are ignored)."""
+    members = {}
+    for info in zf.infolist():
+        path = PurePosixPath(info.filename)
+        if info.is_dir() or path.parts[0] == '__MACOSX' or path.name.startswith('.'):
+            continue
+        if path.suffix.lower() in file_validator.ALLOWED_EXTENSIONS:
+            members.setdefault(path.name.lower(), info)
+    return members
+
+def read_zip_image(zf: zipfile.ZipFile, info: zipfile.ZipInfo) -> bytes:
+    """Read and validate one member; the size limit is checked before and while reading."""
+    limit = file_validator.MAX_FILE_SIZE
+    too_large = f"ไฟล์มีขนาดใหญ่เกินไป (สูงสุด {limit // 1024 // 1024}MB)"
+    if info.file_size > limit:
+        raise ValueError(too_large)
+
+    # The header size can lie (zip bombs), so never read past the limit
+    with zf.open(info) as f:
+        data = f.read(limit + 1)
+    if len(data) > limit:
+        raise ValueError(too_large)
+
+    check = file_validator.inspect_image(data)
+    if not check.ok:
+        raise ValueError(check.error)
+    return data
+
 # ----------------------------------------------------------------------
 # Template Generator
 # ----------------------------------------------------------------------
@@ -175,7 +324,8 @@ def generate_template_csv() -> bytes:
             'ดาบที่เต็มไปด้วยพลังแห่งเพลิง',
             'เกราะที่ทอจากน้ำแข็ง',
             'เพิ่มอัตราคริติคอล 15%'
-        ]
+        ],
+        'image': ['fire_sword.png', 'ice_armor.png', '']
     }
 
     df = pd.DataFrame(template_data)
@@ -242,19 +392,27 @@ def render_import_page():
     st.markdown("---")
 
     # File upload
-    st.markdown("### 2. อัปโหลดไฟล์ CSV")
+    st.markdown("### 2. อัปโหลดไฟล์ CSV หรือ ZIP")
+    st.caption("ZIP: ใส่ไฟล์ CSV หนึ่งไฟล์พร้อมรูปภาพ แล้วระบุชื่อไฟล์รูปในคอลัมน์ image")
 
     uploaded_file = st.file_uploader(
-        "เลือกไฟล์ CSV",
-        type=['csv'],
-        help="ไฟล์ต้องมีคอลัมน์: name, type, rarity, drop_location, tier (description ไม่จำเป็น)",
+        "เลือกไฟล์ CSV หรือ ZIP",
+        type=['csv', 'zip'],
+        help="ไฟล์ต้องมีคอลัมน์: name, type, rarity, drop_location, tier (description, image ไม่จำเป็น)",
         key="import_file_uploader"
     )
 
     if uploaded_file is not None:
         try:
+            is_zip = uploaded_file.name.lower().endswith('.zip')
+
             # Read CSV
-            df = pd.read_csv(uploaded_file, encoding='utf-8-sig')
+            if is_zip:
+                with zipfile.ZipFile(uploaded_file) as zf:
+                    df = read_zip_csv(zf)
+                uploaded_file.seek(0)
+            else:
+                df = pd.read_csv(uploaded_file, encoding='utf-8-sig')
 
             # Validate structure
             is_valid, message = importer.validate_csv_structure(df)
@@ -290,7 +448,17 @@ def render_import_page():
             with col1:
                 if st.button("✅ นำเข้าข้อมูล", type="primary", use_container_width=True):
                     with st.spinner("🔄 กำลังนำเข้าข้อมูล..."):
-                        results = importer.import_from_dataframe(df)
+                        if is_zip:
+                            progress_bar = st.progress(0.0, text="🖼️ กำลังประมวลผลรูปภาพ...")
+                            results = importer.import_from_zip(
+                                uploaded_file,
+                                progress=lambda done, total: progress_bar.progress(
+                                    done / total, text=f"🖼️ ประมวลผลรูปภาพ {done}/{total}"
+                                )
+                            )
+                            progress_bar.empty()
+                        else:
+                            results = importer.import_from_dataframe(df)
 
                         # Show results
                         st.markdown("---")
@@ -324,6 +492,16 @@ def render_import_page():
                                 if len(results['errors']) > 20:
                                     st.caption(f"และอีก {len(results['errors']) - 20} ข้อผิดพลาด")
 
+                        if is_zip:
+                            st.info(f"🖼️ แนบรูปภาพสำเร็จ {results['images']} ไฟล์")
+                            if results['image_errors']:
+                                st.warning(f"⚠️ รูปภาพมีปัญหา {len(results['image_errors'])} ไฟล์ (ไอเท็มใช้รูปเริ่มต้นแทน)")
+                                with st.expander("📋 รายละเอียดรูปภาพที่มีปัญหา"):
+                                    for error in results['image_errors'][:20]:
+                                        st.markdown(f"- {error}")
+                                    if len(results['image_errors']) > 20:
+                                        st.caption(f"และอีก {len(results['image_errors']) - 20} รายการ")
+
                         # Refresh cache
                         refresh_master_data()
 
@@ -0,0 +1,306 @@
+"""
+maintenance.py
+==============
+Background housekeeping jobs that run inside the app process.
+
+Usage:
+    python maintenance.py purge [--days N]
+    python maintenance.py gc [--dry-run] [--delete] [--grace-hours N]
+    python maintenance.py backfill
+"""
+import argparse
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+from database import (
+    init_database, get_db_connection, purge_deleted_items, add_item_listener, backfill_descriptions
+)
+from image_jobs import THUMBNAIL_SUFFIX
+
+TRASH_RETENTION_DAYS = 30
+PURGE_BATCH_SIZE = 500
+PURGE_INTERVAL = 3600      # seconds between purge passes
+QUIET_PERIOD = 60          # seconds without item writes before a pass may start
+BATCH_PAUSE = 0.2          # gap between batches so requests can take the DB lock
+
+IMAGE_DIR = Path("assets/images")
+QUARANTINE_DIR = IMAGE_DIR / ".quarantine"
+PLACEHOLDER_IMAGE = "assets/images/placeholder.png"
+GC_INTERVAL = 24 * 3600    # seconds between scheduled orphan scans
+GC_GRACE_SECONDS = 3600    # files younger than this may belong to an upload in flight
+GC_BATCH_SIZE = 200
+QUARANTINE_DAYS = 7
+BACKFILL_BATCH_SIZE = 500
+
+# ----------------------------------------------------------------------
+# Quiet-period tracking
+# ----------------------------------------------------------------------
+_last_write = time.monotonic()
+
+def _record_write(event, item_id):
+    global _last_write
+    _last_write = time.monotonic()
+
+add_item_listener(_record_write)
+
+def is_quiet():
+    """True when no item has been written in this process for QUIET_PERIOD seconds."""
+    return time.monotonic() - _last_write >= QUIET_PERIOD
+
+# ----------------------------------------------------------------------
+# Trash Purge
+# ----------------------------------------------------------------------
+def purge_trash(older_than_days=TRASH_RETENTION_DAYS, batch_size=PURGE_BATCH_SIZE, quiet_only=False):
+    """
+    Permanently remove expired trash in batches; returns the rows removed.
+    With quiet_only, stops between batches as soon as writes resume.
+    """
+    total = 0
+    while not (quiet_only and not is_quiet()):
+        removed = purge_deleted_items(older_than_days, batch_size)
+        total += removed
+        if removed < batch_size:
+            break
+        time.sleep(BATCH_PAUSE)
+    return total
+
+# ----------------------------------------------------------------------
+# Description Backfill
+# ----------------------------------------------------------------------
+def backfill_all_descriptions(batch_size=BACKFILL_BATCH_SIZE, quiet_only=False):
+    """Render stored descriptions for rows written before they existed; returns rows filled."""
+    total = 0
+    while not (quiet_only and not is_quiet()):
+        filled = backfill_descriptions(batch_size)
+        total += filled
+        if filled < batch_size:
+            break
+        time.sleep(BATCH_PAUSE)
+    return total
+
+# ----------------------------------------------------------------------
+# Orphan Image GC
+# ----------------------------------------------------------------------
+def _iter_image_files(root):
+    """Stream every file under root without building the full listing."""
+    stack = [root]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if Path(entry.path) != QUARANTINE_DIR:
+                            stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        yield entry
+        except OSError as e:
+            print(f"GC scan error: {e}")
+
+def _stored_path_variants(entry):
+    """DB spellings a file may be referenced by (posix, plus native on Windows)."""
+    posix = Path(entry.path).as_posix()
+    # A stored thumbnail lives exactly as long as its source image
+    if posix.endswith(THUMBNAIL_SUFFIX):
+        posix = posix[:-len(THUMBNAIL_SUFFIX)]
+    return {posix, posix.replace('/', os.sep)}
+
+def _sweep_batch(batch, quarantine_root, report, dry_run, cutoff):
+    variants = {entry.path: _stored_path_variants(entry) for entry, _ in batch}
+    wanted = sorted(set().union(*variants.values()))
+
+    # Holding the connection holds the DB lock, so no local write can start
+    # referencing a file between the check and the move
+    with get_db_connection() as conn:
+        referenced = {
+            row['path'] for row in conn.execute(
+                "SELECT path FROM images WHERE path IN (SELECT value FROM json_each(?))",
+                (json.dumps(wanted),)
+            )
+        }
+        for entry, size in batch:
+            if variants[entry.path] & referenced:
+                continue
+            # An upload may have reused the file (write_image_bytes bumps its
+            # mtime) after the scan; its row commits once the lock is free
+            try:
+                if os.stat(entry.path).st_mtime > cutoff:
+                    continue
+            except FileNotFoundError:
+                continue
+
+            report['orphans'] += 1
+            report['bytes'] += size
+            if dry_run:
+                continue
+            try:
+                if quarantine_root:
+                    target = quarantine_root / Path(entry.path).relative_to(IMAGE_DIR)
+                    target.parent.mkdir(parents=True, exist_ok=True)
+                    os.replace(entry.path, target)
+                else:
+                    os.remove(entry.path)
+                report['removed'] += 1
+            except OSError as e:
+                print(f"GC could not remove {entry.path}: {e}")
+
+def collect_orphan_images(grace_seconds=GC_GRACE_SECONDS, quarantine=True,
+                          batch_size=GC_BATCH_SIZE, dry_run=False):
+    """
+    Find image files no item references and quarantine (or delete) them.
+    Returns a report dict: scanned, orphans, removed, bytes.
+    """
+    report = {'scanned': 0, 'orphans': 0, 'removed': 0, 'bytes': 0}
+    if not IMAGE_DIR.exists():
+        return report
+
+    cutoff = time.time() - grace_seconds
+    quarantine_root = None
+    if quarantine and not dry_run:
+        quarantine_root = QUARANTINE_DIR / datetime.now().strftime('%Y%m%d_%H%M%S')
+
+    batch = []
+    for entry in _iter_image_files(IMAGE_DIR):
+        report['scanned'] += 1
+        if Path(entry.path).as_posix() == PLACEHOLDER_IMAGE:
+            continue
+        try:
+            stat = entry.stat(follow_symlinks=False)
+        except OSError:
+            continue
+        if stat.st_mtime > cutoff:
+            continue
+
+        batch.append((entry, stat.st_size))
+        if len(batch) >= batch_size:
+            _sweep_batch(batch, quarantine_root, report, dry_run, cutoff)
+            batch = []
+            time.sleep(BATCH_PAUSE)
+
+    if batch:
+        _sweep_batch(batch, quarantine_root, report, dry_run, cutoff)
+    return report
+
+def expire_quarantine(days=QUARANTINE_DAYS):
+    """Delete quarantine runs older than `days`; returns the bytes freed."""
+    if not QUARANTINE_DIR.exists():
+        return 0
+
+    cutoff = time.time() - days * 86400
+    freed = 0
+    for run_dir in QUARANTINE_DIR.iterdir():
+        if run_dir.is_dir() and run_dir.stat().st_mtime < cutoff:
+            freed += sum(f.stat().st_size for f in run_dir.rglob("*") if f.is_file())
+            shutil.rmtree(run_dir, ignore_errors=True)
+    return freed
+
+def format_bytes(size):
+    if size < 1024:
+        return f"{size} B"
+    for unit in ('KB', 'MB', 'GB'):
+        size /= 1024
+        if size < 1024 or unit == 'GB':
+            return f"{size:.1f} {unit}"
+
+# ----------------------------------------------------------------------
+# Background Worker
+# ----------------------------------------------------------------------
+class MaintenanceWorker(threading.Thread):
+    """Daemon thread running the periodic jobs while the app is idle."""
+
+    def __init__(self):
+        super().__init__(name="maintenance", daemon=True)
+        self._stop_event = threading.Event()
+        self._last_gc = None
+
+    def run(self):
+        delay = QUIET_PERIOD
+        while not self._stop_event.wait(delay):
+            delay = PURGE_INTERVAL
+            if not is_quiet():
+                delay = QUIET_PERIOD
+                continue
+            try:
+                filled = backfill_all_descriptions(quiet_only=True)
+                if filled:
+                    print(f"🧹 Rendered {filled} item descriptions")
+
+                removed = purge_trash(quiet_only=True)
+                if removed:
+                    print(f"🧹 Purged {removed} trashed items")
+
+                gc_due = self._last_gc is None or time.monotonic() - self._last_gc >= GC_INTERVAL
+                if gc_due and is_quiet():
+                    self._last_gc = time.monotonic()
+                    report = collect_orphan_images()
+                    freed = expire_quarantine()
+                    if report['removed'] or freed:
+                        print(f"🧹 Quarantined {report['removed']} orphan images "
+                              f"({format_bytes(report['bytes'])}), freed {format_bytes(freed)}")
+            except Exception as e:
+                print(f"Maintenance error: {e}")
+
+    def stop(self):
+        self._stop_event.set()
+
+_worker = None
+_worker_lock = threading.Lock()
+
+def start_background_jobs():
+    """Start the maintenance worker once per process."""
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = MaintenanceWorker()
+            _worker.start()
+    return _worker
+
+# ----------------------------------------------------------------------
+# CLI
+# ----------------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="ARPG Item Wiki maintenance jobs")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    purge_parser = subparsers.add_parser("purge", help="ลบไอเท็มในถังขยะที่หมดอายุแบบถาวร")
+    purge_parser.add_argument("--days", type=int, default=TRASH_RETENTION_DAYS,
+                              help="ลบเฉพาะรายการที่อยู่ในถังขยะนานกว่า N วัน")
+
+    gc_parser = subparsers.add_parser("gc", help="ย้าย/ลบรูปภาพที่ไม่มีไอเท็มอ้างอิง")
+    gc_parser.add_argument("--dry-run", action="store_true", help="รายงานอย่างเดียว ไม่ย้ายไฟล์")
+    gc_parser.add_argument("--delete", action="store_true", help="ลบทันทีแทนการย้ายไป quarantine")
+    gc_parser.add_argument("--grace-hours", type=float, default=GC_GRACE_SECONDS / 3600,
+                           help="ข้ามไฟล์ที่ใหม่กว่า N ชั่วโมง")
+
+    subparsers.add_parser("backfill", help="สร้างคำอธิบายที่ผ่านการ sanitize ให้ไอเท็มเดิม")
+
+    args = parser.parse_args()
+    init_database()
+
+    if args.command == "purge":
+        removed = purge_trash(older_than_days=args.days)
+        print(f"✅ ลบถาวร {removed} รายการ")
+    elif args.command == "gc":
+        report = collect_orphan_images(
+            grace_seconds=args.grace_hours * 3600,
+            quarantine=not args.delete,
+            dry_run=args.dry_run
+        )
+        action = "พบ" if args.dry_run else ("ลบ" if args.delete else "ย้ายไป quarantine")
+        print(f"🔍 ตรวจ {report['scanned']} ไฟล์, รูปที่ไม่มีการอ้างอิง {report['orphans']} ไฟล์")
+        print(f"✅ {action} {report['orphans'] if args.dry_run else report['removed']} ไฟล์ "
+              f"({format_bytes(report['bytes'])})")
+        if not args.dry_run:
+            freed = expire_quarantine()
+            if freed:
+                print(f"🧹 ล้าง quarantine ที่เก่ากว่า {QUARANTINE_DAYS} วัน ({format_bytes(freed)})")
+    elif args.command == "backfill":
+        filled = backfill_all_descriptions()
+        print(f"✅ สร้างคำอธิบาย {filled} รายการ")
+
+if __name__ == "__main__":
+    main()
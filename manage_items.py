@@ -6,21 +6,82 @@ FIXED: Dynamic form keys to prevent duplicate key error
 """
 import streamlit as st
 import os
+import difflib
 
 from database import (
     create_item, update_item, delete_item, get_item_by_id,
     get_all_item_types, get_all_rarities, get_all_locations,
-    get_all_tiers, get_all_items_with_details
+    get_all_tiers, get_item_choices, search_items, count_items, delete_items,
+    bulk_update_items, restore_item, get_trashed_items, count_trashed_items,
+    purge_deleted_items, list_item_revisions, diff_item_revisions
 )
 from utils import (
-    load_css, save_uploaded_image, delete_image_file,
-    get_rarity_color, refresh_master_data, get_image_base64
+    load_css, get_rarity_color, refresh_master_data, get_image_base64
 )
-from models import Item
+from models import Item, ItemSelection
+from search_index import suggest_item_names, fuzzy_search_items
+from maintenance import purge_trash, TRASH_RETENTION_DAYS
+from image_jobs import image_jobs, PLACEHOLDER_IMAGE
 
 st.set_page_config(layout="wide", page_icon="📝", page_title="จัดการไอเท็ม")
 load_css()
 
+EDIT_PICKER_LIMIT = 50
+BULK_PAGE_SIZE = 30
+BULK_PREVIEW_SIZE = 10
+
+# ----------------------------------------------------------------------
+# Upload Handling
+# ----------------------------------------------------------------------
+def inspect_upload(uploaded_file):
+    """Validate an upload once; the ImageCheck buffer goes straight to the image worker."""
+    # Imported here: the security package touches Streamlit on import, which
+    # must not happen before this page's set_page_config
+    try:
+        from security.sanitizer import file_validator
+    except ImportError:
+        return None
+
+    check = file_validator.inspect_image(uploaded_file)
+    if not check.ok:
+        raise ValueError(check.error)
+    return check
+
+def queue_item_image(item_id, item_name, uploaded_file, image_check, pending_path):
+    """Hand an upload to the image worker pool and track the job for this session."""
+    data = image_check.data if image_check is not None else uploaded_file.getbuffer()
+    job_id = image_jobs.submit(data, item_id, expected_path=pending_path)
+    st.session_state.image_jobs[job_id] = item_name
+
+def render_image_jobs():
+    """Report this session's image jobs; finished ones are shown once, then dropped."""
+    jobs = st.session_state.image_jobs
+    if not jobs:
+        return
+
+    finished = False
+    for job_id, item_name in list(jobs.items()):
+        job = image_jobs.get(job_id)
+        if job is None:
+            jobs.pop(job_id)
+            continue
+        if job.status == 'pending':
+            st.info(f"⏳ กำลังประมวลผลรูปของ '{item_name}'...")
+            continue
+
+        if job.status == 'done':
+            st.success(f"🖼️ รูปของ '{item_name}' พร้อมใช้งานแล้ว")
+            finished = True
+        else:
+            st.error(f"⚠️ ประมวลผลรูปของ '{item_name}' ไม่สำเร็จ: {job.error}")
+        jobs.pop(job_id)
+        image_jobs.forget(job_id)
+
+    if finished:
+        refresh_master_data()
+    if jobs:
+        st.button("🔄 ตรวจสถานะรูป", key="refresh_image_jobs")
+
 # ----------------------------------------------------------------------
 # Session State Initialization
 # ----------------------------------------------------------------------
@@ -34,6 +95,8 @@ def init_session_state():
         st.session_state.success_message = None
     if 'confirm_delete' not in st.session_state:
         st.session_state.confirm_delete = {}
+    if 'image_jobs' not in st.session_state:
+        st.session_state.image_jobs = {}
 
 init_session_state()
 
@@ -185,24 +248,28 @@ def add_item_page():
                     st.error("⚠️ กรุณาระบุชื่อไอเท็มอย่างน้อย 2 ตัวอักษร")
                     return
 
-                image_path = None
+                image_check = None
                 if data['image_file']:
                     try:
-                        image_path = save_uploaded_image(data['image_file'], data['name'])
+                        image_check = inspect_upload(data['image_file'])
                     except ValueError as e:
                         st.error(f"⚠️ {e}")
                         return
 
-                create_item(
+                # Saved with the placeholder; the worker swaps the real image in
+                item_id = create_item(
                     name=data['name'],
                     type_id=data['type_id'],
                     rarity_id=data['rarity_id'],
                     location_id=data['location_id'],
                     tier_id=data['tier_id'],
                     description=data['description'],
-                    image_path=image_path
+                    image_path=None
                 )
 
+                if data['image_file']:
+                    queue_item_image(item_id, data['name'], data['image_file'], image_check, PLACEHOLDER_IMAGE)
+
                 st.session_state.success_message = f"✅ เพิ่มไอเท็ม '{data['name']}' เรียบร้อย!"
                 refresh_master_data()
                 st.rerun()
@@ -219,25 +286,31 @@ def edit_item_page():
     """Page for editing/deleting items."""
     st.markdown("### ✏️ แก้ไข/ลบไอเท็ม")
 
-    items = get_all_items_with_details()
-
-    if not items:
-        st.info("ℹ️ ยังไม่มีไอเท็มในระบบ")
-        return
+    search = st.text_input("🔎 ค้นหาไอเท็ม", placeholder="พิมพ์ชื่อเพื่อค้นหา...", key="edit_item_search")
 
     item_options = {}
-    for item in items:
-        if hasattr(item, 'keys'):
-            item_id = item['id']
-            item_name = item['name']
-            rarity_name = item['rarity_name']
-        else:
-            item_id = item.get('id')
-            item_name = item.get('name')
-            rarity_name = item.get('rarity_name')
+    if search.strip():
+        choices = suggest_item_names(search, k=EDIT_PICKER_LIMIT)
+        if not choices:
+            # Nothing starts with the text; fall back to typo-tolerant matches
+            fuzzy_ids = [item_id for item_id, _ in fuzzy_search_items(search, k=EDIT_PICKER_LIMIT)]
+            rows = {row['id']: row for row in get_item_choices(EDIT_PICKER_LIMIT, ids=fuzzy_ids)}
+            choices = [rows[item_id] for item_id in fuzzy_ids if item_id in rows]
+
+        if not choices:
+            st.info("ℹ️ ไม่พบไอเท็มที่ค้นหา")
+            return
+    else:
+        choices = get_item_choices(EDIT_PICKER_LIMIT)
 
-        display_name = f"{item_name} ({rarity_name})"
-        item_options[display_name] = item_id
+        if not choices:
+            st.info("ℹ️ ยังไม่มีไอเท็มในระบบ")
+            return
+
+        st.caption(f"แสดง {len(choices)} รายการที่แก้ไขล่าสุด — พิมพ์ชื่อเพื่อค้นหาไอเท็มอื่น")
+
+    for choice in choices:
+        item_options[f"{choice['name']} ({choice['rarity_name']})"] = choice['id']
 
     selected_display = st.selectbox("เลือกไอเท็ม", list(item_options.keys()))
 
@@ -258,12 +331,12 @@ def edit_item_page():
                             return
 
                         item_keys = item_data.keys() if hasattr(item_data, 'keys') else []
-                        image_path = item_data['image_path'] if 'image_path' in item_keys else "assets/images/placeholder.png"
+                        image_path = item_data['image_path'] if 'image_path' in item_keys else PLACEHOLDER_IMAGE
 
+                        image_check = None
                         if data['image_file']:
-                            delete_image_file(image_path)
                             try:
-                                image_path = save_uploaded_image(data['image_file'], data['name'])
+                                image_check = inspect_upload(data['image_file'])
                             except ValueError as e:
                                 st.error(f"⚠️ {e}")
                                 return
@@ -279,6 +352,10 @@ def edit_item_page():
                             image_path=image_path
                         )
 
+                        # The current image stays up until the new one is processed
+                        if data['image_file']:
+                            queue_item_image(selected_id, data['name'], data['image_file'], image_check, image_path)
+
                         st.session_state.success_message = f"✅ อัปเดต '{data['name']}' เรียบร้อย!"
                         refresh_master_data()
                         st.rerun()
@@ -300,7 +377,7 @@ def edit_item_page():
 
                             delete_item(selected_id)
                             st.session_state.confirm_delete.pop(selected_id, None)
-                            st.success(f"🗑️ ลบ '{item_name}' เรียบร้อย!")
+                            st.success(f"🗑️ ย้าย '{item_name}' ไปถังขยะเรียบร้อย!")
                             st.balloons()
                             refresh_master_data()
                             st.rerun()
@@ -310,98 +387,186 @@ def edit_item_page():
                 elif result['action'] == 'cancel':
                     st.rerun()
 
+            render_item_history(selected_id)
+
+REVISION_FIELD_LABELS = {
+    'name': "ชื่อ", 'type_id': "ประเภท", 'rarity_id': "ความหายาก", 'location_id': "สถานที่ดรอป",
+    'tier_id': "Tier", 'description': "คำอธิบาย", 'image_path': "รูปภาพ",
+}
+
+def _revision_value_label(field, value):
+    """Show master-data names instead of ids in the history view."""
+    lookups = {'type_id': get_all_item_types, 'rarity_id': get_all_rarities,
+               'location_id': get_all_locations, 'tier_id': get_all_tiers}
+    if field not in lookups:
+        return value
+    names = {item_id: name for name, item_id in lookups[field]()[0].items()}
+    return names.get(value, value)
+
+def render_item_history(item_id):
+    """Revision list and a diff between any two revisions of an item."""
+    revisions = list_item_revisions(item_id)
+    latest = revisions[0]['revision'] if revisions else 1
+
+    with st.expander(f"🕘 ประวัติการแก้ไข ({latest} revision)"):
+        if not revisions:
+            st.info("ยังไม่มีการแก้ไขไอเท็มนี้")
+            return
+
+        for revision in revisions[:20]:
+            fields = ", ".join(REVISION_FIELD_LABELS.get(field, field) for field in revision['fields'])
+            st.markdown(f"**#{revision['revision']}** • {revision['created_at']} • "
+                        f"{revision['actor'] or '-'} — {fields}")
+        if len(revisions) > 20:
+            st.caption(f"และอีก {len(revisions) - 20} revision")
+
+        numbers = list(range(latest, 0, -1))
+        col1, col2 = st.columns(2)
+        with col1:
+            rev_a = st.selectbox("เปรียบเทียบจาก", numbers, index=min(1, len(numbers) - 1),
+                                 key=f"history_a_{item_id}")
+        with col2:
+            rev_b = st.selectbox("กับ", numbers, index=0, key=f"history_b_{item_id}")
+
+        diff = diff_item_revisions(item_id, rev_a, rev_b)
+        if not diff:
+            st.caption("ไม่มีความแตกต่าง")
+            return
+
+        for field, (before, after) in diff.items():
+            label = REVISION_FIELD_LABELS.get(field, field)
+            if field == 'description':
+                lines = difflib.unified_diff(
+                    (before or "").splitlines(), (after or "").splitlines(),
+                    fromfile=f"#{rev_a}", tofile=f"#{rev_b}", lineterm=""
+                )
+                st.markdown(f"**{label}**")
+                st.code("\n".join(lines), language="diff")
+            else:
+                st.markdown(f"**{label}:** {_revision_value_label(field, before)} → "
+                            f"{_revision_value_label(field, after)}")
+
+def render_bulk_filters(key_prefix):
+    """Filter widgets for the bulk pages; returns a search_items-style filter dict."""
+    type_dict, type_names = get_all_item_types()
+    rarity_dict, rarities_list = get_all_rarities()
+    location_dict, location_names = get_all_locations()
+    tier_dict, tier_names = get_all_tiers()
+
+    search = st.text_input("🔎 ชื่อมีคำว่า", placeholder="เว้นว่างเพื่อเลือกทุกชื่อ", key=f"{key_prefix}_search")
+
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        selected_types = st.multiselect("📦 ประเภท", type_names, key=f"{key_prefix}_types")
+    with col2:
+        selected_rarities = st.multiselect("⭐ ความหายาก", [r['name'] for r in rarities_list], key=f"{key_prefix}_rarities")
+    with col3:
+        selected_locations = st.multiselect("📍 สถานที่ดรอป", location_names, key=f"{key_prefix}_locations")
+    with col4:
+        selected_tiers = st.multiselect("📊 Tier", tier_names, key=f"{key_prefix}_tiers")
+
+    filters = {}
+    if search.strip():
+        filters['search'] = search.strip()
+    if selected_types:
+        filters['type_ids'] = [type_dict[t] for t in selected_types]
+    if selected_rarities:
+        filters['rarity_ids'] = [rarity_dict[r] for r in selected_rarities]
+    if selected_locations:
+        filters['location_ids'] = [location_dict[l] for l in selected_locations]
+    if selected_tiers:
+        filters['tier_ids'] = [tier_dict[t] for t in selected_tiers]
+
+    return filters
+
+def get_bulk_selection(filters):
+    """Current bulk selection; starts over whenever the filter changes."""
+    selection = st.session_state.get('bulk_selection')
+    if selection is None or selection.filters != filters:
+        generation = selection.generation + 1 if selection else 0
+        selection = ItemSelection(filters=filters, generation=generation)
+        st.session_state.bulk_selection = selection
+        st.session_state.bulk_page = 1
+    return selection
+
+def _toggle_bulk_item(item_id, key):
+    st.session_state.bulk_selection.set_selected(item_id, st.session_state[key])
+
 def bulk_delete_page():
     """Page for bulk deletion with safety."""
     st.markdown("### 🗑️ ลบหลายรายการ")
 
-    items = get_all_items_with_details()
+    filters = render_bulk_filters("bulk_filter")
+    selection = get_bulk_selection(filters)
+    total = count_items(filters)
 
-    if not items:
-        st.info("ℹ️ ยังไม่มีไอเท็ม")
+    if not total:
+        st.info("ℹ️ ไม่มีไอเท็มที่ตรงกับตัวกรอง" if filters else "ℹ️ ยังไม่มีไอเท็ม")
         return
 
-    total = len(items)
-    st.metric("ไอเท็มทั้งหมด", f"{total} ชิ้น")
+    st.metric("ไอเท็มที่ตรงกับตัวกรอง", f"{total} ชิ้น")
 
     col1, col2 = st.columns(2)
     with col1:
-        if st.button("✅ เลือกทั้งหมด", use_container_width=True):
-            for item in items:
-                item_id = item['id'] if hasattr(item, '__getitem__') else item.get('id')
-                st.session_state[f"bulk_del_{item_id}"] = True
-            st.rerun()
+        st.button("✅ เลือกทั้งหมด", use_container_width=True, on_click=selection.select_all)
     with col2:
-        if st.button("❌ ยกเลิกทั้งหมด", use_container_width=True):
-            for item in items:
-                item_id = item['id'] if hasattr(item, '__getitem__') else item.get('id')
-                if f"bulk_del_{item_id}" in st.session_state:
-                    st.session_state.pop(f"bulk_del_{item_id}")
-            st.rerun()
+        st.button("❌ ยกเลิกทั้งหมด", use_container_width=True, on_click=selection.clear)
 
     st.markdown("---")
 
-    cols = st.columns(3)
-    selected_ids = []
+    total_pages = max(1, (total + BULK_PAGE_SIZE - 1) // BULK_PAGE_SIZE)
+    if st.session_state.get('bulk_page', 1) > total_pages:
+        st.session_state.bulk_page = total_pages
+    page = st.number_input("หน้า", min_value=1, max_value=total_pages, step=1, key="bulk_page")
+    st.caption(f"หน้า {page}/{total_pages}")
 
+    # Only the visible page gets widgets; the selection itself lives in one object
+    items = search_items(filters, limit=BULK_PAGE_SIZE, offset=(page - 1) * BULK_PAGE_SIZE)
+    cols = st.columns(3)
     for idx, item in enumerate(items):
-        if hasattr(item, 'keys'):
-            item_id = item['id']
-            item_name = item['name']
-            rarity_name = item['rarity_name']
-            color = item['color'] if 'color' in item.keys() else '#808080'
-        else:
-            item_id = item.get('id')
-            item_name = item.get('name')
-            rarity_name = item.get('rarity_name')
-            color = item['color'] if 'color' in item.keys() else '#808080'
-
+        item_id = item['id']
         with cols[idx % 3]:
-            checkbox_key = f"bulk_del_{item_id}"
-            is_selected = st.checkbox(
-                f"{item_name}",
+            checkbox_key = f"bulk_sel_{selection.generation}_{item_id}"
+            st.checkbox(
+                f"{item['name']}",
+                value=selection.is_selected(item_id),
                 key=checkbox_key,
-                help=f"ความหายาก: {rarity_name}"
+                on_change=_toggle_bulk_item,
+                args=(item_id, checkbox_key),
+                help=f"ความหายาก: {item['rarity_name']}"
             )
-
-            if is_selected:
-                selected_ids.append(item_id)
-
             st.markdown(
-                f"<small style='color:{color};'>{rarity_name}</small>",
+                f"<small style='color:{item['color']};'>{item['rarity_name']}</small>",
                 unsafe_allow_html=True
             )
 
     st.markdown("---")
 
-    if selected_ids:
-        st.warning(f"เลือก {len(selected_ids)} รายการ")
+    selected_count = selection.count(total)
+    if selected_count:
+        st.warning(f"เลือก {selected_count} รายการ")
 
-        if st.button(f"🗑️ ลบ {len(selected_ids)} รายการ", type="primary", use_container_width=True):
+        if st.button(f"🗑️ ลบ {selected_count} รายการ", type="primary", use_container_width=True):
             if 'bulk_confirm' not in st.session_state:
                 st.session_state.bulk_confirm = True
                 st.error("⚠️ กดยืนยันอีกครั้งเพื่อลบ!")
                 st.rerun()
             else:
-                success_count = 0
-                for item_id in selected_ids:
-                    try:
-                        delete_item(item_id)
-                        success_count += 1
-                    except Exception:
-                        pass
-
                 st.session_state.pop('bulk_confirm', None)
-                for item_id in selected_ids:
-                    if f"bulk_del_{item_id}" in st.session_state:
-                        st.session_state.pop(f"bulk_del_{item_id}")
+                try:
+                    deleted = delete_items(selection.to_filters())
+                except (ValueError, RuntimeError) as e:
+                    st.error(f"❌ {e}")
+                    return
 
-                st.success(f"✅ ลบ {success_count} รายการเรียบร้อย!")
+                selection.clear()
+                st.success(f"✅ ย้าย {deleted} รายการไปถังขยะเรียบร้อย!")
                 st.balloons()
                 refresh_master_data()
                 st.rerun()
 
     with st.expander("⚠️ โซนอันตราย"):
-        st.warning("การลบทั้งหมดไม่สามารถกู้คืนได้")
+        st.warning(f"ไอเท็มทั้งหมดจะถูกย้ายไปถังขยะ และลบถาวรหลัง {TRASH_RETENTION_DAYS} วัน")
 
         if st.checkbox("ฉันต้องการลบไอเท็มทั้งหมด"):
             if st.button("🗑️ ลบทั้งหมด", use_container_width=True):
@@ -410,31 +575,138 @@ def bulk_delete_page():
                     st.error("⚠️⚠️ กดยืนยันอีกครั้ง!")
                     st.rerun()
                 else:
-                    success_count = 0
-                    for item in items:
-                        try:
-                            item_id = item['id'] if hasattr(item, '__getitem__') else item.get('id')
-                            delete_item(item_id)
-                            success_count += 1
-                        except Exception:
-                            pass
-
                     st.session_state.pop('delete_all_confirm', None)
-                    st.success(f"✅ ลบทั้งหมด {success_count} รายการ!")
+                    try:
+                        deleted = delete_items({})
+                    except (ValueError, RuntimeError) as e:
+                        st.error(f"❌ {e}")
+                        return
+
+                    selection.clear()
+                    st.success(f"✅ ย้ายทั้งหมด {deleted} รายการไปถังขยะ!")
                     st.balloons()
                     refresh_master_data()
                     st.rerun()
 
 
+def bulk_edit_page():
+    """Page for applying the same field changes to a filtered set of items."""
+    st.markdown("### 🛠️ แก้ไขหลายรายการ")
+
+    filters = render_bulk_filters("bulk_edit_filter")
+    total = count_items(filters)
+
+    if not total:
+        st.info("ℹ️ ไม่มีไอเท็มที่ตรงกับตัวกรอง" if filters else "ℹ️ ยังไม่มีไอเท็ม")
+        return
+
+    preview = search_items(filters, limit=BULK_PREVIEW_SIZE)
+    st.metric("ไอเท็มที่จะถูกแก้ไข", f"{total} ชิ้น")
+    st.caption(", ".join(item['name'] for item in preview) + (" ..." if total > len(preview) else ""))
+
+    st.markdown("---")
+
+    type_dict, type_names = get_all_item_types()
+    rarity_dict, rarities_list = get_all_rarities()
+    location_dict, location_names = get_all_locations()
+    tier_dict, tier_names = get_all_tiers()
+
+    keep = "— ไม่เปลี่ยน —"
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        new_type = st.selectbox("📦 ประเภทใหม่", [keep] + type_names, key="bulk_edit_type")
+    with col2:
+        new_rarity = st.selectbox("⭐ ความหายากใหม่", [keep] + [r['name'] for r in rarities_list], key="bulk_edit_rarity")
+    with col3:
+        new_location = st.selectbox("📍 สถานที่ดรอปใหม่", [keep] + location_names, key="bulk_edit_location")
+    with col4:
+        new_tier = st.selectbox("📊 Tier ใหม่", [keep] + tier_names, key="bulk_edit_tier")
+
+    # Sanitized with the rest of the description when it is written
+    description_append = st.text_area("📝 เพิ่มต่อท้ายคำอธิบาย", key="bulk_edit_append", height=80).strip()
+
+    changes = {
+        'type_id': type_dict.get(new_type),
+        'rarity_id': rarity_dict.get(new_rarity),
+        'location_id': location_dict.get(new_location),
+        'tier_id': tier_dict.get(new_tier),
+    }
+    changes = {field: value for field, value in changes.items() if value is not None}
+
+    if not changes and not description_append:
+        st.info("ℹ️ เลือกฟิลด์ที่ต้องการเปลี่ยนอย่างน้อยหนึ่งอย่าง")
+        return
+
+    confirmed = st.checkbox(f"ยืนยันการแก้ไข {total} รายการ", key="bulk_edit_confirm")
+    if st.button(f"💾 แก้ไข {total} รายการ", type="primary", use_container_width=True, disabled=not confirmed):
+        try:
+            updated = bulk_update_items(filters, changes, description_append)
+        except (ValueError, RuntimeError) as e:
+            st.error(f"❌ {e}")
+            return
+
+        st.session_state.pop('bulk_edit_confirm', None)
+        refresh_master_data()
+        st.success(f"✅ แก้ไข {updated} รายการเรียบร้อย!")
+
+def trash_page():
+    """Page for restoring or permanently removing trashed items."""
+    st.markdown("### ♻️ ถังขยะ")
+    st.caption(f"ไอเท็มที่ลบจะอยู่ในถังขยะ {TRASH_RETENTION_DAYS} วันก่อนถูกลบถาวรโดยอัตโนมัติ")
+
+    total = count_trashed_items()
+    if not total:
+        st.info("ℹ️ ถังขยะว่างเปล่า")
+        return
+
+    st.metric("ไอเท็มในถังขยะ", f"{total} ชิ้น")
+
+    total_pages = max(1, (total + BULK_PAGE_SIZE - 1) // BULK_PAGE_SIZE)
+    if st.session_state.get('trash_page', 1) > total_pages:
+        st.session_state.trash_page = total_pages
+    page = st.number_input("หน้า", min_value=1, max_value=total_pages, step=1, key="trash_page")
+
+    for item in get_trashed_items(BULK_PAGE_SIZE, (page - 1) * BULK_PAGE_SIZE):
+        col1, col2, col3 = st.columns([3, 1, 1])
+        with col1:
+            st.markdown(
+                f"**{item['name']}** <small style='color:{item['color']};'>{item['rarity_name']}</small>"
+                f"<br><small>ลบเมื่อ {item['deleted_at']}</small>",
+                unsafe_allow_html=True
+            )
+        with col2:
+            if st.button("↩️ กู้คืน", key=f"restore_{item['id']}", use_container_width=True):
+                try:
+                    restore_item(item['id'])
+                    refresh_master_data()
+                    st.rerun()
+                except ValueError as e:
+                    st.error(f"⚠️ {e}")
+        with col3:
+            if st.button("❌ ลบถาวร", key=f"purge_{item['id']}", use_container_width=True):
+                purge_deleted_items(older_than_days=0, item_ids=[item['id']])
+                st.rerun()
+
+    st.markdown("---")
+
+    if st.checkbox(f"ฉันต้องการลบไอเท็มในถังขยะทั้งหมด {total} รายการแบบถาวร", key="empty_trash_confirm"):
+        if st.button("🗑️ ล้างถังขยะ", type="primary", use_container_width=True):
+            removed = purge_trash(older_than_days=0)
+            st.success(f"✅ ลบถาวร {removed} รายการ")
+
 def main():
     st.markdown("# 📝 จัดการไอเท็ม")
     st.markdown("---")
 
+    render_image_jobs()
+
     # FIXED: Add 4th tab for import
-    tab1, tab2, tab3, tab4 = st.tabs([
+    tab1, tab2, tab3, tab_bulk_edit, tab_trash, tab4 = st.tabs([
         "➕ เพิ่มไอเท็มใหม่",
         "✏️ แก้ไข/ลบไอเท็ม",
         "🗑️ ลบหลายรายการ",
+        "🛠️ แก้ไขหลายรายการ",
+        "♻️ ถังขยะ",
         "📥 นำเข้าไฟล์"  # NEW: Import tab
     ])
 
@@ -447,6 +719,12 @@ def main():
     with tab3:
         bulk_delete_page()
 
+    with tab_bulk_edit:
+        bulk_edit_page()
+
+    with tab_trash:
+        trash_page()
+
     # NEW: Import tab - Admin only
     with tab4:
         try:
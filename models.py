@@ -3,10 +3,10 @@ models.py
 =========
 Domain models with validation and business logic.
 """
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Optional, Dict, Any
 from datetime import datetime
-import re
+import html
 
 @dataclass
 class Item:
@@ -24,6 +24,8 @@ class Item:
     tier_id: Optional[int] = None
     tier_name: str = ""
     description: str = ""
+    description_html: str = ""     # sanitized at write time
+    description_excerpt: str = ""  # plain text, for cards and tables
     image_path: str = "assets/images/placeholder.png"
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
@@ -31,6 +33,15 @@ class Item:
     @classmethod
     def from_db_row(cls, row: Dict[str, Any]):
         """Create Item from database row (with joins)."""
+        description = row.get('description') or ''
+        description_html = row.get('description_html')
+        description_excerpt = row.get('description_excerpt')
+        # Rows the backfill has not reached yet: escape rather than sanitize on read
+        if description_html is None:
+            description_html = html.escape(description).replace('\n', '<br>\n')
+        if description_excerpt is None:
+            description_excerpt = description[:120] + ('...' if len(description) > 120 else '')
+
         return cls(
             id=row.get('id'),
             name=row.get('name', ''),
@@ -44,7 +55,9 @@ class Item:
             location_name=row.get('location_name', ''),
             tier_id=row.get('tier_id'),
             tier_name=row.get('tier_name', ''),
-            description=row.get('description', ''),
+            description=description,
+            description_html=description_html,
+            description_excerpt=description_excerpt,
             image_path=row.get('image_path', 'assets/images/placeholder.png'),
             created_at=row.get('created_at'),
             updated_at=row.get('updated_at')
@@ -69,11 +82,7 @@ class Item:
         if not self.tier_id:
             errors.append("กรุณาเลือก Tier")
 
-        # Sanitize description
-        if self.description:
-            # Remove potential XSS
-            self.description = re.sub(r'<[^>]*>', '', self.description)
-
+        # The description is sanitized once when it is written (database.render_description)
         return errors
 
     @property
@@ -81,6 +90,53 @@ class Item:
         """Get formatted name with rarity color HTML."""
         return f'<span style="color:{self.rarity_color};">{self.name}</span>'
 
+@dataclass
+class ItemSelection:
+    """
+    Bulk selection over a filtered item set, independent of its size.
+
+    all_matching=False: selected = ids whose bit is set in `toggled`.
+    all_matching=True:  selected = every item matching `filters` except those bits.
+    Selecting everything flips one flag instead of writing one key per item.
+    """
+    filters: Dict[str, Any] = field(default_factory=dict)
+    all_matching: bool = False
+    toggled: int = 0
+    generation: int = 0  # bumped on select-all/clear so per-page widgets start fresh
+
+    def is_selected(self, item_id: int) -> bool:
+        return self.all_matching != bool((self.toggled >> item_id) & 1)
+
+    def set_selected(self, item_id: int, selected: bool):
+        if selected != self.all_matching:
+            self.toggled |= 1 << item_id
+        else:
+            self.toggled &= ~(1 << item_id)
+
+    def select_all(self):
+        self.all_matching = True
+        self.toggled = 0
+        self.generation += 1
+
+    def clear(self):
+        self.all_matching = False
+        self.toggled = 0
+        self.generation += 1
+
+    def toggled_ids(self) -> list[int]:
+        bits = bin(self.toggled)[:1:-1]
+        return [item_id for item_id, bit in enumerate(bits) if bit == '1']
+
+    def count(self, total_matching: int) -> int:
+        toggled = bin(self.toggled).count('1')
+        return total_matching - toggled if self.all_matching else toggled
+
+    def to_filters(self) -> Dict[str, Any]:
+        """search_items-style filter describing exactly the selected items."""
+        if self.all_matching:
+            return dict(self.filters, exclude_ids=self.toggled_ids())
+        return dict(self.filters, ids=self.toggled_ids())
+
 @dataclass
 class MasterData:
     """Base class for master data entities."""
@@ -0,0 +1,334 @@
+"""
+provision_users.py
+==================
+PRODUCTION - Bulk User Provisioning
+Create many accounts at once from CSV or JSONL (admin page tab or CLI)
+
+    python provision_users.py guild.csv --report credentials.csv
+
+Columns / keys: username, email, name, role (admin|viewer, default viewer),
+password (optional; blank gets a random password that must be changed at
+first login). Passwords are hashed in parallel on the hashing pool and all
+valid users are written in one transaction.
+"""
+import argparse
+import csv
+import io
+import json
+import re
+import secrets
+import string
+import time
+from typing import Iterable, List, Optional
+
+from security.hashing import password_hasher, PasswordHasher, HashQueueFull
+from security.user_store import get_user_store, normalize_username
+
+REQUIRED_FIELDS = ['username', 'email', 'name']
+OPTIONAL_FIELDS = ['role', 'password']
+VALID_ROLES = ('admin', 'viewer')
+USERNAME_PATTERN = re.compile(r'^[a-zA-Z0-9_.]{3,}$')
+MIN_PASSWORD_LENGTH = 8
+GENERATED_PASSWORD_LENGTH = 12
+HASH_RETRY_SECONDS = 30        # how long a bulk run waits for a busy hashing pool
+
+# ----------------------------------------------------------------------
+# Input Parsing
+# ----------------------------------------------------------------------
+def read_rows(data: bytes, filename: str) -> List[dict]:
+    """Rows from CSV or JSONL bytes (format chosen by extension); keys lower-cased."""
+    text = data.decode('utf-8-sig')
+    if filename.lower().endswith(('.jsonl', '.ndjson')):
+        rows = []
+        for line_num, line in enumerate(text.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"บรรทัด {line_num}: JSON ไม่ถูกต้อง ({e.msg})")
+            if not isinstance(record, dict):
+                raise ValueError(f"บรรทัด {line_num}: ต้องเป็น JSON object")
+            rows.append(record)
+    else:
+        rows = list(csv.DictReader(io.StringIO(text)))
+
+    return [{str(key).strip().lower(): value for key, value in row.items() if key is not None}
+            for row in rows]
+
+def generate_password(length: int = GENERATED_PASSWORD_LENGTH) -> str:
+    alphabet = string.ascii_letters + string.digits
+    return ''.join(secrets.choice(alphabet) for _ in range(length))
+
+# ----------------------------------------------------------------------
+# Provisioner
+# ----------------------------------------------------------------------
+class UserProvisioner:
+    """Validate, hash and insert a batch of users"""
+
+    def __init__(self, hasher: Optional[PasswordHasher] = None, store=None):
+        self.hasher = hasher or password_hasher
+        self.store = store or get_user_store()
+
+    def validate_row(self, row: dict, row_num: int, seen: set, existing: set) -> tuple[bool, list[str]]:
+        """Check one row; seen/existing hold normalized usernames from the file and the database"""
+        errors = []
+
+        for field in REQUIRED_FIELDS:
+            if not str(row.get(field) or '').strip():
+                errors.append(f"แถว {row_num}: ไม่มี {field}")
+
+        username = str(row.get('username') or '').strip()
+        if username and not USERNAME_PATTERN.match(username):
+            errors.append(f"แถว {row_num}: ชื่อผู้ใช้ต้องเป็นภาษาอังกฤษ ตัวเลข _ หรือ . อย่างน้อย 3 ตัว")
+        key = normalize_username(username)
+        if key in seen:
+            errors.append(f"แถว {row_num}: ชื่อผู้ใช้ '{username}' ซ้ำในไฟล์")
+        elif key in existing:
+            errors.append(f"แถว {row_num}: ชื่อผู้ใช้ '{username}' มีอยู่แล้ว")
+
+        email = str(row.get('email') or '').strip()
+        if email and '@' not in email:
+            errors.append(f"แถว {row_num}: อีเมลไม่ถูกต้อง '{email}'")
+
+        role = str(row.get('role') or 'viewer').strip().lower()
+        if role not in VALID_ROLES:
+            errors.append(f"แถว {row_num}: สิทธิ์ '{role}' ไม่ถูกต้อง (admin หรือ viewer)")
+
+        password = str(row.get('password') or '')
+        if password and len(password) < MIN_PASSWORD_LENGTH:
+            errors.append(f"แถว {row_num}: รหัสผ่านต้องมีความยาวอย่างน้อย {MIN_PASSWORD_LENGTH} ตัวอักษร")
+
+        return len(errors) == 0, errors
+
+    def provision(self, rows: List[dict], created_by: str = 'system', strict: bool = False,
+                  progress=None) -> dict:
+        """
+        Create users from parsed rows. Invalid rows are reported and skipped;
+        with strict=True any invalid row aborts the whole batch. All valid
+        users are inserted in a single transaction.
+        """
+        started = time.perf_counter()
+        results = {
+            'total': len(rows),
+            'success': 0,
+            'failed': 0,
+            'errors': [],
+            'generated': [],   # (username, password) for rows without a password
+            'hash_seconds': 0.0,
+            'write_seconds': 0.0,
+            'elapsed': 0.0,
+            'users_per_second': 0.0,
+        }
+
+        existing = self.store.find_existing_usernames(
+            [str(row.get('username') or '') for row in rows]
+        )
+        seen = set()
+        users, passwords = [], []
+
+        for idx, row in enumerate(rows):
+            row_num = idx + 2  # header is line 1
+            is_valid, errors = self.validate_row(row, row_num, seen, existing)
+            if not is_valid:
+                results['failed'] += 1
+                results['errors'].extend(errors)
+                continue
+
+            username = normalize_username(str(row['username']))
+            seen.add(username)
+            password = str(row.get('password') or '')
+            generated = not password
+            if generated:
+                password = generate_password()
+                results['generated'].append((username, password))
+
+            users.append({
+                'username': username,
+                'email': str(row['email']).strip(),
+                'name': str(row['name']).strip(),
+                'role': str(row.get('role') or 'viewer').strip().lower(),
+                'created_by': created_by,
+                # Generated passwords travel in a report, so they are one-time
+                'force_password_change': generated,
+            })
+            passwords.append(password)
+
+        if not users or (strict and results['failed']):
+            if strict and results['failed']:
+                results['errors'].append("โหมด strict: ไม่ได้สร้างผู้ใช้ เนื่องจากมีแถวที่ไม่ถูกต้อง")
+                results['generated'] = []
+            results['elapsed'] = time.perf_counter() - started
+            return results
+
+        hash_started = time.perf_counter()
+        hashes = self._hash_all(passwords, progress)
+        results['hash_seconds'] = time.perf_counter() - hash_started
+
+        for user, hashed in zip(users, hashes):
+            user['password'] = hashed
+
+        write_started = time.perf_counter()
+        try:
+            self.store.create_users(users)
+        except ValueError as e:
+            # Someone took a username between validation and insert
+            results['failed'] += len(users)
+            results['errors'].append(f"❌ ไม่ได้สร้างผู้ใช้: {e}")
+            results['generated'] = []
+        else:
+            results['success'] = len(users)
+        results['write_seconds'] = time.perf_counter() - write_started
+
+        results['elapsed'] = time.perf_counter() - started
+        if results['success'] and results['elapsed'] > 0:
+            results['users_per_second'] = results['success'] / results['elapsed']
+        return results
+
+    def _hash_all(self, passwords: List[str], progress=None) -> List[str]:
+        """Hash in pool-sized chunks, waiting (not failing) while other sessions use the pool."""
+        chunk_size = max(1, self.hasher.max_pending // 2)
+        hashes = []
+        for start in range(0, len(passwords), chunk_size):
+            chunk = passwords[start:start + chunk_size]
+            deadline = time.monotonic() + HASH_RETRY_SECONDS
+            while True:
+                try:
+                    hashes.extend(self.hasher.hash_many(chunk))
+                    break
+                except HashQueueFull:
+                    if time.monotonic() > deadline:
+                        raise
+                    time.sleep(0.1)
+            if progress:
+                progress(len(hashes), len(passwords))
+        return hashes
+
+def credentials_report_csv(generated: Iterable[tuple]) -> bytes:
+    """CSV of generated one-time passwords for distribution"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(['username', 'password'])
+    writer.writerows(generated)
+    return buffer.getvalue().encode('utf-8-sig')
+
+def generate_template_csv() -> bytes:
+    template = (
+        "username,email,name,role,password\n"
+        "guild_member1,member1@example.com,สมาชิกกิลด์ 1,viewer,\n"
+        "guild_officer,officer@example.com,เจ้าหน้าที่กิลด์,admin,Officer@2026\n"
+    )
+    return template.encode('utf-8-sig')
+
+# ----------------------------------------------------------------------
+# Admin Page
+# ----------------------------------------------------------------------
+def render_provisioning_tab(created_by: str):
+    """Bulk user import section for the admin panel"""
+    import streamlit as st
+
+    st.markdown("### 📥 นำเข้าผู้ใช้จำนวนมาก")
+    st.caption("CSV หรือ JSONL: username, email, name, role, password "
+               "(เว้นว่าง password เพื่อสุ่มรหัสผ่านแบบใช้ครั้งเดียว)")
+
+    st.download_button(
+        "📄 ดาวน์โหลด Template",
+        data=generate_template_csv(),
+        file_name="users_template.csv",
+        mime="text/csv"
+    )
+
+    uploaded = st.file_uploader("เลือกไฟล์ผู้ใช้", type=['csv', 'jsonl'], key="provision_upload")
+    strict = st.checkbox("ยกเลิกทั้งหมดถ้ามีแถวที่ไม่ถูกต้อง", value=True)
+
+    if uploaded is None:
+        return
+
+    try:
+        rows = read_rows(uploaded.getvalue(), uploaded.name)
+    except (ValueError, UnicodeDecodeError) as e:
+        st.error(f"❌ ไม่สามารถอ่านไฟล์ได้: {e}")
+        return
+
+    st.info(f"พบ {len(rows)} แถว")
+
+    if st.button("✅ สร้างผู้ใช้ทั้งหมด", type="primary", use_container_width=True):
+        progress_bar = st.progress(0.0, text="กำลังเข้ารหัสรหัสผ่าน...")
+
+        def on_progress(done, total):
+            progress_bar.progress(done / total, text=f"เข้ารหัสรหัสผ่าน {done}/{total}")
+
+        try:
+            results = UserProvisioner().provision(rows, created_by=created_by, strict=strict,
+                                                  progress=on_progress)
+        except HashQueueFull as e:
+            st.error(f"⏳ {e}")
+            return
+        progress_bar.empty()
+
+        col1, col2, col3 = st.columns(3)
+        col1.metric("✅ สร้างสำเร็จ", results['success'])
+        col2.metric("❌ ไม่สำเร็จ", results['failed'])
+        col3.metric("⚡ ผู้ใช้/วินาที", f"{results['users_per_second']:.1f}")
+        st.caption(f"เข้ารหัส {results['hash_seconds']:.2f} วินาที • "
+                   f"บันทึก {results['write_seconds'] * 1000:.0f} ms • รวม {results['elapsed']:.2f} วินาที")
+
+        if results['errors']:
+            with st.expander("⚠️ รายละเอียดข้อผิดพลาด", expanded=True):
+                for error in results['errors'][:50]:
+                    st.markdown(f"- {error}")
+                if len(results['errors']) > 50:
+                    st.caption(f"และอีก {len(results['errors']) - 50} รายการ")
+
+        if results['generated']:
+            st.warning("🔑 ดาวน์โหลดรหัสผ่านที่สุ่มไว้ตอนนี้ — จะไม่แสดงอีก")
+            st.download_button(
+                "⬇️ ดาวน์โหลดรหัสผ่านชั่วคราว",
+                data=credentials_report_csv(results['generated']),
+                file_name="provisioned_credentials.csv",
+                mime="text/csv"
+            )
+
+# ----------------------------------------------------------------------
+# CLI
+# ----------------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-create ARPG Item Wiki users from CSV/JSONL")
+    parser.add_argument("file", help="ไฟล์ .csv หรือ .jsonl")
+    parser.add_argument("--report", help="บันทึกรหัสผ่านที่สุ่มไว้ลงไฟล์ CSV นี้")
+    parser.add_argument("--strict", action="store_true", help="ไม่สร้างผู้ใช้เลยถ้ามีแถวที่ไม่ถูกต้อง")
+    parser.add_argument("--workers", type=int, help="จำนวน thread สำหรับเข้ารหัสรหัสผ่าน")
+    parser.add_argument("--created-by", default="cli")
+    args = parser.parse_args()
+
+    with open(args.file, 'rb') as file:
+        rows = read_rows(file.read(), args.file)
+
+    hasher = PasswordHasher(max_workers=args.workers) if args.workers else None
+    results = UserProvisioner(hasher=hasher).provision(
+        rows, created_by=args.created_by, strict=args.strict,
+        progress=lambda done, total: print(f"\r🔐 {done}/{total}", end="", flush=True)
+    )
+    print()
+
+    for error in results['errors']:
+        print(f"  ⚠️ {error}")
+    print(f"✅ สร้าง {results['success']}/{results['total']} ผู้ใช้ "
+          f"({results['users_per_second']:.1f} ผู้ใช้/วินาที; hash {results['hash_seconds']:.2f}s, "
+          f"write {results['write_seconds'] * 1000:.0f}ms)")
+
+    if results['generated']:
+        if args.report:
+            with open(args.report, 'wb') as file:
+                file.write(credentials_report_csv(results['generated']))
+            print(f"🔑 รหัสผ่านที่สุ่มไว้ {len(results['generated'])} รายการ บันทึกที่ {args.report}")
+        else:
+            print("🔑 รหัสผ่านที่สุ่มไว้ (ต้องเปลี่ยนเมื่อ login ครั้งแรก):")
+            for username, password in results['generated']:
+                print(f"   {username}: {password}")
+
+    if results['failed']:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
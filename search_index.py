@@ -0,0 +1,437 @@
+"""
+search_index.py
+===============
+Compact search structures built once per catalog data version.
+Client index: name trigrams + facet ids + rarity styling + thumbnails,
+shipped gzipped to the browser so read-only search runs client-side.
+Prefix index: sorted in-memory name keys for sub-millisecond autocomplete.
+Trigram index: numpy inverted index + bounded edit distance for fuzzy search.
+"""
+import base64
+import gzip
+import io
+import json
+import os
+import re
+import time
+import unicodedata
+from bisect import bisect_left, insort
+from functools import lru_cache
+from threading import RLock
+
+import numpy as np
+import streamlit as st
+from PIL import Image
+
+from database import execute_query, get_data_version, add_item_listener
+from image_jobs import THUMBNAIL_SIZE, thumbnail_path
+
+# ----------------------------------------------------------------------
+# Name Normalization
+# ----------------------------------------------------------------------
+_WHITESPACE = re.compile(r'\s+')
+
+def normalize_name(name):
+    """Normalize an item name for matching: NFKC, casefold, single spaces."""
+    if not name:
+        return ""
+    name = unicodedata.normalize('NFKC', str(name)).casefold()
+    return _WHITESPACE.sub(' ', name).strip()
+
+def name_trigrams(normalized):
+    """Character trigrams of a normalized name, padded so short names still match."""
+    padded = f"  {normalized} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+# ----------------------------------------------------------------------
+# Thumbnails
+# ----------------------------------------------------------------------
+@lru_cache(maxsize=4096)
+def _thumbnail_data_uri(image_path, mtime):
+    """Small JPEG data URI for an image file; mtime is part of the cache key."""
+    stored = thumbnail_path(image_path)
+    if stored and os.path.exists(stored):
+        # Written by the upload worker; no decode needed
+        with open(stored, "rb") as f:
+            return "data:image/jpeg;base64," + base64.b64encode(f.read()).decode()
+
+    try:
+        with Image.open(image_path) as img:
+            img = img.convert('RGB')
+            img.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+            buffer = io.BytesIO()
+            img.save(buffer, format='JPEG', quality=70)
+        return "data:image/jpeg;base64," + base64.b64encode(buffer.getvalue()).decode()
+    except (IOError, OSError):
+        return ""
+
+def get_thumbnail_data_uri(image_path):
+    """Thumbnail data URI, falling back to the placeholder image."""
+    if not image_path or not os.path.exists(image_path):
+        image_path = "assets/images/placeholder.png"
+    try:
+        mtime = os.path.getmtime(image_path)
+    except OSError:
+        return ""
+    return _thumbnail_data_uri(image_path, mtime)
+
+# ----------------------------------------------------------------------
+# Client Search Index
+# ----------------------------------------------------------------------
+def build_client_index(version):
+    """
+    Build the columnar client index for one data version.
+
+    Layout (positions are shared by every column):
+        items.id/name/type/rarity/location/tier - facet ids per item
+        items.thumb - index into the deduplicated thumbs list
+        grams - trigram -> list of item positions
+    """
+    rows = execute_query("""
+        SELECT i.id, i.name, i.type_id, i.rarity_id, i.location_id, i.tier_id, i.image_path
+        FROM items i
+        WHERE i.deleted_at IS NULL
+        ORDER BY i.name
+    """)
+
+    facets = {
+        'types': [[r['id'], r['name']] for r in
+                  execute_query("SELECT id, name FROM item_types ORDER BY display_order, name")],
+        'rarities': [[r['id'], r['name'], r['color'], r['icon'], r['display_order']] for r in
+                     execute_query("SELECT id, name, color, icon, display_order FROM rarities ORDER BY display_order")],
+        'locations': [[r['id'], r['name']] for r in
+                      execute_query("SELECT id, name FROM drop_locations ORDER BY name")],
+        'tiers': [[r['id'], r['name']] for r in
+                  execute_query("SELECT id, name FROM tiers ORDER BY display_order")],
+    }
+
+    columns = {key: [] for key in ('id', 'name', 'type', 'rarity', 'location', 'tier', 'thumb')}
+    grams = {}
+    thumbs = []
+    thumb_index = {}
+
+    for pos, row in enumerate(rows):
+        columns['id'].append(row['id'])
+        columns['name'].append(row['name'])
+        columns['type'].append(row['type_id'])
+        columns['rarity'].append(row['rarity_id'])
+        columns['location'].append(row['location_id'])
+        columns['tier'].append(row['tier_id'])
+
+        image_path = row['image_path'] or "assets/images/placeholder.png"
+        if image_path not in thumb_index:
+            thumb_index[image_path] = len(thumbs)
+            thumbs.append(get_thumbnail_data_uri(image_path))
+        columns['thumb'].append(thumb_index[image_path])
+
+        for gram in name_trigrams(normalize_name(row['name'])):
+            grams.setdefault(gram, []).append(pos)
+
+    return {
+        'version': version,
+        'facets': facets,
+        'items': columns,
+        'thumbs': thumbs,
+        'grams': grams,
+    }
+
+def serialize_client_index(index):
+    """Gzip the index as compact JSON and base64 it for transport as a component arg."""
+    raw = json.dumps(index, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return base64.b64encode(gzip.compress(raw, compresslevel=6)).decode('ascii')
+
+@st.cache_data(ttl=3600, max_entries=4)
+def get_client_index_payload(version):
+    """Serialized client index, built at most once per data version."""
+    return serialize_client_index(build_client_index(version))
+
+# ----------------------------------------------------------------------
+# Prefix Index - autocomplete over normalized names
+# ----------------------------------------------------------------------
+_PREFIX_END = '\U0010ffff'
+
+def name_prefix_keys(normalized):
+    """Keys an item is findable by: the full name and every later word start."""
+    keys = [normalized]
+    for pos, char in enumerate(normalized):
+        if char == ' ' and pos + 1 < len(normalized):
+            keys.append(normalized[pos + 1:])
+    return keys
+
+class PrefixIndex:
+    """
+    Sorted (key, item_id) lists bucketed by rarity display_order.
+
+    suggest() walks rarities from the highest order down and bisects each
+    bucket, so a top-k lookup costs a few bisects plus k reads regardless of
+    catalog size. Local writes are applied incrementally through the
+    database item listener; writes from other processes (or master-data
+    edits) are caught by a throttled data_version check and a full rebuild.
+    """
+
+    VERSION_CHECK_INTERVAL = 5.0
+
+    _ITEM_QUERY = """
+        SELECT i.id, i.name, r.name as rarity_name, r.icon, r.display_order
+        FROM items i
+        JOIN rarities r ON i.rarity_id = r.id
+        WHERE i.deleted_at IS NULL
+    """
+
+    def __init__(self):
+        self._lock = RLock()
+        self._buckets = {}
+        self._items = {}
+        self._version = None
+        self._checked_at = 0.0
+
+    # ----- building -----
+    def rebuild(self):
+        """Reload every item and rebuild all buckets."""
+        version = get_data_version()
+        rows = execute_query(self._ITEM_QUERY)
+
+        buckets = {}
+        items = {}
+        for row in rows:
+            entry = self._entry_from_row(row)
+            items[row['id']] = entry
+            bucket = buckets.setdefault(entry['order'], [])
+            bucket.extend((key, row['id']) for key in entry['keys'])
+
+        for bucket in buckets.values():
+            bucket.sort()
+
+        with self._lock:
+            self._buckets = buckets
+            self._items = items
+            self._version = version
+            self._checked_at = time.monotonic()
+
+    @staticmethod
+    def _entry_from_row(row):
+        return {
+            'id': row['id'],
+            'name': row['name'],
+            'rarity_name': row['rarity_name'],
+            'icon': row['icon'],
+            'order': row['display_order'] or 0,
+            'keys': name_prefix_keys(normalize_name(row['name'])),
+        }
+
+    def _ensure_fresh(self):
+        now = time.monotonic()
+        if self._version is not None and now - self._checked_at < self.VERSION_CHECK_INTERVAL:
+            return
+        if self._version is None or get_data_version() != self._version:
+            self.rebuild()
+        else:
+            self._checked_at = now
+
+    # ----- incremental updates -----
+    def _remove_locked(self, item_id):
+        entry = self._items.pop(item_id, None)
+        if not entry:
+            return
+        bucket = self._buckets.get(entry['order'], [])
+        for key in entry['keys']:
+            pos = bisect_left(bucket, (key, item_id))
+            if pos < len(bucket) and bucket[pos] == (key, item_id):
+                del bucket[pos]
+
+    def apply_change(self, event, item_id):
+        """Item listener: patch one item in place instead of rebuilding."""
+        if self._version is None:
+            return
+        if event == 'bulk':
+            # Many rows changed at once; let the next lookup rebuild
+            with self._lock:
+                self._checked_at = 0.0
+            return
+
+        row = None
+        if event != 'delete':
+            row = execute_query(self._ITEM_QUERY + " AND i.id = ?", (item_id,), fetch_one=True)
+        version = get_data_version()
+
+        with self._lock:
+            self._remove_locked(item_id)
+            if row:
+                entry = self._entry_from_row(row)
+                self._items[item_id] = entry
+                bucket = self._buckets.setdefault(entry['order'], [])
+                for key in entry['keys']:
+                    insort(bucket, (key, item_id))
+            self._version = version
+
+    # ----- queries -----
+    def suggest(self, prefix, k=10):
+        """Top-k items whose name (or a word in it) starts with prefix, best rarity first."""
+        prefix = normalize_name(prefix)
+        if not prefix or k <= 0:
+            return []
+
+        self._ensure_fresh()
+
+        results = []
+        seen = set()
+        with self._lock:
+            for order in sorted(self._buckets, reverse=True):
+                bucket = self._buckets[order]
+                pos = bisect_left(bucket, (prefix,))
+                end = bisect_left(bucket, (prefix + _PREFIX_END,))
+                while pos < end and len(results) < k:
+                    item_id = bucket[pos][1]
+                    if item_id not in seen:
+                        seen.add(item_id)
+                        entry = self._items[item_id]
+                        results.append({
+                            'id': item_id,
+                            'name': entry['name'],
+                            'rarity_name': entry['rarity_name'],
+                            'icon': entry['icon'],
+                        })
+                    pos += 1
+                if len(results) >= k:
+                    break
+        return results
+
+prefix_index = PrefixIndex()
+add_item_listener(prefix_index.apply_change)
+
+def suggest_item_names(prefix, k=10):
+    """Autocomplete API: top-k matching items as dicts (id, name, rarity_name, icon)."""
+    return prefix_index.suggest(prefix, k)
+
+# ----------------------------------------------------------------------
+# Trigram Index - typo-tolerant fuzzy search
+# ----------------------------------------------------------------------
+FUZZY_MIN_SIMILARITY = 0.3
+FUZZY_CANDIDATES = 200
+
+def fuzzy_key(name):
+    """
+    Normalized name with combining marks dropped, so missing Thai tone/vowel
+    marks and Latin accents don't count as typos.
+    """
+    decomposed = unicodedata.normalize('NFD', normalize_name(name))
+    return ''.join(c for c in decomposed if unicodedata.category(c) != 'Mn')
+
+class TrigramIndex:
+    """
+    Two-stage fuzzy matcher over one data version.
+
+    Stage 1: CSR inverted index (trigram -> item positions). Shared-trigram
+    counts for every item come from one np.bincount over the query's posting
+    lists, and Dice similarity is computed for all items at once.
+    Stage 2: the best FUZZY_CANDIDATES are re-ranked with a Levenshtein
+    distance computed column-by-column across all candidates in parallel.
+    """
+
+    def __init__(self, rows):
+        self.ids = np.array([row['id'] for row in rows], dtype=np.int64)
+        self.keys = [fuzzy_key(row['name']) for row in rows]
+
+        gram_ids = {}
+        postings = []
+        gram_counts = np.zeros(len(self.keys), dtype=np.int32)
+        for pos, key in enumerate(self.keys):
+            grams = name_trigrams(key)
+            gram_counts[pos] = len(grams)
+            for gram in grams:
+                gid = gram_ids.setdefault(gram, len(gram_ids))
+                postings.append((gid, pos))
+
+        self.gram_ids = gram_ids
+        self.gram_counts = gram_counts
+
+        if postings:
+            pairs = np.array(postings, dtype=np.int64)
+            pairs = pairs[np.argsort(pairs[:, 0], kind='stable')]
+            self.posting_items = pairs[:, 1].astype(np.int32)
+            self.posting_ptr = np.zeros(len(gram_ids) + 1, dtype=np.int64)
+            np.cumsum(np.bincount(pairs[:, 0], minlength=len(gram_ids)), out=self.posting_ptr[1:])
+        else:
+            self.posting_items = np.zeros(0, dtype=np.int32)
+            self.posting_ptr = np.zeros(1, dtype=np.int64)
+
+    def _candidates(self, query_key, allowed=None):
+        """
+        Stage 1: Dice similarity of every item against the query's trigrams.
+        allowed is a boolean mask over positions; items outside it never qualify.
+        """
+        grams = name_trigrams(query_key)
+        slices = [self.posting_items[self.posting_ptr[gid]:self.posting_ptr[gid + 1]]
+                  for gid in (self.gram_ids.get(g) for g in grams) if gid is not None]
+        if not slices:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+
+        shared = np.bincount(np.concatenate(slices), minlength=len(self.keys))
+        dice = 2.0 * shared / (len(grams) + self.gram_counts)
+        if allowed is not None:
+            dice = np.where(allowed, dice, 0.0)
+
+        hits = np.flatnonzero(dice >= FUZZY_MIN_SIMILARITY)
+        if len(hits) > FUZZY_CANDIDATES:
+            hits = hits[np.argpartition(-dice[hits], FUZZY_CANDIDATES)[:FUZZY_CANDIDATES]]
+        return hits, dice[hits]
+
+    def _edit_distances(self, query_key, positions):
+        """Stage 2: Levenshtein distance from the query to each candidate, vectorized over candidates."""
+        names = [self.keys[pos] for pos in positions]
+        lengths = np.array([len(name) for name in names])
+        width = int(lengths.max()) if len(names) else 0
+
+        # Candidate code points, padded with -1 (never equal to a real char)
+        chars = np.full((len(names), width), -1, dtype=np.int64)
+        for row, name in enumerate(names):
+            chars[row, :len(name)] = [ord(c) for c in name]
+
+        query = [ord(c) for c in query_key]
+        prev = np.tile(np.arange(width + 1), (len(names), 1))
+        for i, qc in enumerate(query, start=1):
+            cur = np.empty_like(prev)
+            cur[:, 0] = i
+            cost = (chars != qc).astype(np.int64)
+            # substitution/deletion are elementwise; insertion needs a running pass
+            cur[:, 1:] = np.minimum(prev[:, :-1] + cost, prev[:, 1:] + 1)
+            for j in range(1, width + 1):
+                np.minimum(cur[:, j], cur[:, j - 1] + 1, out=cur[:, j])
+            prev = cur
+
+        return prev[np.arange(len(names)), lengths]
+
+    def search(self, query, k=10, ids=None):
+        """
+        Return [(item_id, score)] best first; score in (0, 1]. ids restricts
+        the search to those items (the page filters) before candidates are cut.
+        """
+        query_key = fuzzy_key(query)
+        if not query_key or not len(self.keys):
+            return []
+
+        allowed = None
+        if ids is not None:
+            allowed = np.isin(self.ids, np.fromiter(ids, dtype=np.int64, count=len(ids)))
+            if not allowed.any():
+                return []
+
+        positions, dice = self._candidates(query_key, allowed)
+        if not len(positions):
+            return []
+
+        distances = self._edit_distances(query_key, positions)
+        longest = np.maximum(len(query_key), np.array([len(self.keys[p]) for p in positions]))
+        scores = 0.5 * dice + 0.5 * (1.0 - distances / longest)
+
+        order = np.argsort(-scores, kind='stable')[:k]
+        return [(int(self.ids[positions[i]]), float(scores[i])) for i in order]
+
+@st.cache_resource(max_entries=2)
+def _load_trigram_index(version):
+    """One TrigramIndex per data version, shared by every session."""
+    return TrigramIndex(execute_query("SELECT id, name FROM items WHERE deleted_at IS NULL"))
+
+def fuzzy_search_items(query, k=10, ids=None):
+    """Typo-tolerant name search: [(item_id, score)] for the current catalog, optionally within ids."""
+    return _load_trigram_index(get_data_version()).search(query, k, ids)
@@ -2,21 +2,30 @@
 security/__init__.py
 ====================
 PRODUCTION - Security Module Package
+
+Package-level names are imported on first access. Importing one
+submodule (database.py uses security.sanitizer) therefore does not pull
+in security.auth, which needs a Streamlit session and the user store.
 """
-from security.auth import auth_manager, require_role, require_authentication
-from security.sanitizer import html_sanitizer, file_validator, output_sanitizer
-from security.ratelimit import rate_limiter, rate_limit
-from security.middleware import security_headers, csrf_protect
+import importlib
+
+_EXPORTS = {
+    'auth_manager': 'security.auth',
+    'require_role': 'security.auth',
+    'require_authentication': 'security.auth',
+    'html_sanitizer': 'security.sanitizer',
+    'file_validator': 'security.sanitizer',
+    'output_sanitizer': 'security.sanitizer',
+    'rate_limiter': 'security.ratelimit',
+    'rate_limit': 'security.ratelimit',
+    'security_headers': 'security.middleware',
+    'csrf_protect': 'security.middleware',
+}
+
+__all__ = list(_EXPORTS)
 
-__all__ = [
-    'auth_manager',
-    'require_role',
-    'require_authentication',
-    'html_sanitizer',
-    'file_validator',
-    'output_sanitizer',
-    'rate_limiter',
-    'rate_limit',
-    'security_headers',
-    'csrf_protect'
-]
\ No newline at end of file
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module 'security' has no attribute {name!r}")
+    return getattr(importlib.import_module(module), name)
@@ -6,17 +6,14 @@ Production Lock Mode: 100% backward compatible
 เฉพาะ Admin เท่านั้นที่เข้าถึงได้
 """
 import streamlit as st
-import streamlit_authenticator as stauth
-import yaml
-from yaml.loader import SafeLoader
-from pathlib import Path
-from datetime import datetime
 from typing import Optional, Dict, List
 import re
 
 from security.auth import auth_manager, require_role
+from security.hashing import hash_password, HashQueueFull
+from security.user_store import get_user_store
 
-CONFIG_PATH = Path(".streamlit/auth_config.yaml")
+USERS_PAGE_SIZE = 50
 
 
 # ----------------------------------------------------------------------
@@ -25,25 +22,9 @@ CONFIG_PATH = Path(".streamlit/auth_config.yaml")
 class AdminUserManager:
     """User management for administrators"""
 
-    def __init__(self):
-        self.config_path = CONFIG_PATH
-
-    def _load_config(self) -> dict:
-        """Load current auth config"""
-        with open(self.config_path) as file:
-            return yaml.load(file, Loader=SafeLoader)
-
-    def _save_config(self, config: dict):
-        """Save auth config"""
-        # Backup first
-        backup_path = self.config_path.with_suffix('.yaml.backup')
-        if self.config_path.exists():
-            import shutil
-            shutil.copy(self.config_path, backup_path)
-
-        # Save new config
-        with open(self.config_path, 'w') as file:
-            yaml.dump(config, file, default_flow_style=False)
+    @property
+    def users(self):
+        return get_user_store()
 
     @require_role(['admin'])
     def create_user(self):
@@ -88,53 +69,56 @@ class AdminUserManager:
             submitted = st.form_submit_button("✅ สร้างผู้ใช้", use_container_width=True)
 
             if submitted:
-                self._save_new_user(username, name, email, role, default_password)
-                st.success(f"✅ สร้างผู้ใช้ '{username}' เรียบร้อย!")
-                st.rerun()
-
-    def _save_new_user(self, username: str, name: str, email: str, role: str, password: str):
-        """Save new user to config"""
-        config = self._load_config()
+                if self._save_new_user(username, name, email, role, default_password):
+                    st.success(f"✅ สร้างผู้ใช้ '{username}' เรียบร้อย!")
+                    st.rerun()
 
+    def _save_new_user(self, username: str, name: str, email: str, role: str, password: str) -> bool:
+        """Save new user to the user store"""
         # Validate username
         if not re.match(r'^[a-zA-Z0-9_]+$', username):
             st.error("⚠️ ชื่อผู้ใช้ต้องเป็นภาษาอังกฤษ ตัวเลข หรือ _ เท่านั้น")
-            return
+            return False
 
-        if username in config['credentials']['usernames']:
+        if self.users.user_exists(username):
             st.error(f"⚠️ ชื่อผู้ใช้ '{username}' มีอยู่แล้ว")
-            return
-
-        # Hash password
-        hashed_password = stauth.Hasher([password]).generate()[0]
-
-        # Add user
-        config['credentials']['usernames'][username] = {
-            'email': email,
-            'name': name,
-            'password': hashed_password,
-            'role': role,
-            'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'created_by': st.session_state.get('auth_username', 'admin'),
-            'force_password_change': True  # บังคับเปลี่ยนรหัสครั้งแรก
-        }
-
-        self._save_config(config)
+            return False
+
+        try:
+            hashed_password = hash_password(password)
+            self.users.create_user(
+                username, hashed_password, email, name, role,
+                created_by=st.session_state.get('auth_username', 'admin'),
+                force_password_change=True  # บังคับเปลี่ยนรหัสครั้งแรก
+            )
+        except (ValueError, HashQueueFull) as e:
+            st.error(f"⚠️ {e}")
+            return False
+        return True
 
     @require_role(['admin'])
     def list_users(self):
-        """แสดงรายชื่อผู้ใช้ทั้งหมด"""
-        config = self._load_config()
-        users = config['credentials']['usernames']
+        """แสดงรายชื่อผู้ใช้ทีละหน้า"""
+        search = st.text_input("🔍 ค้นหาผู้ใช้", key="user_list_search")
+        total = self.users.count_users(search=search)
 
-        if not users:
-            st.info("ยังไม่มีผู้ใช้ในระบบ")
+        if not total:
+            st.info("ยังไม่มีผู้ใช้ในระบบ" if not search else "ไม่พบผู้ใช้ที่ค้นหา")
             return
 
         st.markdown("### 👥 รายชื่อผู้ใช้")
 
+        total_pages = (total + USERS_PAGE_SIZE - 1) // USERS_PAGE_SIZE
+        page = 1
+        if total_pages > 1:
+            page = st.number_input("หน้า", min_value=1, max_value=total_pages, value=1, key="user_list_page")
+        st.caption(f"ทั้งหมด {total} คน • หน้า {page}/{total_pages}")
+
+        users = self.users.list_users(limit=USERS_PAGE_SIZE, offset=(page - 1) * USERS_PAGE_SIZE, search=search)
+
         data = []
-        for username, info in users.items():
+        for info in users:
+            username = info['username']
             data.append({
                 "ชื่อผู้ใช้": username,
                 "ชื่อ": info.get('name', ''),
@@ -151,8 +135,7 @@ class AdminUserManager:
     @require_role(['admin'])
     def reset_password(self):
         """รีเซ็ตรหัสผ่านผู้ใช้"""
-        config = self._load_config()
-        users = list(config['credentials']['usernames'].keys())
+        users = self.users.list_usernames()
 
         if not users:
             st.info("ยังไม่มีผู้ใช้ในระบบ")
@@ -169,21 +152,22 @@ class AdminUserManager:
             st.caption("ผู้ใช้จะต้องเปลี่ยนรหัสผ่านเมื่อ login ครั้งถัดไป")
 
             if st.button("✅ ยืนยันการรีเซ็ตรหัสผ่าน"):
-                hashed = stauth.Hasher([new_password]).generate()[0]
-                config['credentials']['usernames'][username]['password'] = hashed
-                config['credentials']['usernames'][username]['force_password_change'] = True
-                self._save_config(config)
+                try:
+                    hashed = hash_password(new_password)
+                except HashQueueFull as e:
+                    st.error(f"⚠️ {e}")
+                    return
+                self.users.set_password(username, hashed, force_password_change=True)
                 st.success(f"✅ รีเซ็ตรหัสผ่านสำหรับ '{username}' เรียบร้อย!")
                 st.rerun()
 
     @require_role(['admin'])
     def delete_user(self):
         """ลบผู้ใช้ - ห้ามลบตัวเอง"""
-        config = self._load_config()
         current_user = st.session_state.get('auth_username')
 
         # ไม่รวม user ปัจจุบัน
-        users = [u for u in config['credentials']['usernames'].keys() if u != current_user]
+        users = [u for u in self.users.list_usernames() if u != current_user]
 
         if not users:
             st.info("ไม่มีผู้ใช้อื่นให้ลบ")
@@ -197,8 +181,7 @@ class AdminUserManager:
 
             if st.checkbox("ฉันยืนยันการลบผู้ใช้นี้"):
                 if st.button("🗑️ ลบผู้ใช้"):
-                    del config['credentials']['usernames'][username]
-                    self._save_config(config)
+                    self.users.delete_user(username)
                     st.success(f"✅ ลบผู้ใช้ '{username}' เรียบร้อย!")
                     st.rerun()
 
@@ -212,9 +195,7 @@ def check_force_password_change():
         return
 
     username = st.session_state.get('auth_username')
-    config = AdminUserManager()._load_config()
-
-    user_info = config['credentials']['usernames'].get(username, {})
+    user_info = get_user_store().get_user(username) or {}
 
     if user_info.get('force_password_change', False):
         st.session_state.force_password_change = True
@@ -241,14 +222,13 @@ def force_password_change_ui():
                 st.error("⚠️ รหัสผ่านต้องมีความยาวอย่างน้อย 8 ตัวอักษร")
             else:
                 # Update password
-                config = AdminUserManager()._load_config()
                 username = st.session_state.auth_username
-                hashed = stauth.Hasher([new_password]).generate()[0]
-                config['credentials']['usernames'][username]['password'] = hashed
-                config['credentials']['usernames'][username]['force_password_change'] = False
-
-                with open(AdminUserManager().config_path, 'w') as file:
-                    yaml.dump(config, file, default_flow_style=False)
+                try:
+                    hashed = hash_password(new_password)
+                except HashQueueFull as e:
+                    st.error(f"⚠️ {e}")
+                    return
+                get_user_store().set_password(username, hashed, force_password_change=False)
 
                 st.session_state.force_password_change = False
                 st.success("✅ เปลี่ยนรหัสผ่านเรียบร้อย!")
@@ -3,16 +3,21 @@ security/auth.py
 ================
 PRODUCTION - Authentication and Authorization Module
 FIXED: Logout button error when clicked twice
+
+Users are stored in SQLite (security.user_store); auth_config.yaml only
+holds the cookie settings.
 """
 import streamlit as st
 import streamlit_authenticator as stauth
 import yaml
 from yaml.loader import SafeLoader
 from pathlib import Path
-from datetime import datetime
 from typing import Tuple, Optional, Literal, Dict, Any
 import secrets
 
+from security.hashing import password_hasher, hash_password, HashQueueFull, install_authenticator_verifier
+from security.user_store import get_user_store
+
 CONFIG_PATH = Path(".streamlit/auth_config.yaml")
 UserRole = Literal["admin", "viewer"]
 
@@ -31,18 +36,29 @@ class AuthManager:
         if self._initialized:
             return
 
+        self.users = get_user_store()
+        # Login password checks run on the bounded hashing pool
+        install_authenticator_verifier()
+
         if not CONFIG_PATH.exists():
             self._create_production_config()
+        else:
+            # One-time move of a pre-SQLite credentials block into the store
+            self.users.migrate_from_yaml(CONFIG_PATH)
 
         with open(CONFIG_PATH, 'r', encoding='utf-8') as file:
             self.config = yaml.load(file, Loader=SafeLoader)
 
+        # Live view over the users table instead of a parsed copy
+        self.config['credentials'] = self.users.credentials()
+
         self.authenticator = stauth.Authenticate(
             self.config['credentials'],
             self.config['cookie']['name'],
             self.config['cookie']['key'],
             self.config['cookie']['expiry_days'],
-            self.config.get('preauthorized', {})
+            self.config.get('preauthorized', {}),
+            auto_hash=False  # the store only ever holds hashes
         )
 
         self._initialized = True
@@ -52,38 +68,19 @@ class AuthManager:
         CONFIG_PATH.parent.mkdir(exist_ok=True)
 
         secure_key = secrets.token_hex(32)
-        admin_password = stauth.Hasher(['Arpg@Admin2026']).generate()[0]
-        viewer_password = stauth.Hasher(['View@1234']).generate()[0]
+        admin_password, viewer_password = password_hasher.hash_many(['Arpg@Admin2026', 'View@1234'])
+
+        if self.users.count_users() == 0:
+            self.users.create_users([
+                {'username': 'admin', 'email': 'admin@arpg-wiki.com', 'name': 'Administrator',
+                 'password': admin_password, 'role': 'admin'},
+                {'username': 'viewer1', 'email': 'viewer1@example.com', 'name': 'ผู้ใช้งานทั่วไป 1',
+                 'password': viewer_password, 'role': 'viewer'},
+                {'username': 'viewer2', 'email': 'viewer2@example.com', 'name': 'ผู้ใช้งานทั่วไป 2',
+                 'password': viewer_password, 'role': 'viewer'},
+            ])
 
         production_config = {
-            'credentials': {
-                'usernames': {
-                    'admin': {
-                        'email': 'admin@arpg-wiki.com',
-                        'name': 'Administrator',
-                        'password': admin_password,
-                        'role': 'admin',
-                        'created_at': datetime.now().strftime('%Y-%m-%d'),
-                        'created_by': 'system'
-                    },
-                    'viewer1': {
-                        'email': 'viewer1@example.com',
-                        'name': 'ผู้ใช้งานทั่วไป 1',
-                        'password': viewer_password,
-                        'role': 'viewer',
-                        'created_at': datetime.now().strftime('%Y-%m-%d'),
-                        'created_by': 'system'
-                    },
-                    'viewer2': {
-                        'email': 'viewer2@example.com',
-                        'name': 'ผู้ใช้งานทั่วไป 2',
-                        'password': viewer_password,
-                        'role': 'viewer',
-                        'created_at': datetime.now().strftime('%Y-%m-%d'),
-                        'created_by': 'system'
-                    }
-                }
-            },
             'cookie': {
                 'name': 'arpg_item_wiki_production',
                 'key': secure_key,
@@ -108,7 +105,11 @@ class AuthManager:
 
     def login_widget(self, location: str = "main"):
         """Render login widget"""
-        name, authentication_status, username = self.authenticator.login(location)
+        try:
+            name, authentication_status, username = self.authenticator.login(location)
+        except HashQueueFull as e:
+            st.warning(f"⏳ {e}")
+            return False
 
         if authentication_status:
             st.session_state.auth_name = name
@@ -135,10 +136,11 @@ class AuthManager:
                     del st.session_state[key]
 
     def _get_user_role(self, username: str) -> UserRole:
-        """Get user role from config"""
+        """Get user role from the user store"""
         try:
-            return self.config['credentials']['usernames'][username].get('role', 'viewer')
-        except:
+            user = self.users.get_user(username)
+            return user['role'] if user else 'viewer'
+        except Exception:
             return 'viewer'
 
     def get_current_user(self) -> Optional[Dict[str, Any]]:
@@ -171,44 +173,31 @@ class AuthManager:
             return False, "❌ เฉพาะ Admin เท่านั้นที่สร้างผู้ใช้ได้"
 
         try:
-            if username in self.config['credentials']['usernames']:
+            if self.users.user_exists(username):
                 return False, f"❌ ชื่อผู้ใช้ '{username}' มีอยู่แล้ว"
 
-            hashed_password = stauth.Hasher([password]).generate()[0]
+            hashed_password = hash_password(password)
 
-            self.config['credentials']['usernames'][username] = {
-                'email': email,
-                'name': name,
-                'password': hashed_password,
-                'role': role,
-                'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                'created_by': st.session_state.get('auth_username', 'admin')
-            }
-
-            with open(CONFIG_PATH, 'w', encoding='utf-8') as file:
-                yaml.dump(self.config, file, allow_unicode=True)
+            self.users.create_user(
+                username, hashed_password, email, name, role,
+                created_by=st.session_state.get('auth_username', 'admin')
+            )
 
             return True, f"✅ สร้างผู้ใช้ '{username}' เรียบร้อย"
 
+        except ValueError:
+            return False, f"❌ ชื่อผู้ใช้ '{username}' มีอยู่แล้ว"
+        except HashQueueFull as e:
+            return False, f"⏳ {e}"
         except Exception as e:
             return False, f"❌ เกิดข้อผิดพลาด: {str(e)}"
 
-    def list_users(self) -> list:
-        """List all users (Admin only)"""
+    def list_users(self, limit: Optional[int] = None, offset: int = 0, search: Optional[str] = None) -> list:
+        """List users, one page at a time when limit is given (Admin only)"""
         if not self.has_role('admin'):
             return []
 
-        users = []
-        for username, data in self.config['credentials']['usernames'].items():
-            users.append({
-                'username': username,
-                'name': data.get('name', ''),
-                'email': data.get('email', ''),
-                'role': data.get('role', 'viewer'),
-                'created_at': data.get('created_at', ''),
-                'created_by': data.get('created_by', '')
-            })
-        return users
+        return self.users.list_users(limit=limit, offset=offset, search=search)
 
     def reset_password(self, username: str, new_password: str) -> Tuple[bool, str]:
         """Reset user password (Admin only)"""
@@ -216,18 +205,16 @@ class AuthManager:
             return False, "❌ เฉพาะ Admin เท่านั้นที่เปลี่ยนรหัสผ่านได้"
 
         try:
-            if username not in self.config['credentials']['usernames']:
+            if not self.users.user_exists(username):
                 return False, f"❌ ไม่พบผู้ใช้ '{username}'"
 
-            hashed_password = stauth.Hasher([new_password]).generate()[0]
-            self.config['credentials']['usernames'][username]['password'] = hashed_password
-            self.config['credentials']['usernames'][username]['updated_at'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-
-            with open(CONFIG_PATH, 'w', encoding='utf-8') as file:
-                yaml.dump(self.config, file, allow_unicode=True)
+            hashed_password = hash_password(new_password)
+            self.users.set_password(username, hashed_password)
 
             return True, f"✅ เปลี่ยนรหัสผ่านของ '{username}' เรียบร้อย"
 
+        except HashQueueFull as e:
+            return False, f"⏳ {e}"
         except Exception as e:
             return False, f"❌ เกิดข้อผิดพลาด: {str(e)}"
 
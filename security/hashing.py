@@ -0,0 +1,170 @@
+"""
+security/hashing.py
+===================
+PRODUCTION - Password Hashing Worker Pool
+
+bcrypt is deliberately slow (~0.25 s per hash at cost 12). Running it in
+the Streamlit script thread meant a bulk password reset or a burst of
+logins held server threads for seconds at a time. Hash and verify calls
+now run on a small bounded pool; bcrypt releases the GIL, so other
+sessions keep rendering while the caller waits for its result. When more
+than MAX_PENDING operations are queued, new ones are refused with
+HashQueueFull instead of piling up.
+
+Pick the cost factor for a server with:
+    python -m security.hashing --target-ms 250
+"""
+import argparse
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+import bcrypt
+
+HASH_WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))
+MAX_PENDING = 64               # queued + running operations before new ones are refused
+BCRYPT_ROUNDS = int(os.environ.get("ARPG_BCRYPT_ROUNDS", "12"))
+HASH_TIMEOUT = 30              # seconds a caller waits for its result
+
+class HashQueueFull(RuntimeError):
+    """Raised when the hashing pool already has MAX_PENDING operations queued."""
+
+# ----------------------------------------------------------------------
+# Hashing Pool
+# ----------------------------------------------------------------------
+class PasswordHasher:
+    """Bounded thread pool for bcrypt hash/verify; callers block on the result."""
+
+    def __init__(self, max_workers: int = HASH_WORKERS, max_pending: int = MAX_PENDING,
+                 rounds: int = BCRYPT_ROUNDS):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.rounds = rounds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bcrypt")
+        self._lock = threading.Lock()
+        self._pending = 0
+
+    def _submit(self, fn, *args, count: int = 1):
+        with self._lock:
+            if self._pending + count > self.max_pending:
+                raise HashQueueFull("ระบบกำลังประมวลผลรหัสผ่านจำนวนมาก กรุณาลองใหม่อีกครั้ง")
+            self._pending += count
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._release(count)
+            raise
+        future.add_done_callback(lambda _: self._release(count))
+        return future
+
+    def _release(self, count: int):
+        with self._lock:
+            self._pending -= count
+
+    def _hash_one(self, password: str) -> str:
+        return bcrypt.hashpw(password.encode(), bcrypt.gensalt(self.rounds)).decode()
+
+    @staticmethod
+    def _verify_one(password: str, hashed_password: str) -> bool:
+        try:
+            return bcrypt.checkpw(password.encode(), hashed_password.encode())
+        except ValueError:
+            # Malformed stored hash
+            return False
+
+    # ===== Public API =====
+    def hash(self, password: str, timeout: Optional[float] = HASH_TIMEOUT) -> str:
+        """bcrypt hash of password, computed on the pool."""
+        return self._submit(self._hash_one, password).result(timeout)
+
+    def verify(self, password: str, hashed_password: str, timeout: Optional[float] = HASH_TIMEOUT) -> bool:
+        """Check password against a stored bcrypt hash on the pool."""
+        return self._submit(self._verify_one, password, hashed_password).result(timeout)
+
+    def hash_many(self, passwords: List[str], timeout: Optional[float] = None) -> List[str]:
+        """
+        Hash a batch across all workers, in order. The whole batch must fit
+        under max_pending, so bulk callers should chunk by that size.
+        """
+        if not passwords:
+            return []
+        with self._lock:
+            if self._pending + len(passwords) > self.max_pending:
+                raise HashQueueFull("ระบบกำลังประมวลผลรหัสผ่านจำนวนมาก กรุณาลองใหม่อีกครั้ง")
+            self._pending += len(passwords)
+        futures = []
+        try:
+            for password in passwords:
+                future = self._executor.submit(self._hash_one, password)
+                future.add_done_callback(lambda _: self._release(1))
+                futures.append(future)
+        finally:
+            # Give back the slots of anything that failed to submit
+            self._release(len(passwords) - len(futures))
+        return [future.result(timeout) for future in futures]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'workers': self.max_workers, 'pending': self._pending,
+                    'max_pending': self.max_pending, 'rounds': self.rounds}
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+password_hasher = PasswordHasher()
+
+def hash_password(password: str) -> str:
+    return password_hasher.hash(password)
+
+def verify_password(password: str, hashed_password: str) -> bool:
+    return password_hasher.verify(password, hashed_password)
+
+def install_authenticator_verifier():
+    """
+    streamlit-authenticator checks passwords with Hasher.check_pw inside
+    login(); route that through the pool so a login burst runs at most
+    HASH_WORKERS bcrypt checks at a time.
+    """
+    import streamlit_authenticator as stauth
+
+    stauth.Hasher.check_pw = classmethod(lambda cls, password, hashed: verify_password(password, hashed))
+
+# ----------------------------------------------------------------------
+# Cost Benchmark
+# ----------------------------------------------------------------------
+def benchmark_rounds(min_rounds: int = 10, max_rounds: int = 14, samples: int = 3) -> dict:
+    """Median milliseconds per hash for each cost factor on this machine."""
+    results = {}
+    for rounds in range(min_rounds, max_rounds + 1):
+        salt = bcrypt.gensalt(rounds)
+        timings = []
+        for _ in range(samples):
+            start = time.perf_counter()
+            bcrypt.hashpw(b"benchmark-password", salt)
+            timings.append((time.perf_counter() - start) * 1000)
+        results[rounds] = sorted(timings)[len(timings) // 2]
+    return results
+
+def recommend_rounds(target_ms: float, timings: dict) -> int:
+    """Highest cost whose hash time stays within target_ms (never below the lowest tested)."""
+    within = [rounds for rounds, ms in timings.items() if ms <= target_ms]
+    return max(within) if within else min(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark bcrypt cost factors")
+    parser.add_argument("--target-ms", type=float, default=250, help="เวลาที่ยอมรับได้ต่อการ hash หนึ่งครั้ง (ms)")
+    parser.add_argument("--min-rounds", type=int, default=10)
+    parser.add_argument("--max-rounds", type=int, default=14)
+    args = parser.parse_args()
+
+    timings = benchmark_rounds(args.min_rounds, args.max_rounds)
+    for rounds, ms in timings.items():
+        print(f"  cost {rounds:2d}: {ms:8.1f} ms/hash  (~{1000 / ms * HASH_WORKERS:6.1f} hash/s with {HASH_WORKERS} workers)")
+
+    best = recommend_rounds(args.target_ms, timings)
+    print(f"✅ แนะนำ ARPG_BCRYPT_ROUNDS={best} (ปัจจุบัน {BCRYPT_ROUNDS})")
+
+if __name__ == "__main__":
+    main()
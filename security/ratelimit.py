@@ -2,20 +2,375 @@
 security/ratelimit.py
 =====================
 PRODUCTION - Rate Limiting Module
+
+Sliding-window counters: each (session, action) key keeps two counters
+(current and previous window), so a check is O(1) in time and memory.
+Keys are spread over lock stripes; idle keys expire after a TTL and each
+stripe is capped, so memory stays bounded however many sessions connect.
+
+Counters live in a pluggable backend:
+- MemoryBackend: per-process (one Streamlit worker)
+- SQLiteBackend: shared by every worker using the same database file
 """
 import streamlit as st
-from collections import defaultdict
+from collections import OrderedDict
 from typing import Dict, Tuple, Callable
+import json
+import math
+import os
+import sqlite3
 import threading
 import time
 from functools import wraps
+from pathlib import Path
+
+from database import DB_PATH
+
+STRIPES = 64
+MAX_KEYS = 100_000           # across all stripes; least recently seen keys go first
+SWEEP_INTERVAL = 30          # seconds between TTL sweeps of a stripe
+DEFAULT_TTL = 120            # idle seconds before a key is forgotten
+
+# Beside the item database (DB_PATH) unless ARPG_RATE_LIMIT_DB names another file
+RATE_LIMIT_DB = os.environ.get("ARPG_RATE_LIMIT_DB") or str(Path(DB_PATH).resolve().with_name("rate_limits.db"))
+SYNC_INTERVAL = 0.5          # seconds between flushes of local hits to the shared store
+SYNC_FRACTION = 0.1          # a key syncs at once after this share of its limit in local hits
+CLEANUP_INTERVAL = 60        # seconds between deletes of expired shared windows
+RETRY_AFTER = 30             # seconds before reconnecting to a store that failed to open
+
+# ----------------------------------------------------------------------
+# Window State
+# ----------------------------------------------------------------------
+class _Window:
+    """Counter state for one (session, action) key."""
+    __slots__ = ('start', 'current', 'previous', 'last_seen', 'index', 'period', 'pending')
+
+    def __init__(self, start: float):
+        self.start = start
+        self.current = 0
+        self.previous = 0
+        self.last_seen = start
+        self.index = 0       # shared backends: wall-clock window number
+        self.period = 0
+        self.pending = 0     # shared backends: hits not yet flushed
+
+class _Stripe:
+    __slots__ = ('lock', 'windows', 'last_sweep')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.windows: 'OrderedDict[Tuple[str, str], _Window]' = OrderedDict()
+        self.last_sweep = time.monotonic()
+
+def _admit(window: _Window, max_requests: int, per_seconds: int, now: float) -> Tuple[bool, int]:
+    """Weight the previous window by how much of it still overlaps, then count the hit."""
+    progress = (now - window.start) / per_seconds
+    estimate = window.previous * (1 - progress) + window.current
+    if estimate + 1 > max_requests:
+        return False, _wait_time(window, max_requests, per_seconds, now)
+    window.current += 1
+    return True, 0
+
+def _wait_time(window: _Window, max_requests: int, per_seconds: int, now: float) -> int:
+    """Seconds until the weighted estimate leaves room for one more request."""
+    room = max_requests - 1
+    if window.current <= room and window.previous:
+        # The previous window's share decays away inside this window
+        progress_needed = 1 - (room - window.current) / window.previous
+        ready_at = window.start + per_seconds * progress_needed
+    else:
+        # Next window: the current count becomes the decaying share
+        progress_needed = 1 - room / window.current if window.current else 0
+        ready_at = window.start + per_seconds * (1 + progress_needed)
+    return max(1, math.ceil(ready_at - now))
+
+# ----------------------------------------------------------------------
+# Backends
+# ----------------------------------------------------------------------
+class MemoryBackend:
+    """Per-process counters in striped LRU maps."""
+
+    def __init__(self, stripes: int = STRIPES, max_keys: int = MAX_KEYS, ttl: float = DEFAULT_TTL):
+        self._stripes = [_Stripe() for _ in range(stripes)]
+        self._max_keys_per_stripe = max(1, max_keys // stripes)
+        self._ttl = ttl
+        self._evict_lock = threading.Lock()
+        self.evicted = 0
+
+    def hit(self, key: Tuple[str, str], max_requests: int, per_seconds: int) -> Tuple[bool, int]:
+        stripe = self._stripe(key)
+        with stripe.lock:
+            now = time.monotonic()
+            window = self._entry(stripe, key, now)
+
+            # Roll the window forward; a gap of two windows clears both counters
+            elapsed_windows = int((now - window.start) // per_seconds)
+            if elapsed_windows:
+                window.previous = window.current if elapsed_windows == 1 else 0
+                window.current = 0
+                window.start += elapsed_windows * per_seconds
+
+            return _admit(window, max_requests, per_seconds, now)
+
+    def keys_tracked(self) -> int:
+        return sum(len(stripe.windows) for stripe in self._stripes)
+
+    def _stripe(self, key) -> _Stripe:
+        return self._stripes[hash(key) % len(self._stripes)]
+
+    def _entry(self, stripe: _Stripe, key, now: float, start: float = None):
+        """Find or create the key's window (caller holds the stripe lock)."""
+        if time.monotonic() - stripe.last_sweep >= SWEEP_INTERVAL:
+            self._sweep(stripe, now)
+
+        window = stripe.windows.get(key)
+        if window is None:
+            window = _Window(now if start is None else start)
+            stripe.windows[key] = window
+            self._enforce_cap(stripe)
+        else:
+            stripe.windows.move_to_end(key)
+        window.last_seen = now
+        return window
+
+    def _sweep(self, stripe: _Stripe, now: float):
+        """Drop idle keys from the LRU end of a stripe."""
+        stripe.last_sweep = time.monotonic()
+        cutoff = now - self._ttl
+        removed = 0
+        while stripe.windows:
+            key, window = next(iter(stripe.windows.items()))
+            if window.last_seen > cutoff:
+                break
+            del stripe.windows[key]
+            removed += 1
+        self._count_evicted(removed)
+
+    def _enforce_cap(self, stripe: _Stripe):
+        removed = 0
+        while len(stripe.windows) > self._max_keys_per_stripe:
+            stripe.windows.popitem(last=False)
+            removed += 1
+        self._count_evicted(removed)
+
+    def _count_evicted(self, removed: int):
+        if removed:
+            with self._evict_lock:
+                self.evicted += removed
+
+class _StoreUnavailable(sqlite3.OperationalError):
+    """Raised instead of reconnecting while a failed store is backing off."""
+
+class SQLiteBackend(MemoryBackend):
+    """
+    Counters shared through a SQLite file, so every worker enforces one limit.
 
+    Windows are aligned to wall-clock multiples of the period so all
+    processes agree on them. A check admits against the last snapshot of
+    the shared counts plus this process's unflushed hits, which keeps it
+    in memory; pending hits are flushed in one UPSERT batch (and fresh
+    counts read back) every SYNC_INTERVAL. A key whose local hits reach
+    SYNC_FRACTION of its limit syncs on its own straight away, so the
+    overshoot is at most that fraction per worker (strict limits such as
+    5/min sync on every hit). If the database is unavailable the local
+    counts keep limiting this process.
+    """
+
+    def __init__(self, path: str = RATE_LIMIT_DB, sync_interval: float = SYNC_INTERVAL, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self.sync_interval = sync_interval
+        self._conn = None
+        self._db_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._carry = []  # pending rows left behind by a rolled window
+        self._carry_lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._last_cleanup = 0.0
+        self._retry_at = 0.0
+        self.flushes = 0
+        self.errors = 0
+
+    @staticmethod
+    def _db_key(key: Tuple[str, str]) -> str:
+        return "\x1f".join(key)
+
+    def _connect(self):
+        if self._conn is None:
+            if time.monotonic() < self._retry_at:
+                raise _StoreUnavailable(self.path)
+            conn = sqlite3.connect(self.path, timeout=1, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = OFF")  # counters are disposable
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS rate_limit_counters (
+                    key TEXT NOT NULL,
+                    window INTEGER NOT NULL,
+                    count INTEGER NOT NULL,
+                    expires_at REAL NOT NULL,
+                    PRIMARY KEY (key, window)
+                ) WITHOUT ROWID
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_rate_limit_expires ON rate_limit_counters(expires_at)")
+            conn.commit()
+            self._conn = conn
+            self._retry_at = 0.0
+        return self._conn
+
+    def _read_counts(self, db_keys) -> Dict[Tuple[str, int], int]:
+        with self._db_lock:
+            rows = self._connect().execute(
+                "SELECT key, window, count FROM rate_limit_counters "
+                "WHERE key IN (SELECT value FROM json_each(?))",
+                (json.dumps(list(db_keys)),)
+            ).fetchall()
+        return {(key, window): count for key, window, count in rows}
+
+    def hit(self, key: Tuple[str, str], max_requests: int, per_seconds: int) -> Tuple[bool, int]:
+        stripe = self._stripe(key)
+        now = time.time()
+        index = int(now // per_seconds)
+
+        with stripe.lock:
+            window = stripe.windows.get(key)
+        if window is None:
+            # First sight of a key: seed it from what other workers counted
+            try:
+                counts = self._read_counts([self._db_key(key)])
+            except sqlite3.Error as e:
+                self._db_error(e)
+                counts = {}
+        else:
+            counts = None
+
+        with stripe.lock:
+            window = self._entry(stripe, key, now, start=index * per_seconds)
+            window.period = per_seconds
+            if counts is not None and window.index == 0:
+                db_key = self._db_key(key)
+                window.index = index
+                window.current = counts.get((db_key, index), 0)
+                window.previous = counts.get((db_key, index - 1), 0)
+
+            if index != window.index:
+                if window.pending:
+                    with self._carry_lock:
+                        self._carry.append(self._pending_row(key, window))
+                window.previous = window.current if index == window.index + 1 else 0
+                window.current = 0
+                window.pending = 0
+                window.index = index
+                window.start = index * per_seconds
+
+            allowed, wait_time = _admit(window, max_requests, per_seconds, now)
+            sync_row = None
+            if allowed:
+                window.pending += 1
+                if window.pending >= max(1, int(max_requests * SYNC_FRACTION)):
+                    sync_row = self._pending_row(key, window)
+                    window.pending = 0
+
+        if sync_row:
+            self._sync_key(stripe, key, window, sync_row)
+        elif time.monotonic() - self._last_flush >= self.sync_interval:
+            self.flush()
+        return allowed, wait_time
+
+    def _write(self, conn, rows):
+        conn.executemany("""
+            INSERT INTO rate_limit_counters (key, window, count, expires_at)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(key, window) DO UPDATE SET count = count + excluded.count
+        """, rows)
+
+    def _sync_key(self, stripe: _Stripe, key, window: _Window, row):
+        """Push one key's pending hits and adopt the shared count."""
+        try:
+            with self._db_lock:
+                conn = self._connect()
+                with conn:
+                    self._write(conn, [row])
+            counts = self._read_counts([row[0]])
+        except sqlite3.Error as e:
+            self._db_error(e)
+            return
+        self._adopt(stripe, row[0], window, counts)
+
+    def _adopt(self, stripe: _Stripe, db_key, window: _Window, counts):
+        # Hits taken meanwhile are still pending and stay on top
+        with stripe.lock:
+            shared = counts.get((db_key, window.index))
+            if shared is not None:
+                window.current = shared + window.pending
+                window.previous = counts.get((db_key, window.index - 1), window.previous)
+
+    def _pending_row(self, key, window: _Window):
+        # Shared windows are needed for two periods (current, then previous)
+        return (self._db_key(key), window.index, window.pending, (window.index + 2) * window.period)
+
+    def flush(self):
+        """Push pending hits in one transaction and refresh recently used keys."""
+        if not self._flush_lock.acquire(blocking=False):
+            return  # another thread is flushing
+        try:
+            started = time.monotonic()
+            since = time.time() - (started - self._last_flush)
+            self._last_flush = started
+
+            # 1. Take pending hits (stripe locks only)
+            with self._carry_lock:
+                rows, self._carry = self._carry, []
+            active = []
+            for stripe in self._stripes:
+                with stripe.lock:
+                    for key, window in stripe.windows.items():
+                        if window.last_seen < since:
+                            continue
+                        active.append((key, window))
+                        if window.pending:
+                            rows.append(self._pending_row(key, window))
+                            window.pending = 0
+
+            # 2. Write and read back (DB lock only)
+            try:
+                with self._db_lock:
+                    conn = self._connect()
+                    with conn:
+                        self._write(conn, rows)
+                        if started - self._last_cleanup >= CLEANUP_INTERVAL:
+                            self._last_cleanup = started
+                            conn.execute("DELETE FROM rate_limit_counters WHERE expires_at < ?", (time.time(),))
+                counts = self._read_counts({self._db_key(key) for key, _ in active})
+                self.flushes += 1
+            except sqlite3.Error as e:
+                self._db_error(e)
+                return
+
+            # 3. Adopt the shared counts (stripe locks only)
+            for key, window in active:
+                self._adopt(self._stripe(key), self._db_key(key), window, counts)
+        finally:
+            self._flush_lock.release()
+
+    def _db_error(self, error):
+        self.errors += 1
+        if isinstance(error, _StoreUnavailable):
+            return
+        if self._conn is None:
+            self._retry_at = time.monotonic() + RETRY_AFTER
+        print(f"Rate limit store error: {error}")
+
+# ----------------------------------------------------------------------
+# Rate Limiter
+# ----------------------------------------------------------------------
 class RateLimiter:
     """Rate limiter for public endpoints"""
 
-    def __init__(self):
-        self._limits: Dict[str, Dict[str, list]] = defaultdict(lambda: defaultdict(list))
-        self._lock = threading.Lock()
+    def __init__(self, backend=None):
+        self.backend = backend or MemoryBackend()
+        self._metrics_lock = threading.Lock()
+        self._allowed = 0
+        self._denied = 0
 
         self.LIMITS = {
             'public_search_items': (100, 60),
@@ -36,24 +391,25 @@ class RateLimiter:
             return True, 0
 
         max_requests, per_seconds = self.LIMITS[action]
+        allowed, wait_time = self.backend.hit((session_id, action), max_requests, per_seconds)
 
-        with self._lock:
-            now = time.time()
-            cutoff = now - per_seconds
-
-            self._limits[session_id][action] = [
-                t for t in self._limits[session_id][action] if t[0] > cutoff
-            ]
+        with self._metrics_lock:
+            if allowed:
+                self._allowed += 1
+            else:
+                self._denied += 1
+        return allowed, wait_time
 
-            current_count = len(self._limits[session_id][action])
-
-            if current_count >= max_requests:
-                oldest = self._limits[session_id][action][0][0]
-                wait_time = int(oldest + per_seconds - now)
-                return False, max(1, wait_time)
-
-            self._limits[session_id][action].append((now, current_count + 1))
-            return True, 0
+    def metrics(self) -> Dict[str, int]:
+        """Counters since start-up plus the number of keys currently tracked."""
+        with self._metrics_lock:
+            metrics = {'allowed': self._allowed, 'denied': self._denied}
+        metrics['keys_tracked'] = self.backend.keys_tracked()
+        metrics['evicted'] = self.backend.evicted
+        if isinstance(self.backend, SQLiteBackend):
+            metrics['flushes'] = self.backend.flushes
+            metrics['store_errors'] = self.backend.errors
+        return metrics
 
 def rate_limit(action: str = None):
     """Decorator for rate limiting"""
@@ -73,4 +429,5 @@ def rate_limit(action: str = None):
         return wrapper
     return decorator
 
-rate_limiter = RateLimiter()
\ No newline at end of file
+# Shared across Streamlit workers started from the same directory
+rate_limiter = RateLimiter(backend=SQLiteBackend(RATE_LIMIT_DB))
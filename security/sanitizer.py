@@ -4,34 +4,65 @@ security/sanitizer.py
 PRODUCTION - Input/Output Sanitization Module
 """
 import bleach
+import html
 import re
 from pathlib import Path
 import magic
 from PIL import Image
 import io
+from dataclasses import dataclass
 from typing import Tuple, Optional
 import secrets
 from datetime import datetime
 
+from image_jobs import FORMAT_EXTENSIONS
+
 class HTMLSanitizer:
     """Sanitize HTML input - ป้องกัน XSS"""
 
     ALLOWED_TAGS = ['b', 'i', 'u', 'em', 'strong', 'br', 'p', 'ul', 'ol', 'li', 'span']
     ALLOWED_ATTRIBUTES = {'span': ['style'], 'p': ['style']}
     ALLOWED_STYLES = ['color', 'font-weight', 'font-style', 'text-decoration']
+    EXCERPT_LENGTH = 120
+
+    _cleaners = {}
+    # Text without these characters parses to itself, so bleach can be skipped
+    _MARKUP_CHARS = re.compile(r'[<>&\r\x00-\x08\x0b\x0c\x0e-\x1f\x7f]')
+
+    @staticmethod
+    def _cleaner(strip) -> bleach.sanitizer.Cleaner:
+        """
+        Cleaners are built once; bleach 6 filters styles through a CSS sanitizer.
+        strip='text' gives the cleaner that removes every tag.
+        """
+        cleaner = HTMLSanitizer._cleaners.get(strip)
+        if cleaner is None:
+            try:
+                from bleach.css_sanitizer import CSSSanitizer
+                css_sanitizer = CSSSanitizer(allowed_css_properties=HTMLSanitizer.ALLOWED_STYLES)
+                attributes = HTMLSanitizer.ALLOWED_ATTRIBUTES
+            except ImportError:
+                # tinycss2 not installed: drop style attributes instead of failing
+                css_sanitizer = None
+                attributes = {}
+            cleaner = bleach.sanitizer.Cleaner(
+                tags=[] if strip == 'text' else HTMLSanitizer.ALLOWED_TAGS,
+                attributes=attributes,
+                css_sanitizer=css_sanitizer,
+                strip=bool(strip)
+            )
+            HTMLSanitizer._cleaners[strip] = cleaner
+        return cleaner
 
     @staticmethod
     def sanitize_html(text: str, strip: bool = True) -> str:
         if not text:
             return ""
 
-        cleaned = bleach.clean(
-            text,
-            tags=HTMLSanitizer.ALLOWED_TAGS,
-            attributes=HTMLSanitizer.ALLOWED_ATTRIBUTES,
-            styles=HTMLSanitizer.ALLOWED_STYLES,
-            strip=strip
-        )
+        if HTMLSanitizer._MARKUP_CHARS.search(text):
+            cleaned = HTMLSanitizer._cleaner(strip).clean(text)
+        else:
+            cleaned = text
 
         cleaned = re.sub(r'<script.*?>.*?</script>', '', cleaned, flags=re.DOTALL)
         cleaned = re.sub(r'on\w+="[^"]*"', '', cleaned)
@@ -40,6 +71,30 @@ class HTMLSanitizer:
 
         return cleaned.strip()
 
+    @staticmethod
+    def render_description(text: str) -> Tuple[str, str]:
+        """
+        Sanitized HTML and a plain-text excerpt for an item description.
+        Computed once when the item is written and stored beside it.
+        """
+        if not text:
+            return "", ""
+
+        description_html = HTMLSanitizer.sanitize_html(text, strip=False).replace('\n', '<br>\n')
+        plain = HTMLSanitizer.plain_text(text)
+        limit = HTMLSanitizer.EXCERPT_LENGTH
+        excerpt = plain[:limit] + ('...' if len(plain) > limit else '')
+        return description_html, excerpt
+
+    @staticmethod
+    def plain_text(text: str) -> str:
+        """Tags removed, entities decoded, whitespace collapsed (the untruncated excerpt)."""
+        if not text:
+            return ""
+        if HTMLSanitizer._MARKUP_CHARS.search(text):
+            text = html.unescape(HTMLSanitizer._cleaner('text').clean(text))
+        return ' '.join(text.split())
+
     @staticmethod
     def sanitize_filename(filename: str) -> str:
         if not filename:
@@ -54,43 +109,118 @@ class HTMLSanitizer:
 
         return filename or "unknown_file"
 
+class _MemoryReader(io.RawIOBase):
+    """Seekable read-only stream over a memoryview; lets PIL parse without copying."""
+
+    def __init__(self, view: memoryview):
+        self._view = view
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        n = max(0, min(len(buffer), len(self._view) - self._pos))
+        buffer[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        self._pos = max(0, offset)
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+@dataclass
+class ImageCheck:
+    """Result of FileValidator.inspect_image; carries the bytes on to processing."""
+    ok: bool
+    error: Optional[str] = None
+    data: Optional[memoryview] = None
+    mime_type: str = ""
+    format: str = ""
+    width: int = 0
+    height: int = 0
+
+    @property
+    def extension(self) -> str:
+        """Extension for the detected format, regardless of the uploaded name."""
+        return FORMAT_EXTENSIONS.get(self.format, '')
+
+    def open(self) -> Image.Image:
+        """Lazy PIL image over the same buffer; pixels decode on first .load()."""
+        return Image.open(_MemoryReader(self.data))
+
 class FileValidator:
     """Validate uploaded files - ป้องกัน RCE"""
 
     ALLOWED_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif'}
     ALLOWED_MIME_TYPES = {'image/png', 'image/jpeg', 'image/jpg', 'image/gif'}
+    ALLOWED_FORMATS = {'PNG', 'JPEG', 'GIF'}
     MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB
     MAX_DIMENSION = 3000
+    MAX_PIXELS = 8_000_000  # decompression-bomb guard: ~32MB once decoded to RGBA
+    SNIFF_BYTES = 2048
 
     @staticmethod
-    def validate_image(uploaded_file) -> Tuple[bool, Optional[str]]:
+    def inspect_image(uploaded_file) -> ImageCheck:
+        """
+        Validate from a single memoryview: size from metadata, one header sniff,
+        dimensions from the image header. Nothing is decoded here; truncated
+        pixel data fails at img.load() in image_jobs.process_image.
+        """
         if not uploaded_file:
-            return True, None
+            return ImageCheck(ok=False, error="ไม่พบไฟล์")
 
-        try:
-            file_size = len(uploaded_file.getvalue())
-            if file_size > FileValidator.MAX_FILE_SIZE:
-                return False, f"ไฟล์มีขนาดใหญ่เกินไป (สูงสุด {FileValidator.MAX_FILE_SIZE//1024//1024}MB)"
+        file_size = getattr(uploaded_file, 'size', None)
+        if file_size is not None and file_size > FileValidator.MAX_FILE_SIZE:
+            return ImageCheck(ok=False, error=f"ไฟล์มีขนาดใหญ่เกินไป (สูงสุด {FileValidator.MAX_FILE_SIZE//1024//1024}MB)")
 
-            file_bytes = uploaded_file.getvalue()
-            mime_type = magic.from_buffer(file_bytes[:2048], mime=True)
+        try:
+            data = uploaded_file.getbuffer() if hasattr(uploaded_file, 'getbuffer') else memoryview(uploaded_file)
+            if data.nbytes > FileValidator.MAX_FILE_SIZE:
+                return ImageCheck(ok=False, error=f"ไฟล์มีขนาดใหญ่เกินไป (สูงสุด {FileValidator.MAX_FILE_SIZE//1024//1024}MB)")
 
+            mime_type = magic.from_buffer(bytes(data[:FileValidator.SNIFF_BYTES]), mime=True)
             if mime_type not in FileValidator.ALLOWED_MIME_TYPES:
-                return False, "ไฟล์ไม่ใช่รูปภาพที่รองรับ (PNG, JPG, JPEG, GIF)"
+                return ImageCheck(ok=False, error="ไฟล์ไม่ใช่รูปภาพที่รองรับ (PNG, JPG, JPEG, GIF)")
+
+            check = ImageCheck(ok=True, data=data, mime_type=mime_type)
+            img = check.open()
+            check.format = img.format or ""
+            check.width, check.height = img.size
+            img.close()
+        except Image.DecompressionBombError:
+            return ImageCheck(ok=False, error="รูปภาพมีจำนวนพิกเซลมากเกินไป")
+        except Exception as e:
+            return ImageCheck(ok=False, error=f"ไฟล์รูปภาพเสียหาย: {str(e)}")
+
+        if check.format not in FileValidator.ALLOWED_FORMATS:
+            return ImageCheck(ok=False, error="ไฟล์ไม่ใช่รูปภาพที่รองรับ (PNG, JPG, JPEG, GIF)")
 
-            img = Image.open(io.BytesIO(file_bytes))
-            img.verify()
+        if check.width > FileValidator.MAX_DIMENSION or check.height > FileValidator.MAX_DIMENSION:
+            return ImageCheck(ok=False, error=f"รูปภาพมีขนาดใหญ่เกินไป (สูงสุด {FileValidator.MAX_DIMENSION}x{FileValidator.MAX_DIMENSION}px)")
 
-            img = Image.open(io.BytesIO(file_bytes))
-            width, height = img.size
+        if check.width * check.height > FileValidator.MAX_PIXELS:
+            return ImageCheck(ok=False, error="รูปภาพมีจำนวนพิกเซลมากเกินไป")
 
-            if width > FileValidator.MAX_DIMENSION or height > FileValidator.MAX_DIMENSION:
-                return False, f"รูปภาพมีขนาดใหญ่เกินไป (สูงสุด {FileValidator.MAX_DIMENSION}x{FileValidator.MAX_DIMENSION}px)"
+        return check
 
+    @staticmethod
+    def validate_image(uploaded_file) -> Tuple[bool, Optional[str]]:
+        if not uploaded_file:
             return True, None
 
-        except Exception as e:
-            return False, f"ไฟล์รูปภาพเสียหาย: {str(e)}"
+        check = FileValidator.inspect_image(uploaded_file)
+        return check.ok, check.error
 
     @staticmethod
     def get_safe_filename(original_filename: str) -> str:
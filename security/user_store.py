@@ -0,0 +1,353 @@
+"""
+security/user_store.py
+======================
+PRODUCTION - User Accounts in SQLite
+
+Accounts live in the `users` table of the app database, so every worker
+process reads the same data and each change is one small transaction
+instead of a rewrite of auth_config.yaml. The YAML file keeps only the
+cookie settings; its old credentials block is imported once.
+"""
+import json
+import shutil
+import sqlite3
+import threading
+from collections.abc import MutableMapping
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, Dict, Any, List
+
+import yaml
+from yaml.loader import SafeLoader
+
+import audit
+from database import init_database, get_db_connection, execute_query
+
+_PUBLIC_COLUMNS = "username, email, name, role, force_password_change, created_at, created_by, updated_at"
+# Fields streamlit-authenticator changes on a credentials entry; written through
+_WRITABLE_FIELDS = ('password', 'name', 'email', 'failed_login_attempts')
+
+def normalize_username(username: str) -> str:
+    """streamlit-authenticator lower-cases usernames at login, so they are stored that way."""
+    return (username or '').strip().lower()
+
+def _now() -> str:
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+def _user_dict(row) -> Optional[Dict[str, Any]]:
+    if row is None:
+        return None
+    user = dict(row)
+    if 'force_password_change' in user:
+        user['force_password_change'] = bool(user['force_password_change'])
+    return user
+
+# ----------------------------------------------------------------------
+# User Store
+# ----------------------------------------------------------------------
+class UserStore:
+    """User accounts with indexed lookups and transactional writes"""
+
+    def __init__(self):
+        init_database()
+
+    # ===== Lookups =====
+    def get_user(self, username: str, with_password: bool = False) -> Optional[Dict[str, Any]]:
+        columns = f"{_PUBLIC_COLUMNS}, password, failed_login_attempts" if with_password else _PUBLIC_COLUMNS
+        row = execute_query(
+            f"SELECT {columns} FROM users WHERE username = ?",
+            (normalize_username(username),),
+            fetch_one=True
+        )
+        return _user_dict(row)
+
+    def user_exists(self, username: str) -> bool:
+        row = execute_query("SELECT 1 FROM users WHERE username = ?", (normalize_username(username),), fetch_one=True)
+        return row is not None
+
+    def find_existing_usernames(self, usernames: List[str]) -> set:
+        """Normalized usernames from `usernames` that are already taken (one query)."""
+        if not usernames:
+            return set()
+        rows = execute_query(
+            "SELECT username FROM users WHERE username IN (SELECT value FROM json_each(?))",
+            (json.dumps([normalize_username(username) for username in usernames]),)
+        )
+        return {row['username'] for row in rows}
+
+    def find_by_email(self, email: str) -> Optional[Dict[str, Any]]:
+        row = execute_query(
+            f"SELECT {_PUBLIC_COLUMNS} FROM users WHERE email = ? COLLATE NOCASE",
+            ((email or '').strip(),),
+            fetch_one=True
+        )
+        return _user_dict(row)
+
+    def list_users(self, limit: Optional[int] = None, offset: int = 0,
+                   search: Optional[str] = None) -> List[Dict[str, Any]]:
+        """One page of users ordered by username (passwords never included)."""
+        query = f"SELECT {_PUBLIC_COLUMNS} FROM users"
+        params = []
+        if search:
+            query += " WHERE username LIKE ? OR name LIKE ? OR email LIKE ?"
+            params.extend([f"%{search.strip()}%"] * 3)
+        query += " ORDER BY username"
+        if limit is not None:
+            query += " LIMIT ? OFFSET ?"
+            params.extend([int(limit), int(offset)])
+        return [_user_dict(row) for row in execute_query(query, params)]
+
+    def count_users(self, search: Optional[str] = None) -> int:
+        query = "SELECT COUNT(*) as c FROM users"
+        params = []
+        if search:
+            query += " WHERE username LIKE ? OR name LIKE ? OR email LIKE ?"
+            params.extend([f"%{search.strip()}%"] * 3)
+        return execute_query(query, params, fetch_one=True)['c']
+
+    def count_by_role(self) -> Dict[str, int]:
+        rows = execute_query("SELECT role, COUNT(*) as c FROM users GROUP BY role")
+        counts = {'admin': 0, 'viewer': 0}
+        counts.update({row['role']: row['c'] for row in rows})
+        return counts
+
+    def list_usernames(self) -> List[str]:
+        return [row['username'] for row in execute_query("SELECT username FROM users ORDER BY username")]
+
+    def _all_users_with_passwords(self) -> List[Dict[str, Any]]:
+        """Every account with its hash in one query; only for the authenticator's full scans."""
+        return [_user_dict(row) for row in execute_query(
+            f"SELECT {_PUBLIC_COLUMNS}, password, failed_login_attempts FROM users ORDER BY username"
+        )]
+
+    # ===== Writes =====
+    def create_user(self, username: str, password_hash: str, email: str, name: str,
+                    role: str = 'viewer', created_by: str = 'system',
+                    force_password_change: bool = False) -> int:
+        """Insert one user; raises ValueError if the username is taken."""
+        return self.create_users([{
+            'username': username, 'password': password_hash, 'email': email, 'name': name,
+            'role': role, 'created_by': created_by, 'force_password_change': force_password_change
+        }])
+
+    def create_users(self, users: List[Dict[str, Any]]) -> int:
+        """Insert users (hashed passwords) in one transaction; all or nothing."""
+        now = _now()
+        rows = [(
+            normalize_username(user['username']),
+            (user.get('email') or '').strip(),
+            (user.get('name') or '').strip(),
+            user['password'],
+            user.get('role') or 'viewer',
+            int(bool(user.get('force_password_change'))),
+            user.get('created_at') or now,
+            user.get('created_by') or 'system',
+        ) for user in users]
+
+        try:
+            with get_db_connection() as conn:
+                conn.executemany("""
+                    INSERT INTO users (username, email, name, password, role,
+                                       force_password_change, created_at, created_by)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """, rows)
+        except sqlite3.IntegrityError as e:
+            if "UNIQUE constraint failed" in str(e):
+                raise ValueError("ชื่อผู้ใช้นี้มีอยู่แล้ว") from e
+            raise ValueError(f"ข้อมูลผู้ใช้ไม่ถูกต้อง: {e}") from e
+        except sqlite3.Error as e:
+            raise RuntimeError(f"Database error: {e}") from e
+
+        if len(rows) == 1:
+            audit.record('user.create', 'user', rows[0][0], {'role': rows[0][4]})
+        else:
+            audit.record('user.bulk_create', 'user', None, {
+                'count': len(rows), 'admins': sum(1 for row in rows if row[4] == 'admin')
+            })
+        return len(rows)
+
+    def update_user(self, username: str, **fields) -> bool:
+        """Update columns of one user; returns False if the user does not exist."""
+        allowed = {'email', 'name', 'password', 'role', 'force_password_change', 'failed_login_attempts'}
+        unknown = set(fields) - allowed
+        if unknown:
+            raise ValueError(f"ไม่รองรับฟิลด์: {', '.join(sorted(unknown))}")
+        if not fields:
+            return self.user_exists(username)
+
+        if 'force_password_change' in fields:
+            fields['force_password_change'] = int(bool(fields['force_password_change']))
+        assignments = ", ".join(f"{field} = ?" for field in fields)
+        with get_db_connection() as conn:
+            cursor = conn.execute(
+                f"UPDATE users SET {assignments}, updated_at = ? WHERE username = ?",
+                (*fields.values(), _now(), normalize_username(username))
+            )
+            updated = cursor.rowcount > 0
+
+        # Failed-login counters change on every bad attempt; they are not account edits
+        changed = sorted(field for field in fields if field != 'failed_login_attempts')
+        if updated and changed:
+            if 'password' in fields:
+                audit.record('user.password', 'user', normalize_username(username),
+                             {'force_password_change': bool(fields.get('force_password_change'))})
+            else:
+                audit.record('user.update', 'user', normalize_username(username), {'fields': changed})
+        return updated
+
+    def set_password(self, username: str, password_hash: str, force_password_change: bool = False) -> bool:
+        return self.update_user(username, password=password_hash,
+                                force_password_change=force_password_change, failed_login_attempts=0)
+
+    def delete_user(self, username: str) -> bool:
+        with get_db_connection() as conn:
+            cursor = conn.execute("DELETE FROM users WHERE username = ?", (normalize_username(username),))
+            deleted = cursor.rowcount > 0
+        if deleted:
+            audit.record('user.delete', 'user', normalize_username(username))
+        return deleted
+
+    # ===== YAML Migration =====
+    def migrate_from_yaml(self, config_path: Path) -> int:
+        """
+        Import the credentials block of an auth_config.yaml once, then
+        rewrite the file without it (a .yaml.backup copy is kept).
+        Returns the number of users imported.
+        """
+        config_path = Path(config_path)
+        if not config_path.exists():
+            return 0
+
+        with open(config_path, 'r', encoding='utf-8') as file:
+            config = yaml.load(file, Loader=SafeLoader) or {}
+
+        usernames = (config.get('credentials') or {}).get('usernames') or {}
+        if not usernames:
+            return 0
+
+        users = [{
+            'username': username,
+            'email': str(data.get('email', '')),
+            'name': str(data.get('name', '')),
+            'password': data['password'],
+            'role': data.get('role', 'viewer'),
+            'force_password_change': data.get('force_password_change', False),
+            'created_at': str(data.get('created_at') or '') or None,
+            'created_by': data.get('created_by', 'system'),
+        } for username, data in usernames.items() if data.get('password')]
+
+        now = _now()
+        with get_db_connection() as conn:
+            # Existing rows win, so re-running after a partial migration is safe
+            conn.executemany("""
+                INSERT INTO users (username, email, name, password, role,
+                                   force_password_change, created_at, created_by)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(username) DO NOTHING
+            """, [(
+                normalize_username(user['username']), user['email'], user['name'], user['password'],
+                user['role'] if user['role'] in ('admin', 'viewer') else 'viewer',
+                int(bool(user['force_password_change'])), user['created_at'] or now, user['created_by']
+            ) for user in users])
+        audit.record('user.import_yaml', 'user', None, {'count': len(users), 'source': str(config_path)},
+                     actor='system')
+
+        shutil.copy(config_path, config_path.with_suffix('.yaml.backup'))
+        config.pop('credentials', None)
+        tmp_path = config_path.with_suffix('.yaml.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            yaml.dump(config, file, allow_unicode=True)
+        tmp_path.replace(config_path)
+
+        print(f"✅ Migrated {len(users)} users from {config_path} to the database")
+        return len(users)
+
+    # ===== streamlit-authenticator =====
+    def credentials(self) -> 'CredentialsAdapter':
+        return CredentialsAdapter(self)
+
+# ----------------------------------------------------------------------
+# streamlit-authenticator Compatibility
+# ----------------------------------------------------------------------
+class _UserEntry(dict):
+    """One credentials entry; changes to persisted fields are written to the store."""
+
+    def __init__(self, store: UserStore, username: str, data: Dict[str, Any]):
+        super().__init__(data)
+        self._store = store
+        self._username = username
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        if key in _WRITABLE_FIELDS:
+            self._store.update_user(self._username, **{key: value})
+
+class _UsernamesView(MutableMapping):
+    """credentials['usernames'] backed by indexed queries instead of a parsed file."""
+
+    def __init__(self, store: UserStore):
+        self._store = store
+
+    def __getitem__(self, username):
+        user = self._store.get_user(username, with_password=True)
+        if user is None:
+            raise KeyError(username)
+        return _UserEntry(self._store, user['username'], user)
+
+    def __contains__(self, username):
+        return isinstance(username, str) and self._store.user_exists(username)
+
+    def __setitem__(self, username, data):
+        data = dict(data)
+        if self._store.user_exists(username):
+            self._store.update_user(username, **{k: data[k] for k in _WRITABLE_FIELDS if k in data})
+        else:
+            self._store.create_user(username, data['password'], data.get('email', ''),
+                                    data.get('name', ''), data.get('role', 'viewer'))
+
+    def __delitem__(self, username):
+        if not self._store.delete_user(username):
+            raise KeyError(username)
+
+    def __iter__(self):
+        return iter(self._store.list_usernames())
+
+    def __len__(self):
+        return self._store.count_users()
+
+    # stauth scans the whole mapping (the lower-casing copy on each new
+    # session, value lookups); the Mapping defaults would run one
+    # get_user() query per account, so these read every user at once
+    def items(self):
+        return [(user['username'], _UserEntry(self._store, user['username'], user))
+                for user in self._store._all_users_with_passwords()]
+
+    def values(self):
+        return [entry for _, entry in self.items()]
+
+class CredentialsAdapter(dict):
+    """
+    The credentials dict stauth.Authenticate expects, reading live from the
+    store. stauth rebuilds 'usernames' once with lower-cased keys; the store
+    already holds them lower-cased, so that reassignment is ignored.
+    """
+
+    def __init__(self, store: UserStore):
+        super().__init__(usernames=_UsernamesView(store))
+
+    def __setitem__(self, key, value):
+        if key == 'usernames':
+            return
+        super().__setitem__(key, value)
+
+_user_store = None
+_user_store_lock = threading.Lock()
+
+def get_user_store() -> UserStore:
+    """The shared store, created on first use so importing security.* does no database I/O."""
+    global _user_store
+    if _user_store is None:
+        with _user_store_lock:
+            if _user_store is None:
+                _user_store = UserStore()
+    return _user_store
@@ -2,9 +2,25 @@
 updater.py
 ==========
 Auto Update System - Check for updates from GitHub
+
+Delta updates: the publisher runs `python updater.py publish <dir> --version X`
+and uploads <dir>. It holds update_manifest.json (sha256 and size of every
+image, plus the database split into fixed-size chunks), the images under
+their own paths and the database chunks under db_chunks/<sha256>. Clients
+download only files and chunks whose hashes differ from their local copy,
+so an update costs about as much as the change, not the catalog.
+Without a manifest the full item_wiki_db.zip is used as before.
 """
+import argparse
+import hashlib
+import json
 import os
+import sqlite3
+import time
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import quote
 import requests
 import streamlit as st
 from pathlib import Path
@@ -13,16 +29,294 @@ import tempfile
 import subprocess
 import sys
 
+BACKUP_PAGES_PER_STEP = 1024   # pages copied per backup step (4 MB at the default page size)
+BACKUP_STEP_PAUSE = 0.005      # seconds between steps so app queries get the disk and the GIL
+DB_BUSY_TIMEOUT = 30
+
+MANIFEST_FILE = "update_manifest.json"
+DB_CHUNK_SIZE = 256 * 1024     # database delta granularity
+DB_CHUNK_DIR = "db_chunks"
+PUBLISHED_DIRS = ("assets/images",)
+DOWNLOAD_WORKERS = 4
+HASH_CACHE_FILE = ".update_hashes.json"
+
+# ----------------------------------------------------------------------
+# Online Database Backup / Restore (sqlite3 backup API)
+# ----------------------------------------------------------------------
+def verify_database(db_path):
+    """PRAGMA quick_check on a database file; returns (ok, message)."""
+    try:
+        conn = sqlite3.connect(f"file:{Path(db_path).as_posix()}?mode=ro", uri=True, timeout=DB_BUSY_TIMEOUT)
+        try:
+            rows = conn.execute("PRAGMA quick_check").fetchall()
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        return False, str(e)
+    messages = [row[0] for row in rows]
+    return messages == ["ok"], "; ".join(messages[:5])
+
+def _step_callback(progress, pause):
+    def on_step(status, remaining, total):
+        if progress:
+            progress(total - remaining, total)
+        if pause:
+            time.sleep(pause)
+    return on_step
+
+def backup_database(source_path, target_path, pages=BACKUP_PAGES_PER_STEP, pause=BACKUP_STEP_PAUSE,
+                    progress=None):
+    """
+    Consistent copy of a live WAL-mode database, including pages still in
+    the -wal file. Copies `pages` pages per step with a short pause between
+    steps, holds one read snapshot for the whole run (so concurrent writes
+    neither block nor restart it), verifies the copy with quick_check and
+    only then moves it into place.
+    """
+    target_path = Path(target_path)
+    target_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = target_path.with_name(f".{target_path.name}.tmp")
+    if tmp_path.exists():
+        tmp_path.unlink()
+
+    source = sqlite3.connect(source_path, timeout=DB_BUSY_TIMEOUT)
+    target = sqlite3.connect(tmp_path)
+    try:
+        # Pin a snapshot: later commits by the app are not part of this backup
+        source.execute("BEGIN")
+        source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+        source.backup(target, pages=pages, progress=_step_callback(progress, pause))
+        source.rollback()
+        # The copy is a standalone file; don't leave it needing a -wal
+        target.execute("PRAGMA journal_mode = DELETE")
+    finally:
+        target.close()
+        source.close()
+
+    ok, message = verify_database(tmp_path)
+    if not ok:
+        tmp_path.unlink(missing_ok=True)
+        raise RuntimeError(f"Backup failed quick_check: {message}")
+    os.replace(tmp_path, target_path)
+    return target_path
+
+def restore_database(backup_path, target_path, pages=BACKUP_PAGES_PER_STEP, pause=BACKUP_STEP_PAUSE,
+                     progress=None):
+    """
+    Replace the contents of a live database with a backup. The backup is
+    quick_checked first, then copied in through the backup API: SQLite
+    commits the destination in one transaction at the last step, so open
+    connections see either the old or the new database, never a file
+    swapped underneath them or a half-written one.
+
+    The restored data_version is then raised above both the old and the
+    restored counter (a backup may carry a version the live caches have
+    already seen for different data) and the Streamlit caches are cleared.
+    """
+    ok, message = verify_database(backup_path)
+    if not ok:
+        raise ValueError(f"ไฟล์ฐานข้อมูลเสียหาย (quick_check): {message}")
+
+    source = sqlite3.connect(f"file:{Path(backup_path).as_posix()}?mode=ro", uri=True, timeout=DB_BUSY_TIMEOUT)
+    target = sqlite3.connect(target_path, timeout=DB_BUSY_TIMEOUT)
+    try:
+        live_version = _read_data_version(target)
+        source.backup(target, pages=pages, progress=_step_callback(progress, pause))
+        target.execute("PRAGMA journal_mode = WAL")
+        _bump_data_version(target, live_version)
+        target.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        target.close()
+        source.close()
+
+    st.cache_data.clear()
+    st.cache_resource.clear()
+
+def _read_data_version(conn):
+    """Catalog data_version of a database, 0 if it predates the table."""
+    try:
+        row = conn.execute("SELECT version FROM data_version WHERE id = 1").fetchone()
+    except sqlite3.OperationalError:
+        return 0
+    return row[0] if row else 0
+
+def _bump_data_version(conn, live_version):
+    """Move data_version past max(live, restored) so no reader keeps stale cached results."""
+    version = max(live_version, _read_data_version(conn)) + 1
+    try:
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO data_version (id, version) VALUES (1, ?)", (version,))
+    except sqlite3.OperationalError:
+        pass  # pre-v3 backup: init_database creates the table on next start
+
+
+# ----------------------------------------------------------------------
+# Delta Updates (manifest of hashes)
+# ----------------------------------------------------------------------
+def _sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _iter_chunks(path, chunk_size):
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            yield chunk
+
+def _published_files(root):
+    """Relative posix paths of the files clients receive (hidden dirs such as .quarantine skipped)."""
+    root = Path(root)
+    for directory in PUBLISHED_DIRS:
+        base = root / directory
+        if not base.exists():
+            continue
+        for path in sorted(base.rglob("*")):
+            rel = path.relative_to(root)
+            if path.is_file() and not any(part.startswith('.') for part in rel.parts):
+                yield rel.as_posix()
+
+def publish_update(app_path, out_dir, version, chunk_size=DB_CHUNK_SIZE):
+    """
+    Write an update for clients into out_dir: files under their relative
+    paths, the database as content-addressed chunks, and the manifest last
+    (so a half-finished publish is never picked up). Re-publishing into
+    the same directory only writes what changed.
+    """
+    app_path, out_dir = Path(app_path), Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    manifest = {
+        'version': version,
+        'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'files': {},
+    }
+
+    for rel in _published_files(app_path):
+        source = app_path / rel
+        entry = {'sha256': _sha256_file(source), 'size': source.stat().st_size}
+        manifest['files'][rel] = entry
+        target = out_dir / rel
+        if not (target.exists() and target.stat().st_size == entry['size'] and _sha256_file(target) == entry['sha256']):
+            target.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(source, target)
+
+    db_path = app_path / "item_wiki.db"
+    if db_path.exists():
+        # A consistent standalone snapshot, so chunk boundaries match what clients rebuild
+        snapshot = out_dir / "item_wiki.db"
+        backup_database(db_path, snapshot)
+        chunk_dir = out_dir / DB_CHUNK_DIR
+        chunk_dir.mkdir(exist_ok=True)
+        chunks = []
+        for chunk in _iter_chunks(snapshot, chunk_size):
+            digest = hashlib.sha256(chunk).hexdigest()
+            chunks.append(digest)
+            chunk_path = chunk_dir / digest
+            if not chunk_path.exists():
+                chunk_path.write_bytes(chunk)
+        manifest['database'] = {
+            'sha256': _sha256_file(snapshot),
+            'size': snapshot.stat().st_size,
+            'chunk_size': chunk_size,
+            'chunks': chunks,
+        }
+
+    tmp_path = out_dir / f".{MANIFEST_FILE}.tmp"
+    tmp_path.write_text(json.dumps(manifest, indent=1), encoding='utf-8')
+    os.replace(tmp_path, out_dir / MANIFEST_FILE)
+    (out_dir / "latest_version.txt").write_text(version, encoding='utf-8')
+    return manifest
+
+class DeltaDownloader:
+    """Fetch and verify manifest entries; counts what actually crossed the network."""
+
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url if base_url.endswith('/') else base_url + '/'
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.downloaded_bytes = 0
+
+    def url(self, rel):
+        return self.base_url + quote(rel)
+
+    def fetch_manifest(self):
+        response = self.session.get(self.url(MANIFEST_FILE), timeout=self.timeout)
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.json()
+
+    def fetch_bytes(self, rel, sha256, size):
+        """Small object (database chunk) into memory, verified."""
+        response = self.session.get(self.url(rel), timeout=self.timeout)
+        response.raise_for_status()
+        data = response.content
+        self.downloaded_bytes += len(data)
+        if len(data) != size or hashlib.sha256(data).hexdigest() != sha256:
+            raise ValueError(f"ไฟล์อัปเดตไม่ตรงกับ manifest: {rel}")
+        return data
+
+    def download_file(self, rel, target, sha256, size):
+        """Stream to a temp file next to target, verify, then move into place."""
+        target = Path(target)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = target.with_name(f".{target.name}.{os.getpid()}.part")
+        digest = hashlib.sha256()
+        received = 0
+        try:
+            with self.session.get(self.url(rel), stream=True, timeout=self.timeout) as response:
+                response.raise_for_status()
+                with open(tmp_path, 'wb') as f:
+                    for block in response.iter_content(chunk_size=65536):
+                        digest.update(block)
+                        received += len(block)
+                        f.write(block)
+            self.downloaded_bytes += received
+            if received != size or digest.hexdigest() != sha256:
+                raise ValueError(f"ไฟล์อัปเดตไม่ตรงกับ manifest: {rel}")
+            os.replace(tmp_path, target)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+class LocalHashCache:
+    """sha256 of local files keyed by (size, mtime), so unchanged files are not re-read every update."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        try:
+            self._entries = json.loads(self.path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            self._entries = {}
+
+    def sha256(self, rel, file_path):
+        stat = file_path.stat()
+        cached = self._entries.get(rel)
+        if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+            return cached[2]
+        digest = _sha256_file(file_path)
+        self._entries[rel] = [stat.st_size, stat.st_mtime_ns, digest]
+        return digest
+
+    def save(self):
+        tmp_path = self.path.with_name(f"{self.path.name}.tmp")
+        tmp_path.write_text(json.dumps(self._entries), encoding='utf-8')
+        os.replace(tmp_path, self.path)
+
 
 class AutoUpdater:
     """จัดการระบบ Auto Update"""
 
-    def __init__(self):
+    def __init__(self, update_base=None):
         self.github_base = "https://raw.githubusercontent.com/icethanakornz/ARPG-Item-Wiki/main/"
         self.github_repo = "https://github.com/icethanakornz/ARPG-Item-Wiki/raw/main/"
         self.version_file = "latest_version.txt"
         self.notes_file = "update_notes.txt"
         self.db_zip = "item_wiki_db.zip"
+        # Where publish_update() output is served (manifest, files, db_chunks/)
+        self.update_base = update_base or self.github_base
+        self.last_update_stats = None
 
         # โฟลเดอร์ปัจจุบัน
         self.app_path = Path(__file__).parent.absolute()
@@ -62,6 +356,20 @@ class AutoUpdater:
         return {'has_update': False}
 
     def download_and_update(self):
+        """ดาวน์โหลดเฉพาะส่วนที่เปลี่ยนตาม manifest (ถ้าไม่มี manifest ใช้ zip แบบเดิม)"""
+        try:
+            downloader = DeltaDownloader(self.update_base)
+            manifest = downloader.fetch_manifest()
+            if manifest is not None:
+                self.last_update_stats = self.apply_manifest(manifest, downloader)
+                return True
+        except Exception as e:
+            st.error(f"อัปเดตล้มเหลว: {e}")
+            return False
+
+        return self.download_full_update()
+
+    def download_full_update(self):
         """ดาวน์โหลด zip และอัปเดตไฟล์"""
         try:
             # ดาวน์โหลด zip
@@ -100,27 +408,135 @@ class AutoUpdater:
             st.error(f"อัปเดตล้มเหลว: {e}")
             return False
 
-    def backup_current_files(self):
+    def apply_manifest(self, manifest, downloader, progress=None):
+        """
+        Bring files and the database in line with a published manifest,
+        downloading only entries whose hash differs from the local copy.
+        Returns counts of what was fetched versus what was already current.
+        """
+        start = time.perf_counter()
+        stats = {
+            'files_downloaded': 0, 'files_current': 0,
+            'chunks_downloaded': 0, 'chunks_current': 0,
+            'catalog_bytes': sum(entry['size'] for entry in manifest.get('files', {}).values()),
+        }
+
+        # ===== Files =====
+        hash_cache = LocalHashCache(self.app_path / HASH_CACHE_FILE)
+        stale = []
+        for rel, entry in manifest.get('files', {}).items():
+            target = self.app_path / rel
+            # Manifest paths are relative; never write outside the app folder
+            if Path(rel).is_absolute() or '..' in Path(rel).parts:
+                raise ValueError(f"path ไม่ถูกต้องใน manifest: {rel}")
+            if (target.exists() and target.stat().st_size == entry['size']
+                    and hash_cache.sha256(rel, target) == entry['sha256']):
+                stats['files_current'] += 1
+            else:
+                stale.append((rel, entry))
+
+        with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as pool:
+            futures = [pool.submit(downloader.download_file, rel, self.app_path / rel, entry['sha256'], entry['size'])
+                       for rel, entry in stale]
+            for done, future in enumerate(futures, 1):
+                future.result()
+                if progress:
+                    progress(done, len(futures))
+        for rel, entry in stale:
+            hash_cache.sha256(rel, self.app_path / rel)
+        stats['files_downloaded'] = len(stale)
+        hash_cache.save()
+
+        # ===== Database =====
+        database = manifest.get('database')
+        if database:
+            stats['catalog_bytes'] += database['size']
+            self._apply_database_chunks(database, downloader, stats, progress)
+
+        version = manifest.get('version')
+        if version:
+            with open(self.app_path / "version.txt", 'w') as f:
+                f.write(version)
+            self.current_version = version
+
+        stats['downloaded_bytes'] = downloader.downloaded_bytes
+        stats['elapsed'] = time.perf_counter() - start
+        return stats
+
+    def _apply_database_chunks(self, database, downloader, stats, progress=None):
+        """
+        Rebuild the published database from the local backup snapshot plus
+        the chunks whose hash differs, then swap it in with restore_database.
+        """
+        chunk_size = database['chunk_size']
+        self.backup_current_files()
+        snapshot = self.app_path / "backup" / "item_wiki.db.bak"
+        staging = self.app_path / "backup" / "item_wiki.db.update"
+
+        if snapshot.exists():
+            shutil.copyfile(snapshot, staging)
+            local_chunks = [hashlib.sha256(chunk).hexdigest() for chunk in _iter_chunks(staging, chunk_size)]
+        else:
+            staging.write_bytes(b"")
+            local_chunks = []
+
+        try:
+            wanted = [(index, digest) for index, digest in enumerate(database['chunks'])
+                      if index >= len(local_chunks) or local_chunks[index] != digest]
+            stats['chunks_current'] = len(database['chunks']) - len(wanted)
+            stats['chunks_downloaded'] = len(wanted)
+            if not wanted and len(local_chunks) == len(database['chunks']):
+                return
+
+            last = len(database['chunks']) - 1
+            def fetch(item):
+                index, digest = item
+                size = database['size'] - chunk_size * last if index == last else chunk_size
+                return index, downloader.fetch_bytes(f"{DB_CHUNK_DIR}/{digest}", digest, size)
+
+            with open(staging, 'r+b') as f, ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as pool:
+                for done, (index, data) in enumerate(pool.map(fetch, wanted), 1):
+                    f.seek(index * chunk_size)
+                    f.write(data)
+                    if progress:
+                        progress(done, len(wanted))
+                f.truncate(database['size'])
+
+            if _sha256_file(staging) != database['sha256']:
+                raise ValueError("ฐานข้อมูลที่ประกอบใหม่ไม่ตรงกับ manifest")
+            restore_database(staging, self.app_path / "item_wiki.db")
+        finally:
+            if staging.exists():
+                staging.unlink()
+
+    def backup_current_files(self, progress=None):
         """Backup ไฟล์เดิมก่อน replace"""
         backup_dir = self.app_path / "backup"
         backup_dir.mkdir(exist_ok=True)
 
-        # Backup database
+        # Backup database (online: the app keeps running while it copies)
         db_path = self.app_path / "item_wiki.db"
         if db_path.exists():
-            shutil.copy2(db_path, backup_dir / "item_wiki.db.bak")
+            backup_database(db_path, backup_dir / "item_wiki.db.bak", progress=progress)
 
         # Backup auth config
         auth_path = self.app_path / ".streamlit" / "auth_config.yaml"
         if auth_path.exists():
             shutil.copy2(auth_path, backup_dir / "auth_config.yaml.bak")
 
-    def replace_files(self, source_dir):
+    def restore_backup(self, progress=None):
+        """กู้คืนฐานข้อมูลจาก backup/item_wiki.db.bak"""
+        backup_path = self.app_path / "backup" / "item_wiki.db.bak"
+        if not backup_path.exists():
+            raise FileNotFoundError("ไม่พบไฟล์ backup")
+        restore_database(backup_path, self.app_path / "item_wiki.db", progress=progress)
+
+    def replace_files(self, source_dir, progress=None):
         """Replace ไฟล์เก่าด้วยของใหม่"""
-        # คัดลอก database
+        # คัดลอก database (verified, then swapped in as one transaction)
         new_db = Path(source_dir) / "item_wiki.db"
         if new_db.exists():
-            shutil.copy2(new_db, self.app_path / "item_wiki.db")
+            restore_database(new_db, self.app_path / "item_wiki.db", progress=progress)
 
         # คัดลอก auth config
         new_auth = Path(source_dir) / ".streamlit" / "auth_config.yaml"
@@ -135,8 +551,12 @@ class AutoUpdater:
             images_target = self.app_path / "assets" / "images"
             images_target.mkdir(parents=True, exist_ok=True)
 
-            for img_file in new_images.glob("*"):
-                shutil.copy2(img_file, images_target / img_file.name)
+            # Content-addressed images live in hash-prefix subdirectories
+            for img_file in new_images.rglob("*"):
+                if img_file.is_file():
+                    target = images_target / img_file.relative_to(new_images)
+                    target.parent.mkdir(parents=True, exist_ok=True)
+                    shutil.copy2(img_file, target)
 
     def update_version_file(self):
         """อัปเดตไฟล์ version.txt"""
@@ -159,4 +579,35 @@ class AutoUpdater:
 
 
 # สร้าง instance
-updater = AutoUpdater()
\ No newline at end of file
+updater = AutoUpdater()
+
+def main():
+    parser = argparse.ArgumentParser(description="Publish or apply manifest-based delta updates")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    publish = sub.add_parser("publish", help="เขียนไฟล์อัปเดต + manifest ลงโฟลเดอร์")
+    publish.add_argument("out_dir")
+    publish.add_argument("--version", required=True)
+    publish.add_argument("--chunk-size", type=int, default=DB_CHUNK_SIZE)
+
+    apply = sub.add_parser("apply", help="อัปเดตจาก URL ที่เผยแพร่ manifest")
+    apply.add_argument("url")
+    args = parser.parse_args()
+
+    if args.command == "publish":
+        manifest = publish_update(updater.app_path, args.out_dir, args.version, args.chunk_size)
+        db_chunks = len(manifest.get('database', {}).get('chunks', []))
+        print(f"✅ Published {args.version}: {len(manifest['files'])} files, {db_chunks} database chunks")
+    else:
+        downloader = DeltaDownloader(args.url)
+        manifest = downloader.fetch_manifest()
+        if manifest is None:
+            sys.exit("ไม่พบ manifest ที่ URL นี้")
+        stats = AutoUpdater(update_base=args.url).apply_manifest(manifest, downloader)
+        print(f"✅ Updated to {manifest.get('version')}: "
+              f"{stats['downloaded_bytes']:,} of {stats['catalog_bytes']:,} bytes downloaded "
+              f"({stats['files_downloaded']} files, {stats['chunks_downloaded']} chunks) "
+              f"in {stats['elapsed']:.2f}s")
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
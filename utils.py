@@ -5,12 +5,16 @@ Utility functions for image handling, validation, and UI helpers.
 """
 import os
 import base64
-import hashlib
-from datetime import datetime
+import html
+from collections import OrderedDict
+from functools import lru_cache
+from threading import Lock
 from pathlib import Path
 from PIL import Image
 import streamlit as st
 
+from image_jobs import write_image_bytes, is_content_addressed
+
 # Lazy import to avoid circular
 # from database import get_all_rarities, get_all_item_types, get_all_locations, get_all_tiers, clear_master_cache
 
@@ -36,47 +40,51 @@ def create_placeholder_image():
     d.text((50, 90), "No Image", fill=(255, 255, 255))
     img.save(placeholder_path)
 
-def save_uploaded_image(uploaded_file, item_name):
+_EXTENSION_ALIASES = {'.jpeg': '.jpg'}
+
+def save_uploaded_image(uploaded_file, item_name=None, image_check=None):
     """
-    Save uploaded image with secure filename.
+    Save uploaded image under its SHA-256 content hash.
+    Identical uploads map to one file; item_name no longer affects the name.
+    Pass the ImageCheck from FileValidator.inspect_image to reuse its buffer
+    and name the file by the detected format.
     Returns: relative path to saved image
     """
     if not uploaded_file:
         return "assets/images/placeholder.png"
 
-    # Create secure filename
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    name_hash = hashlib.md5(item_name.encode()).hexdigest()[:8]
-    ext = Path(uploaded_file.name).suffix.lower()
+    if image_check is not None:
+        data, ext = image_check.data, image_check.extension
+    else:
+        ext = Path(uploaded_file.name).suffix.lower()
 
-    # Validate extension
-    if ext not in ['.png', '.jpg', '.jpeg', '.gif']:
-        raise ValueError("ไฟล์รูปต้องเป็น PNG, JPG, JPEG หรือ GIF เท่านั้น")
+        # Validate extension
+        if ext not in ['.png', '.jpg', '.jpeg', '.gif']:
+            raise ValueError("ไฟล์รูปต้องเป็น PNG, JPG, JPEG หรือ GIF เท่านั้น")
 
-    filename = f"{name_hash}_{timestamp}{ext}"
-    filepath = Path("assets/images") / filename
-
-    # Save file
-    ensure_upload_dir()
-    with open(filepath, "wb") as f:
-        f.write(uploaded_file.getbuffer())
+        data = uploaded_file.getbuffer()
+        ext = _EXTENSION_ALIASES.get(ext, ext)
 
-    return str(filepath)
+    return write_image_bytes(data, ext)
 
 def delete_image_file(image_path):
-    """Delete image file if not placeholder."""
-    if image_path and image_path != "assets/images/placeholder.png":
-        try:
-            if os.path.exists(image_path):
-                os.remove(image_path)
-        except OSError:
-            pass
+    """Delete image file unless it is the placeholder, an item still uses it or an upload just reused it."""
+    from database import remove_unreferenced_images
+
+    remove_unreferenced_images([image_path])
+
+@lru_cache(maxsize=128)
+def _content_addressed_base64(image_path):
+    with open(image_path, "rb") as img_file:
+        return base64.b64encode(img_file.read()).decode()
 
 def get_image_base64(image_path):
     """Convert image to base64 for embedding."""
     try:
         if not os.path.exists(image_path):
             image_path = "assets/images/placeholder.png"
+        elif is_content_addressed(image_path):
+            return _content_addressed_base64(image_path)
 
         with open(image_path, "rb") as img_file:
             return base64.b64encode(img_file.read()).decode()
@@ -118,6 +126,26 @@ def load_css():
             border-bottom: 1px solid rgba(255,255,255,0.2);
         }
         
+        /* Card grid - one payload per result page */
+        .item-grid {
+            display: grid;
+            grid-template-columns: repeat(3, minmax(0, 1fr));
+            gap: 16px;
+        }
+        
+        .item-grid .item-card {
+            margin-top: 0;
+            border-radius: 0 0 16px 16px;
+        }
+        
+        .item-card-image {
+            width: 100%;
+            height: 200px;
+            object-fit: cover;
+            border-radius: 12px 12px 0 0;
+            display: block;
+        }
+        
         /* Rarity borders */
         .rarity-Common { border-left-color: #808080; }
         .rarity-Uncommon { border-left-color: #27ae60; }
@@ -215,6 +243,85 @@ def load_css():
         </style>
     """, unsafe_allow_html=True)
 
+# ----------------------------------------------------------------------
+# Card Rendering - cached HTML fragments (images joined at render time)
+# ----------------------------------------------------------------------
+CARD_CACHE_SIZE = 500
+
+_card_cache = OrderedDict()
+_card_cache_lock = Lock()
+
+def _card_cache_key(item):
+    """
+    Cache key: item identity, last edit, image path and every joined
+    master-data value the card shows, so renaming a type, tier or location
+    re-renders it. updated_at has one-second resolution, so an image swap in
+    the same second as the previous edit is only caught by image_path.
+    """
+    return (item.id, str(item.updated_at), item.image_path, item.rarity_name, item.rarity_color, item.rarity_icon,
+            item.type_name, item.tier_name, item.location_name, item.description_excerpt)
+
+def _card_image_html(item):
+    """Card <img> tag; the base64 comes from get_image_base64 (content-addressed files share one lru copy)."""
+    img_base64 = get_image_base64(item.image_path)
+    return (f'<img class="item-card-image" src="data:image/png;base64,{img_base64}">'
+            if img_base64 else '')
+
+def _build_card_body(item):
+    """Card HTML without the image: the part kept in _card_cache (a few hundred bytes per item)."""
+    esc = html.escape
+    excerpt = item.description_excerpt
+
+    return (
+        f'<div class="item-card rarity-{esc(item.rarity_name)}">'
+        f'<h3 style="color: {item.rarity_color}; margin-top: 0; margin-bottom: 8px;">{esc(item.name)}</h3>'
+        f'<div style="display: flex; gap: 8px; margin: 8px 0;">'
+        f'<span style="background: #2A2A2A; padding: 4px 8px; border-radius: 4px;">📦 {esc(item.type_name)}</span>'
+        f'<span style="background: #2A2A2A; padding: 4px 8px; border-radius: 4px;">{esc(item.tier_name)}</span>'
+        f'</div>'
+        f'<p style="color: #AAA; min-height: 60px; margin: 8px 0;">{esc(excerpt)}</p>'
+        f'<hr style="margin: 16px 0; border: none; border-top: 1px solid #3A3A3A;">'
+        f'<div style="display: flex; justify-content: space-between; align-items: center;">'
+        f'<span style="color: #f39c12;">📍 {esc(item.location_name)}</span>'
+        f'<span style="color: {item.rarity_color};">{item.rarity_icon} {esc(item.rarity_name)}</span>'
+        f'</div>'
+        f'</div>'
+    )
+
+def build_card_html(item):
+    """Build the HTML fragment of a single item card (image + body)."""
+    return f'<div>{_card_image_html(item)}{_build_card_body(item)}</div>'
+
+def get_card_html(item):
+    """
+    Return the card fragment for an item. Only the body is cached; the
+    image is joined here so cached cards never hold their own base64 copy.
+    """
+    key = _card_cache_key(item)
+
+    with _card_cache_lock:
+        body = _card_cache.get(key)
+        if body is not None:
+            _card_cache.move_to_end(key)
+
+    if body is None:
+        body = _build_card_body(item)
+        with _card_cache_lock:
+            _card_cache[key] = body
+            while len(_card_cache) > CARD_CACHE_SIZE:
+                _card_cache.popitem(last=False)
+
+    return f'<div>{_card_image_html(item)}{body}</div>'
+
+def render_card_grid_html(items):
+    """Join cached card fragments of a whole page into one HTML payload."""
+    return '<div class="item-grid">' + ''.join(get_card_html(item) for item in items) + '</div>'
+
+def clear_card_cache():
+    """Drop all cached card bodies."""
+    with _card_cache_lock:
+        _card_cache.clear()
+
 # ----------------------------------------------------------------------
 # Data Helpers - Lazy load database functions
 # ----------------------------------------------------------------------
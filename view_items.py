@@ -5,58 +5,83 @@ Advanced item search and display with real-time filtering.
 FIXED: Filter reset using version counter - 100% working
 FIXED: HTML rendering without whitespace
 """
+import html
+from pathlib import Path
 import streamlit as st
-from database import search_items, get_item_by_id, get_all_items_with_details
+import streamlit.components.v1 as components
+from database import search_items, search_item_ids, count_items, get_item_by_id, get_data_version
 from database import get_all_item_types, get_all_rarities, get_all_locations, get_all_tiers
-from utils import load_css, get_image_base64, get_rarity_color
+from utils import load_css, get_image_base64, get_rarity_color, render_card_grid_html
 from models import Item
+from search_index import get_client_index_payload, suggest_item_names, fuzzy_search_items
 
 st.set_page_config(layout="wide", page_icon="🔍", page_title="ค้นหาไอเท็ม")
 load_css()
 
+CARD_PAGE_SIZES = [12, 24, 48, 96]
+DEFAULT_CARD_PAGE_SIZE = 24
+CLIENT_SEARCH_DEFAULT = False
+SUGGESTION_COUNT = 5
+FUZZY_SUGGESTION_COUNT = 6
+
+client_search_component = components.declare_component(
+    "client_search",
+    path=str(Path(__file__).parent / "components" / "client_search")
+)
+
 # ----------------------------------------------------------------------
 # View Components
 # ----------------------------------------------------------------------
-def render_card_view(items_data):
-    """Render items as beautiful cards."""
+def render_card_view(items_data, key="card_detail"):
+    """Render a page of items as one batched card grid plus a single detail picker."""
     if not items_data:
         return
 
-    cols = st.columns(3)
+    items = [Item.from_db_row(dict(row) if hasattr(row, 'keys') else row) for row in items_data]
 
-    for idx, row in enumerate(items_data):
-        row_dict = dict(row) if hasattr(row, 'keys') else row
-        item = Item.from_db_row(row_dict)
+    st.markdown(render_card_grid_html(items), unsafe_allow_html=True)
 
-        with cols[idx % 3]:
-            img_base64 = get_image_base64(item.image_path)
-            if img_base64:
-                st.markdown(
-                    f'<img src="data:image/png;base64,{img_base64}" '
-                    f'style="width:100%; height:200px; object-fit:cover; border-radius:12px 12px 0 0;">',
-                    unsafe_allow_html=True
-                )
+    item_options = {f"{item.rarity_icon} {item.name}": item.id for item in items}
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        selected_display = st.selectbox(
+            "เลือกไอเท็ม",
+            list(item_options.keys()),
+            key=f"{key}_select",
+            label_visibility="collapsed"
+        )
+    with col2:
+        if st.button("🔍 ดูรายละเอียด", key=f"{key}_button", use_container_width=True):
+            st.session_state.selected_item_id = item_options[selected_display]
+            st.session_state.show_detail = True
+            st.rerun()
+
+def render_pagination(total, filters):
+    """Render page-size and page controls; return (limit, offset) for the current window."""
+    # Jump back to the first page whenever the result set changes
+    filter_signature = repr(sorted(filters.items()))
+    if st.session_state.get('card_filter_signature') != filter_signature:
+        st.session_state.card_filter_signature = filter_signature
+        st.session_state.card_page = 1
 
-            card_html = f'''<div class="item-card rarity-{item.rarity_name}">
-<h3 style="color: {item.rarity_color}; margin-top: 0; margin-bottom: 8px;">{item.name}</h3>
-<div style="display: flex; gap: 8px; margin: 8px 0;">
-<span style="background: #2A2A2A; padding: 4px 8px; border-radius: 4px;">📦 {item.type_name}</span>
-<span style="background: #2A2A2A; padding: 4px 8px; border-radius: 4px;">{item.tier_name}</span>
-</div>
-<p style="color: #AAA; min-height: 60px; margin: 8px 0;">{item.description[:120]}{'...' if len(item.description) > 120 else ''}</p>
-<hr style="margin: 16px 0; border: none; border-top: 1px solid #3A3A3A;">
-<div style="display: flex; justify-content: space-between; align-items: center;">
-<span style="color: #f39c12;">📍 {item.location_name}</span>
-<span style="color: {item.rarity_color};">{item.rarity_icon} {item.rarity_name}</span>
-</div>
-</div>'''
-
-            st.markdown(card_html, unsafe_allow_html=True)
-
-            if st.button("🔍 ดูรายละเอียด", key=f"view_{item.id}", use_container_width=True):
-                st.session_state.selected_item_id = item.id
-                st.session_state.show_detail = True
-                st.rerun()
+    if 'card_page_size' not in st.session_state:
+        st.session_state.card_page_size = DEFAULT_CARD_PAGE_SIZE
+
+    page_size = st.session_state.card_page_size
+    total_pages = max(1, (total + page_size - 1) // page_size)
+    if st.session_state.get('card_page', 1) > total_pages:
+        st.session_state.card_page = total_pages
+
+    col1, col2, col3 = st.columns([1, 1, 2])
+    with col1:
+        st.selectbox("ต่อหน้า", CARD_PAGE_SIZES, key="card_page_size")
+    with col2:
+        page = st.number_input("หน้า", min_value=1, max_value=total_pages, step=1, key="card_page")
+    with col3:
+        start = (page - 1) * page_size
+        st.caption(f"แสดง {start + 1}-{min(start + page_size, total)} จาก {total} รายการ (หน้า {page}/{total_pages})")
+
+    return page_size, (page - 1) * page_size
 
 def render_table_view(items_data):
     """Render items as sortable table."""
@@ -75,7 +100,7 @@ def render_table_view(items_data):
             "ความหายาก": f"{item.rarity_icon} {item.rarity_name}",
             "Tier": item.tier_name,
             "สถานที่ดรอป": item.location_name,
-            "รายละเอียด": item.description[:50] + "..." if len(item.description) > 50 else item.description,
+            "รายละเอียด": item.description_excerpt,
         })
 
     df = pd.DataFrame(table_data)
@@ -116,34 +141,29 @@ def render_item_detail(item_id):
         with col2:
             st.markdown(f"# {item.name}")
 
-            col_a, col_b, col_c = st.columns(3)
-            with col_a:
-                st.markdown(f"""
-                <div style="background: #2A2A2A; padding: 12px; border-radius: 8px; text-align: center;">
-                    <small>ประเภท</small><br>
-                    <strong>{item.type_name}</strong>
-                </div>
-                """, unsafe_allow_html=True)
-
-            with col_b:
-                st.markdown(f"""
-                <div style="background: #2A2A2A; padding: 12px; border-radius: 8px; text-align: center;">
-                    <small>ความหายาก</small><br>
-                    <strong style="color: {item.rarity_color};">{item.rarity_name}</strong>
-                </div>
-                """, unsafe_allow_html=True)
-
-            with col_c:
-                st.markdown(f"""
-                <div style="background: #2A2A2A; padding: 12px; border-radius: 8px; text-align: center;">
-                    <small>Tier</small><br>
-                    <strong>{item.tier_name}</strong>
-                </div>
-                """, unsafe_allow_html=True)
+            stat_style = "flex: 1; background: #2A2A2A; padding: 12px; border-radius: 8px; text-align: center;"
+            stats = [
+                ("ประเภท", item.type_name, ""),
+                ("ความหายาก", item.rarity_name, f' style="color: {item.rarity_color};"'),
+                ("Tier", item.tier_name, ""),
+            ]
+            st.markdown(
+                '<div style="display: flex; gap: 16px;">'
+                + ''.join(
+                    f'<div style="{stat_style}"><small>{label}</small><br>'
+                    f'<strong{strong_style}>{html.escape(value)}</strong></div>'
+                    for label, value, strong_style in stats
+                )
+                + '</div>',
+                unsafe_allow_html=True
+            )
 
             st.markdown("---")
             st.markdown("### 📖 คำอธิบาย")
-            st.markdown(f">{item.description if item.description else 'ไม่มีคำอธิบาย'}")
+            st.markdown(
+                f'<blockquote>{item.description_html or "ไม่มีคำอธิบาย"}</blockquote>',
+                unsafe_allow_html=True
+            )
             st.markdown("---")
             st.markdown(f"**📍 สถานที่ดรอป:** {item.location_name}")
 
@@ -158,16 +178,38 @@ def render_item_detail(item_id):
             st.rerun()
 
 # ----------------------------------------------------------------------
-# Main - FIXED: Version counter for filter reset
+# Cached Queries - cleared by refresh_master_data() on every item write
 # ----------------------------------------------------------------------
-def main():
-    st.markdown("# 🔍 ค้นหาไอเท็ม")
-    st.markdown("---")
+@st.cache_data(ttl=60)
+def cached_search_items(filters, limit=None, offset=0):
+    """search_items() memoized per (filters, page) so repeated queries skip SQL."""
+    return [dict(row) for row in search_items(filters, limit=limit, offset=offset)]
+
+@st.cache_data(ttl=60)
+def cached_fuzzy_items(search_query, filters):
+    """Typo-tolerant matches for a query that found nothing, best match first."""
+    # Rank only items the page filters allow, so a filtered search still gets suggestions
+    allowed_ids = search_item_ids(filters) if filters else None
+    ranked_ids = [item_id for item_id, _ in
+                  fuzzy_search_items(search_query, k=FUZZY_SUGGESTION_COUNT, ids=allowed_ids)]
+    if not ranked_ids:
+        return []
+
+    rows = search_items(dict(filters, ids=ranked_ids))
+    rank = {item_id: pos for pos, item_id in enumerate(ranked_ids)}
+    return sorted((dict(row) for row in rows), key=lambda row: rank[row['id']])
+
+@st.cache_data(ttl=60)
+def cached_count_items(filters):
+    """count_items() memoized per filter set."""
+    return count_items(filters)
 
-    if st.session_state.get('show_detail') and st.session_state.get('selected_item_id'):
-        render_item_detail(st.session_state.selected_item_id)
-        return
+# ----------------------------------------------------------------------
+# Page Sections - search results rerun on their own (st.fragment)
+# ----------------------------------------------------------------------
 
+def render_filter_panel():
+    """Render sidebar filters and return the master-data filter dict (no search text)."""
     type_dict, type_names = get_all_item_types()
     rarity_dict, rarities_list = get_all_rarities()
     location_dict, location_names = get_all_locations()
@@ -231,32 +273,8 @@ def main():
             st.session_state.filter_version += 1
             st.rerun()
 
-        st.markdown("### 📊 สถิติ")
-        all_items = get_all_items_with_details()
-        st.metric("ไอเท็มทั้งหมด", len(all_items))
-
-    col1, col2 = st.columns([3, 1])
-
-    with col1:
-        search_query = st.text_input(
-            "🔎 ค้นหาชื่อไอเท็ม",
-            placeholder="พิมพ์ชื่อไอเท็มที่ต้องการค้นหา...",
-            label_visibility="collapsed"
-        )
-
-    with col2:
-        view_mode = st.radio(
-            "รูปแบบ",
-            ["📱 การ์ด", "📊 ตาราง"],
-            horizontal=True,
-            label_visibility="collapsed"
-        )
-
     filters = {}
 
-    if search_query:
-        filters['search'] = search_query
-
     if selected_types:
         filters['type_ids'] = [type_dict[t] for t in selected_types if t in type_dict]
 
@@ -278,25 +296,153 @@ def main():
     if selected_tiers:
         filters['tier_ids'] = [tier_dict[t] for t in selected_tiers if t in tier_dict]
 
-    items = search_items(filters)
+    return filters
+
+def render_stats():
+    """Render sidebar stats from a cached COUNT instead of loading every item."""
+    with st.sidebar:
+        st.markdown("### 📊 สถิติ")
+        st.metric("ไอเท็มทั้งหมด", cached_count_items({}))
+
+def _use_suggestion(name):
+    """on_click callback: replace the search text with the chosen suggestion."""
+    st.session_state.search_query = name
+
+def render_suggestions(search_query):
+    """Show prefix-index name suggestions under the search box."""
+    query = search_query.strip()
+    if not query:
+        return
+
+    suggestions = [s for s in suggest_item_names(query, k=SUGGESTION_COUNT)
+                   if s['name'].casefold() != query.casefold()]
+    if not suggestions:
+        return
+
+    cols = st.columns(len(suggestions))
+    for col, suggestion in zip(cols, suggestions):
+        with col:
+            st.button(
+                f"{suggestion['icon']} {suggestion['name']}",
+                key=f"suggest_{suggestion['id']}",
+                on_click=_use_suggestion,
+                args=(suggestion['name'],),
+                use_container_width=True
+            )
+
+@st.fragment
+def render_results(base_filters):
+    """Search box, view mode and results; reruns alone when only these change."""
+    col1, col2 = st.columns([3, 1])
+
+    with col1:
+        # text_input only submits on Enter/blur, so a query fires once per
+        # finished search, never per keystroke
+        search_query = st.text_input(
+            "🔎 ค้นหาชื่อไอเท็ม",
+            placeholder="พิมพ์ชื่อไอเท็มที่ต้องการค้นหา...",
+            label_visibility="collapsed",
+            key="search_query"
+        )
+        render_suggestions(search_query)
 
-    if not items:
+    with col2:
+        view_mode = st.radio(
+            "รูปแบบ",
+            ["📱 การ์ด", "📊 ตาราง"],
+            horizontal=True,
+            label_visibility="collapsed"
+        )
+
+    filters = dict(base_filters)
+
+    # Whitespace-only edits normalize to the same cached query
+    search_query = search_query.strip()
+    if search_query:
+        filters['search'] = search_query
+
+    if view_mode == "📊 ตาราง":
+        items = cached_search_items(filters)
+        total = len(items)
+    else:
+        total = cached_count_items(filters)
+        items = None
+
+    if not total:
         st.warning("😢 ไม่พบไอเท็มที่ค้นหา")
 
         if filters:
             st.info("💡 ลองเปลี่ยนคำค้นหาหรือตัวกรอง")
 
-            sample_items = get_all_items_with_details()[:3]
-            if sample_items:
-                st.markdown("### 🔥 ไอเท็มแนะนำ")
-                render_card_view(sample_items)
+            fuzzy_items = cached_fuzzy_items(search_query, base_filters) if search_query else []
+            if fuzzy_items:
+                st.markdown("### 🤔 คุณหมายถึง...")
+                render_card_view(fuzzy_items)
+            else:
+                sample_items = cached_search_items({}, limit=3)
+                if sample_items:
+                    st.markdown("### 🔥 ไอเท็มแนะนำ")
+                    render_card_view(sample_items)
     else:
-        st.success(f"✨ พบ {len(items)} รายการ")
+        st.success(f"✨ พบ {total} รายการ")
 
         if view_mode == "📊 ตาราง":
             render_table_view(items)
         else:
-            render_card_view(items)
+            limit, offset = render_pagination(total, filters)
+            render_card_view(cached_search_items(filters, limit=limit, offset=offset))
+
+def render_client_search():
+    """Browser-side search: ship the index once per data version, come back only for details."""
+    version = get_data_version()
+    # Component args are resent on every rerun; the payload only goes out
+    # until this session's frame holds the current version
+    payload = None
+    if st.session_state.get('client_index_sent') != version:
+        payload = get_client_index_payload(version)
+        st.session_state.client_index_sent = version
+    selection = client_search_component(version=version, payload=payload, key="client_search", default=None)
+
+    # The component replays its last value on every rerun; only a new nonce is a new click
+    if selection and selection.get('nonce') != st.session_state.get('client_search_nonce'):
+        st.session_state.client_search_nonce = selection['nonce']
+        if selection.get('needIndex') is not None:
+            # A frame without the index (e.g. reloaded browser tab) asks for the payload again
+            st.session_state.pop('client_index_sent', None)
+        else:
+            st.session_state.selected_item_id = selection['id']
+            st.session_state.show_detail = True
+        st.rerun()
+
+# ----------------------------------------------------------------------
+# Main - FIXED: Version counter for filter reset
+# ----------------------------------------------------------------------
+def main():
+    st.markdown("# 🔍 ค้นหาไอเท็ม")
+    st.markdown("---")
+
+    if st.session_state.get('show_detail') and st.session_state.get('selected_item_id'):
+        # The search frame unmounts here and needs the payload when it comes back
+        st.session_state.pop('client_index_sent', None)
+        render_item_detail(st.session_state.selected_item_id)
+        return
+
+    client_mode = st.sidebar.checkbox(
+        "⚡ ค้นหาในเบราว์เซอร์",
+        value=CLIENT_SEARCH_DEFAULT,
+        key="client_search_mode",
+        help="โหลดดัชนีไอเท็มครั้งเดียว แล้วค้นหา/กรองในเบราว์เซอร์โดยไม่ต้องรอเซิร์ฟเวอร์"
+    )
+
+    if client_mode:
+        render_stats()
+        render_client_search()
+        return
+
+    st.session_state.pop('client_index_sent', None)
+    filters = render_filter_panel()
+    render_stats()
+    render_results(filters)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file